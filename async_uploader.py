@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""asyncio S3 upload stage: many in-flight PutObject requests on a single event-loop thread.
+
+An alternative to s3_uploader.S3Uploader for small containers, where a
+large thread pool costs more memory and context switches than the
+requests themselves. The calling thread keeps parsing and building
+documents; one background thread runs an event loop with a single
+aiobotocore client, and every submitted object becomes a task on it.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Any, AsyncContextManager, Callable, List, Optional, Set, Tuple, Union
+
+from pipeline_metrics import LatencySummary
+from s3_uploader import (DEFAULT_ASYNC_CONCURRENCY, DEFAULT_MAX_ATTEMPTS, NON_RETRYABLE_ERROR_CODES, UploadSummary,
+                         error_code)
+
+logger = logging.getLogger(__name__)
+
+ClientFactory = Callable[[], AsyncContextManager[Any]]
+_Item = Tuple[str, Optional[Union[str, bytes]], Optional[Path]]
+
+
+class AsyncS3Uploader:
+    """Same contract as S3Uploader (submit, submit_file, close, summary), backed by asyncio tasks.
+
+    An asyncio.Semaphore caps requests in flight at concurrency, which
+    should not exceed the client's connection pool. submit() blocks once
+    max_pending objects are waiting or in flight, which bounds the memory
+    held by bodies. Each object is retried with full-jitter exponential
+    backoff; on_uploaded is called on the event-loop thread.
+    """
+
+    def __init__(self, client_factory: ClientFactory, bucket: str,
+                 concurrency: int = DEFAULT_ASYNC_CONCURRENCY,
+                 max_pending: Optional[int] = None,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 base_delay: float = 0.2,
+                 max_delay: float = 10.0,
+                 on_uploaded: Optional[Callable[[str], None]] = None):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        self.bucket = bucket
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.on_uploaded = on_uploaded
+        self.summary = UploadSummary()
+        self.put_latency = LatencySummary()  # Per-attempt put_object latency
+
+        self._pending = threading.BoundedSemaphore(max_pending or concurrency * 4)
+        # Objects handed over by submit() but not yet turned into tasks; the loop is only
+        # woken when the list goes from empty to non-empty, not once per object
+        self._handoff: List[_Item] = []
+        self._handoff_lock = threading.Lock()
+        self._tasks: Set[asyncio.Task] = set()
+        self._active = 0
+        self._started = time.monotonic()
+        self._closed = False
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='s3-async', daemon=True)
+        self._thread.start()
+        try:
+            self._client_context = client_factory()
+            self._call(self._open())
+        except BaseException:
+            self._stop_loop()
+            raise
+
+    def __enter__(self) -> 'AsyncS3Uploader':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def _call(self, coroutine) -> Any:
+        """Run a coroutine on the loop thread and wait for its result."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    async def _open(self) -> None:
+        self._client = await self._client_context.__aenter__()
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+    def _stop_loop(self) -> None:
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def submit(self, key: str, body: Union[str, bytes]) -> None:
+        """Schedule an object for upload, blocking while max_pending objects are outstanding."""
+        self._schedule(key, body, None)
+
+    def submit_file(self, key: str, path: Union[str, Path]) -> None:
+        """Schedule a local file for upload; it is read off the loop thread."""
+        self._schedule(key, None, Path(path))
+
+    def _schedule(self, key: str, body: Optional[Union[str, bytes]], path: Optional[Path]) -> None:
+        if self._closed:
+            raise RuntimeError("Uploader is closed")
+        self._pending.acquire()
+        with self._handoff_lock:
+            self._handoff.append((key, body, path))
+            wake = len(self._handoff) == 1
+        if wake:
+            self._loop.call_soon_threadsafe(self._start_tasks)
+
+    def _start_tasks(self) -> None:
+        with self._handoff_lock:
+            items, self._handoff = self._handoff, []
+        for item in items:
+            task = self._loop.create_task(self._upload(*item))
+            self._tasks.add(task)
+            task.add_done_callback(self._task_done)
+
+    def _task_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        self._pending.release()
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Upload task crashed: {task.exception()}")
+
+    async def _finish(self) -> None:
+        self._start_tasks()
+        while self._tasks:
+            await asyncio.wait(list(self._tasks))
+        await self._client_context.__aexit__(None, None, None)
+
+    @property
+    def queue_depth(self) -> int:
+        """Objects submitted but still waiting for a free request slot."""
+        return max(0, len(self._handoff) + len(self._tasks) - self._active)
+
+    @property
+    def elapsed(self) -> float:
+        return self.summary.elapsed if self._closed else time.monotonic() - self._started
+
+    def close(self) -> UploadSummary:
+        """Wait for all scheduled uploads, close the client and stop the loop; returns the summary."""
+        if not self._closed:
+            self._closed = True
+            try:
+                self._call(self._finish())
+            finally:
+                self._stop_loop()
+            self.summary.elapsed = time.monotonic() - self._started
+        return self.summary
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _record_success(self, key: str, size: int) -> None:
+        if self.on_uploaded is not None:
+            self.on_uploaded(key)
+        self.summary.succeeded += 1
+        self.summary.bytes_uploaded += size
+
+    def _record_failure(self, key: str, attempts: int, error: Exception) -> None:
+        logger.error(f"Upload failed for {key} after {attempts} attempt(s): {error}")
+        self.summary.failed += 1
+        self.summary.failures.append((key, str(error)))
+
+    async def _upload(self, key: str, body: Optional[Union[str, bytes]], path: Optional[Path]) -> None:
+        async with self._semaphore:
+            self._active += 1
+            try:
+                await self._upload_with_retries(key, body, path)
+            except Exception as e:
+                # A failing on_uploaded callback must still show up in the summary
+                self._record_failure(key, 1, e)
+            finally:
+                self._active -= 1
+
+    async def _upload_with_retries(self, key: str, body: Optional[Union[str, bytes]],
+                                   path: Optional[Path]) -> None:
+        try:
+            if path is not None:
+                body = await self._loop.run_in_executor(None, path.read_bytes)
+            elif isinstance(body, str):
+                body = body.encode('utf-8')
+        except OSError as e:
+            self._record_failure(key, 1, e)
+            return
+        for attempt in range(self.max_attempts):
+            started = time.perf_counter()
+            try:
+                await self._client.put_object(Bucket=self.bucket, Key=key, Body=body)
+            except Exception as e:
+                self.put_latency.observe(time.perf_counter() - started)
+                last_attempt = attempt + 1 >= self.max_attempts
+                if last_attempt or error_code(e) in NON_RETRYABLE_ERROR_CODES:
+                    self._record_failure(key, attempt + 1, e)
+                    return
+                self.summary.retries += 1
+                await asyncio.sleep(self._backoff(attempt))
+            else:
+                self.put_latency.observe(time.perf_counter() - started)
+                self._record_success(key, len(body))
+                return
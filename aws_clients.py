@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Lazily created, per-process config and AWS clients for the ingestion scripts.
+
+Nothing here touches boto3 or the project config until a client is first
+requested, so importing the prepare_* modules stays cheap and works without
+credentials.
+"""
+
+import functools
+import os
+from typing import Any
+
+
+@functools.lru_cache(maxsize=None)
+def get_config() -> Any:
+    """Load the project config once per process."""
+    from src.config import load_config
+    return load_config()
+
+
+def _create_client(service: str) -> Any:
+    import boto3
+
+    config = get_config()
+    return boto3.client(
+        service,
+        region_name=config.aws.region,
+        aws_access_key_id=config.aws.access_key_id,
+        aws_secret_access_key=config.aws.secret_access_key
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def get_s3_client() -> Any:
+    """Shared S3 client (boto3 clients are thread-safe)."""
+    return _create_client('s3')
+
+
+@functools.lru_cache(maxsize=None)
+def get_bedrock_agent_client() -> Any:
+    """Shared bedrock-agent client, for knowledge-base and data-source management."""
+    return _create_client('bedrock-agent')
+
+
+@functools.lru_cache(maxsize=None)
+def get_aio_session() -> Any:
+    """Shared aiobotocore session; clients are created from it per event loop."""
+    from aiobotocore.session import get_session
+    return get_session()
+
+
+def create_async_s3_client(max_pool_connections: int) -> Any:
+    """Async context manager yielding an aiobotocore S3 client.
+
+    The connection pool is sized for max_pool_connections requests in
+    flight, and botocore's own retries are off because the uploader retries.
+    """
+    from aiobotocore.config import AioConfig
+
+    config = get_config()
+    return get_aio_session().create_client(
+        's3',
+        region_name=config.aws.region,
+        aws_access_key_id=config.aws.access_key_id,
+        aws_secret_access_key=config.aws.secret_access_key,
+        config=AioConfig(max_pool_connections=max_pool_connections, retries={'max_attempts': 1, 'mode': 'standard'}),
+    )
+
+
+def _reset_after_fork() -> None:
+    # boto3 clients must not be shared across fork; children build their own
+    get_s3_client.cache_clear()
+    get_bedrock_agent_client.cache_clear()
+    get_aio_session.cache_clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""Sharded local output for prepared documents (JSONL or tar) instead of one file pair per document."""
+
+import io
+import tarfile
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import IO, Iterable, Iterator, Optional, Union
+
+from metadata_json import dumps, loads
+from parallel_build import DocumentRecord
+
+LOCAL_FORMATS = ('files', 'jsonl', 'tar')
+
+DEFAULT_SHARD_RECORDS = 10000
+DEFAULT_SHARD_BYTES = 256 * 1024 * 1024
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+METADATA_SUFFIX = '.metadata.json'
+
+
+class _ShardWriter(ABC):
+    """Rotates output files once a shard reaches its record or byte limit."""
+
+    extension = ''
+
+    def __init__(self, output_dir: Path, name: str,
+                 max_records: int = DEFAULT_SHARD_RECORDS,
+                 max_bytes: int = DEFAULT_SHARD_BYTES):
+        self.output_dir = output_dir
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        # Run-stamped names so a later run never overwrites shards that have not been uploaded yet
+        self.stem = f"{name}-{time.strftime('%Y%m%dT%H%M%S')}"
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.shards = []
+        self._file: Optional[IO[bytes]] = None
+        self._records = 0
+        self._bytes = 0
+
+    def _open_shard(self) -> None:
+        path = self.output_dir / f"{self.stem}-{len(self.shards):05d}{self.extension}"
+        self.shards.append(path)
+        self._file = open(path, 'wb', buffering=WRITE_BUFFER_SIZE)
+        self._records = 0
+        self._bytes = 0
+
+    def _close_shard(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def write(self, record: DocumentRecord, metadata: Optional[bytes] = None) -> int:
+        """Append a record, returning the number of bytes written.
+
+        metadata is the record's already serialized metadata, if the caller has it.
+        """
+        if self._file is None or self._records >= self.max_records or self._bytes >= self.max_bytes:
+            self._close_shard()
+            self._open_shard()
+        written = self._write(record, dumps(record.metadata) if metadata is None else metadata)
+        self._records += 1
+        self._bytes += written
+        return written
+
+    @abstractmethod
+    def _write(self, record: DocumentRecord, metadata: bytes) -> int:
+        """Write one record to the open shard, returning the number of bytes written."""
+
+    def close(self) -> None:
+        self._close_shard()
+
+
+class JsonlShardWriter(_ShardWriter):
+    """One JSON object per line: {"key", "doc_id", "body", "metadata"}."""
+
+    extension = '.jsonl'
+
+    def _write(self, record: DocumentRecord, metadata: bytes) -> int:
+        # The metadata bytes are spliced in rather than serialized a second time
+        head = dumps({'key': record.key, 'doc_id': record.doc_id, 'body': record.body})
+        line = b''.join((head[:-1], b',"metadata":', metadata, b'}\n'))
+        self._file.write(line)
+        return len(line)
+
+
+class TarShardWriter(_ShardWriter):
+    """Each document becomes two tar members named by their S3 keys: <key> and <key>.metadata.json."""
+
+    extension = '.tar'
+
+    def _open_shard(self) -> None:
+        super()._open_shard()
+        self._tar = tarfile.open(fileobj=self._file, mode='w|', format=tarfile.PAX_FORMAT)
+
+    def _close_shard(self) -> None:
+        if self._file is not None:
+            self._tar.close()
+        super()._close_shard()
+
+    def _add(self, name: str, data: bytes) -> None:
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        self._tar.addfile(info, io.BytesIO(data))
+
+    def _write(self, record: DocumentRecord, metadata: bytes) -> int:
+        body = record.body.encode('utf-8')
+        self._add(record.key, body)
+        self._add(record.key + METADATA_SUFFIX, metadata)
+        return len(body) + len(metadata)
+
+
+def open_shard_writer(local_format: str, output_dir: Path, name: str,
+                      max_records: int = DEFAULT_SHARD_RECORDS) -> _ShardWriter:
+    """Create the writer for a sharded local format ('jsonl' or 'tar')."""
+    if local_format == 'jsonl':
+        return JsonlShardWriter(output_dir, name, max_records=max_records)
+    if local_format == 'tar':
+        return TarShardWriter(output_dir, name, max_records=max_records)
+    raise ValueError(f"Unknown sharded format: {local_format}")
+
+
+def _iter_jsonl(path: Path) -> Iterator[DocumentRecord]:
+    with open(path, 'rb', buffering=WRITE_BUFFER_SIZE) as f:
+        for line in f:
+            if line.strip():
+                item = loads(line)
+                yield DocumentRecord(item['key'], item['body'], item['metadata'], item.get('doc_id', item['key']))
+
+
+def _iter_tar(path: Path) -> Iterator[DocumentRecord]:
+    pending_key = None
+    pending_body = None
+    with tarfile.open(path, mode='r|*') as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            data = tar.extractfile(member).read()
+            if member.name.endswith(METADATA_SUFFIX):
+                key = member.name[:-len(METADATA_SUFFIX)]
+                if key != pending_key:
+                    raise ValueError(f"{path}: metadata {member.name} does not follow its document")
+                yield DocumentRecord(key, pending_body.decode('utf-8'), loads(data), key)
+                pending_key = pending_body = None
+            else:
+                pending_key, pending_body = member.name, data
+
+
+def iter_shard_records(paths: Iterable[Union[str, Path]]) -> Iterator[DocumentRecord]:
+    """Stream records back out of .jsonl / .tar shards (directories are expanded)."""
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            yield from iter_shard_records(sorted(
+                p for p in path.iterdir() if p.suffix in ('.jsonl', '.tar')
+            ))
+        elif path.suffix == '.jsonl':
+            yield from _iter_jsonl(path)
+        elif path.suffix == '.tar':
+            yield from _iter_tar(path)
+        else:
+            raise ValueError(f"Not a shard file: {path}")
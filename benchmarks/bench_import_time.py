@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Enforce an import-time budget for the ingestion scripts.
+
+Each module is imported in a fresh interpreter with -X importtime; the median
+cumulative import time over several runs must stay under the budget, and the
+import must not pull in boto3 or the project config.
+
+    python benchmarks/bench_import_time.py [--budget-ms 150] [--runs 7]
+
+Exits non-zero when a module is over budget.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import List, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+MODULES = [
+    'prepare_events_with_metadata',
+    'prepare_locations_with_metadata',
+]
+
+# Importing these means a client or config is being built at import time
+FORBIDDEN_MODULES = ['boto3', 'botocore', 'src.config']
+
+DEFAULT_BUDGET_MS = 150.0
+
+
+def measure(module: str) -> Tuple[float, List[str]]:
+    """Import a module in a fresh interpreter; return (cumulative ms, forbidden modules loaded)."""
+    probe = (
+        f"import sys, {module}; "
+        f"print('forbidden:' + ','.join(m for m in {FORBIDDEN_MODULES!r} if m in sys.modules))"
+    )
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', probe],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+    )
+    cumulative_us = None
+    for line in completed.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        parts = [part.strip() for part in line.split('|')]
+        if len(parts) == 3 and parts[2] == module:
+            cumulative_us = int(parts[1])
+    if cumulative_us is None:
+        raise RuntimeError(f"No import timing found for {module}")
+    report = [line for line in completed.stdout.splitlines() if line.startswith('forbidden:')][-1]
+    loaded = [name for name in report[len('forbidden:'):].split(',') if name]
+    return cumulative_us / 1000.0, loaded
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument('--runs', type=int, default=7)
+    args = parser.parse_args(argv)
+
+    failed = False
+    for module in MODULES:
+        timings = []
+        loaded: List[str] = []
+        for _ in range(args.runs):
+            elapsed_ms, loaded = measure(module)
+            timings.append(elapsed_ms)
+        median = statistics.median(timings)
+        status = 'ok'
+        if median > args.budget_ms:
+            status = f'OVER BUDGET ({args.budget_ms:.0f} ms)'
+            failed = True
+        if loaded:
+            status = f'imports {", ".join(loaded)} at import time'
+            failed = True
+        print(f"{module:<40} median {median:7.1f} ms  min {min(timings):7.1f} ms  {status}")
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""End-to-end ingestion benchmark on synthetic exports, against the local S3 stand-in.
+
+Each prepare script runs in a fresh interpreter inside a scratch directory
+holding synthetic exports (see synthetic_export.py). Uploads go to
+local_s3.LocalS3Client, so the numbers cover parsing, building, local
+writes and the upload pipeline without network noise.
+
+    python benchmarks/bench_ingestion.py [--events 20000 --locations 5000 ...]
+                                         [--script-args="--local-format jsonl"]
+                                         [--script-args="--async-io"]
+
+Every run is appended to benchmarks/results/ingestion.jsonl together with
+the git revision. The newest earlier result with the same parameters is
+used as the baseline; exits non-zero when throughput drops or peak RSS
+grows by more than --tolerance.
+"""
+
+import argparse
+import json
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from synthetic_export import add_generator_arguments, generate
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+RESULTS_PATH = Path(__file__).resolve().parent / 'results' / 'ingestion.jsonl'
+
+SCRIPTS = [
+    'prepare_events_with_metadata',
+    'prepare_locations_with_metadata',
+]
+
+DEFAULT_TOLERANCE = 0.15
+
+# Runs one script with its AWS clients pointed at the local stand-in, then reports peak RSS
+DRIVER = """
+import json, resource, sys, time
+sys.path.insert(0, {repo!r})
+import importlib
+from types import SimpleNamespace
+import ingestion_pipeline
+from local_s3 import AsyncLocalS3Client, LocalS3Client
+
+client = LocalS3Client('s3')
+config = SimpleNamespace(s3=SimpleNamespace(data_bucket_name='bench'))
+script = importlib.import_module({script!r})
+for module in (ingestion_pipeline, script):
+    module.get_s3_client = lambda: client
+    module.get_config = lambda: config
+ingestion_pipeline.create_async_s3_client = lambda max_pool_connections: AsyncLocalS3Client(client)
+
+started = time.perf_counter()
+processed = script.main({argv!r})
+elapsed = time.perf_counter() - started
+print('result:' + json.dumps({{
+    'processed': processed,
+    'elapsed': elapsed,
+    'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}}))
+"""
+
+
+def run_script(script: str, workdir: Path, script_args: List[str]) -> Dict[str, Any]:
+    """Run one prepare script; returns its timings, peak RSS and final metrics snapshot."""
+    argv = ['--metrics-interval', '0', '--force', '--ingest', 'off'] + script_args
+    completed = subprocess.run(
+        [sys.executable, '-c', DRIVER.format(repo=str(REPO_ROOT), script=script, argv=argv)],
+        cwd=workdir, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"{script} failed:\n{completed.stderr[-4000:]}")
+
+    result_line = [line for line in completed.stdout.splitlines() if line.startswith('result:')][-1]
+    result = json.loads(result_line[len('result:'):])
+    # The metrics reporter always logs a final snapshot (see pipeline_metrics)
+    snapshots = [line.split('metrics ', 1)[1] for line in completed.stderr.splitlines()
+                 if ':pipeline_metrics:metrics ' in line]
+    metrics = json.loads(snapshots[-1]) if snapshots else {}
+
+    stages = metrics.get('stages', {})
+    documents = stages.get('local', {}).get('items', 0)
+    return {
+        'entities': result['processed'],
+        'documents': documents,
+        'elapsed': round(result['elapsed'], 3),
+        'documents_per_second': round(documents / result['elapsed'], 1) if result['elapsed'] else 0.0,
+        'peak_rss_mb': round(result['peak_rss_kb'] / 1024, 1),
+        'stage_seconds': {name: stage['seconds'] for name, stage in stages.items()},
+        'put_latency': metrics.get('latency_seconds', {}).get('put_object', {}),
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def load_baseline(params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    if not RESULTS_PATH.exists():
+        return None
+    baseline = None
+    with open(RESULTS_PATH, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                if entry.get('params') == params:
+                    baseline = entry
+    return baseline
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Regressions of more than tolerance in throughput or peak RSS."""
+    regressions = []
+    for script, now in current['scripts'].items():
+        before = baseline['scripts'].get(script)
+        if not before:
+            continue
+        if now['documents_per_second'] < before['documents_per_second'] * (1 - tolerance):
+            regressions.append(f"{script}: {now['documents_per_second']} docs/s vs "
+                               f"{before['documents_per_second']} at {baseline['revision']}")
+        if now['peak_rss_mb'] > before['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(f"{script}: peak RSS {now['peak_rss_mb']} MB vs "
+                               f"{before['peak_rss_mb']} MB at {baseline['revision']}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_generator_arguments(parser)
+    parser.add_argument('--script-args', default='',
+                        help="Extra options passed to both prepare scripts, e.g. '--build-workers 4'")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed fractional slowdown / RSS growth before a run counts as a regression")
+    parser.add_argument('--no-save', action='store_true', help="Do not append this run to the results file")
+    args = parser.parse_args(argv)
+
+    params = {
+        'events': args.events, 'locations': args.locations, 'mentions': args.mentions,
+        'chunks': args.chunks, 'chunk_chars': args.chunk_chars, 'duplicate_rate': args.duplicate_rate,
+        'seed': args.seed,
+        'script_args': args.script_args,
+    }
+    current: Dict[str, Any] = {
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'params': params,
+        'scripts': {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix='bench-ingestion-') as tmp:
+        workdir = Path(tmp)
+        started = time.perf_counter()
+        generate(workdir, args)
+        print(f"Generated exports in {time.perf_counter() - started:.1f}s")
+        for script in SCRIPTS:
+            result = run_script(script, workdir, shlex.split(args.script_args))
+            current['scripts'][script] = result
+            stages = '  '.join(f"{name} {seconds:.2f}s" for name, seconds in result['stage_seconds'].items())
+            print(f"{script:<34} {result['documents']:>8} docs  {result['elapsed']:7.2f}s  "
+                  f"{result['documents_per_second']:>9.1f} docs/s  peak RSS {result['peak_rss_mb']:7.1f} MB")
+            print(f"{'':<34} {stages}")
+            if result['put_latency']:
+                latency = result['put_latency']
+                print(f"{'':<34} put_object p50 {latency['p50'] * 1000:.2f} ms  "
+                      f"p95 {latency['p95'] * 1000:.2f} ms  p99 {latency['p99'] * 1000:.2f} ms")
+
+    baseline = load_baseline(params)
+    regressions = compare(current, baseline, args.tolerance) if baseline else []
+    if baseline is None:
+        print("No earlier result with these parameters; this run becomes the baseline")
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+
+    if not args.no_save:
+        RESULTS_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with open(RESULTS_PATH, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(current, sort_keys=True) + '\n')
+        print(f"Results appended to {RESULTS_PATH.relative_to(REPO_ROOT)}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Regional source cost: scanning the whole locations export vs the spatial index.
+
+Writes a synthetic locations export (see synthetic_export.py), builds the
+index once, then times how long it takes to produce the entities of a
+region both ways: streaming every entity and filtering on its metadata,
+and an index lookup followed by reading only the matching spans. The
+results of both are compared first.
+
+    python benchmarks/bench_location_index.py [--locations 50000] [--radius-km 500]
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from firestore_stream import iter_firestore_entities  # noqa: E402
+from location_index import LocationIndex, Region, RegionSource  # noqa: E402
+from prepare_locations_with_metadata import location_attributes  # noqa: E402
+from synthetic_export import write_locations_export  # noqa: E402
+
+
+def full_scan(path: str, region: Region) -> List[str]:
+    keys = []
+    for key, entity in iter_firestore_entities(path):
+        attributes = location_attributes(key, entity)
+        if region.contains(attributes['latitude'], attributes['longitude']):
+            keys.append(key)
+    return keys
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--locations', type=int, default=50000, help="Location entities in the export")
+    parser.add_argument('--mentions', type=int, default=3, help="Articles mentioning each location")
+    parser.add_argument('--chunks', type=int, default=2, help="Text chunks per article mention")
+    parser.add_argument('--near', default='38.7,-9.1', help="Centre of the region, LAT,LON")
+    parser.add_argument('--radius-km', type=float, default=500)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        export = Path(scratch) / 'global_locations.json'
+        write_locations_export(export, args.locations, mentions=args.mentions, chunks=args.chunks)
+        print(f"export: {args.locations} locations, {export.stat().st_size / 1e6:.1f} MB")
+        latitude, longitude = (float(value) for value in args.near.split(','))
+        region = Region(near=(latitude, longitude), radius_km=args.radius_km)
+
+        started = time.perf_counter()
+        index = LocationIndex(Path(scratch) / 'locations.index.sqlite', export, location_attributes).open()
+        build = time.perf_counter() - started
+
+        started = time.perf_counter()
+        scanned = full_scan(str(export), region)
+        scan = time.perf_counter() - started
+
+        started = time.perf_counter()
+        entries = index.query(region)
+        indexed = [key for key, _ in RegionSource(str(export), entries)]
+        lookup = time.perf_counter() - started
+        index.close()
+
+    assert indexed == scanned, "index and full scan disagree"
+    print(f"region: {region.describe()}, {len(indexed)} locations")
+    print(f"index build (once per export) {build:8.3f} s")
+    print(f"full scan + filter            {scan:8.3f} s")
+    print(f"index lookup + read spans     {lookup:8.3f} s  {scan / lookup:6.1f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Per-entity cost of metadata generation: compiled field specs vs the old hand-written functions.
+
+The pre-spec implementations are kept below verbatim as the baseline. Both
+run over the same synthetic entities (see synthetic_export.py) plus a set
+of sparse / malformed ones, and their outputs are compared first: they
+must match except where the old code was wrong (a missing articleHashes
+became 'u', an empty one raised IndexError).
+
+    python benchmarks/bench_metadata.py [--entities 20000] [--repeat 15] [--min-speedup 1.1]
+
+Building the two output dicts costs the same in both and dominates a
+call, so the cost of doing that alone is measured too and subtracted to
+get the field-extraction work each implementation adds on top. The three
+are timed in turn within every round, so a noisy machine slows them alike;
+the fastest round of each counts. Exits non-zero when the field-extraction
+speedup drops below --min-speedup.
+"""
+
+import argparse
+import random
+import sys
+import timeit
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from prepare_events_with_metadata import generate_event_metadata  # noqa: E402
+from prepare_locations_with_metadata import generate_location_metadata  # noqa: E402
+from synthetic_export import ChunkTexts, synthetic_event, synthetic_location  # noqa: E402
+
+DEFAULT_MIN_SPEEDUP = 1.1
+
+
+def legacy_event_metadata(event: Dict[str, Any]) -> Dict[str, Any]:
+    article_hash = event.get('articleHashes', 'unknown')[0] if event.get('articleHashes', 'unknown')[0] else 'unknown'
+    location_id = event.get('linkedLocationId', 'unknown') if event.get('linkedLocationId', 'unknown') else 'unknown'
+    category = event.get('category', 'general') if event.get('category', 'general') else 'general'
+    display_name = event.get("linkedLocationName", 'unknown') if event.get("linkedLocationName", 'unknown') else 'unknown'
+    return {
+        "metadataAttributes": {
+            "locationId": str(location_id),
+            "article_hash": article_hash,
+            "displayName": display_name,
+            "categories": [category],
+        }
+    }
+
+
+def legacy_location_metadata(location: Dict[str, Any], location_id: str, article_hash: str) -> Dict[str, Any]:
+    display_name = location.get('displayName', 'Unknown Location') if location.get('displayName', 'Unknown Location') else 'unknown'
+    categories = location.get('categories', []) if location.get('categories', []) else []
+    primary_category = location.get('primaryCategory', 'general') if location.get('primaryCategory', 'general') else 'unknown'
+    address_data = location.get('address', {})
+    city = address_data.get('city', 'unknown') if address_data.get('city', 'unknown') else 'unknown'
+    country = address_data.get('country', 'unknown') if address_data.get('country', 'unknown') else 'unknown'
+    coords = location.get('coordinates', {})
+    latitude = coords.get('latitude', 0.0) if coords.get('latitude', 0.0) else 0.0
+    longitude = coords.get('longitude', 0.0) if coords.get('longitude', 0.0) else 0.0
+    if not categories:
+        categories = ["general"]
+    return {
+        "metadataAttributes": {
+            "locationId": str(location_id),
+            "article_hash": article_hash,
+            "displayName": display_name,
+            "categories": categories[:10],
+            "primaryCategory": primary_category,
+            "city": city,
+            "country": country,
+            "latitude": latitude,
+            "longitude": longitude
+        }
+    }
+
+
+SPARSE_EVENTS = [
+    {'articleHashes': ['abc'], 'linkedLocationId': 42, 'category': '', 'linkedLocationName': None},
+    {'articleHashes': [''], 'category': 'music'},
+]
+
+SPARSE_LOCATIONS = [
+    {},
+    {'displayName': '', 'categories': [], 'primaryCategory': None, 'address': {}, 'coordinates': {}},
+    {'displayName': 'X', 'categories': list('abcdefghijkl'), 'address': {'city': 'Oslo'},
+     'coordinates': {'latitude': 59.9, 'longitude': 10.7}},
+]
+
+
+def check_equivalence(events: List[Dict[str, Any]], locations: List[Dict[str, Any]]) -> None:
+    for event in events + SPARSE_EVENTS:
+        assert generate_event_metadata(event) == legacy_event_metadata(event), event
+    for location in locations + SPARSE_LOCATIONS:
+        assert (generate_location_metadata(location, 'loc1', 'hash1')
+                == legacy_location_metadata(location, 'loc1', 'hash1')), location
+    # Where the old code was wrong
+    assert generate_event_metadata({})['metadataAttributes']['article_hash'] == 'unknown'
+    assert generate_event_metadata({'articleHashes': []})['metadataAttributes']['article_hash'] == 'unknown'
+
+
+def event_floor(event: Dict[str, Any]) -> Dict[str, Any]:
+    return {'metadataAttributes': {'locationId': 'l', 'article_hash': 'a', 'displayName': 'd',
+                                   'categories': ['c']}}
+
+
+def location_floor(location: Dict[str, Any], location_id: str, article_hash: str) -> Dict[str, Any]:
+    return {'metadataAttributes': {'locationId': location_id, 'article_hash': article_hash, 'displayName': 'd',
+                                   'categories': ['c'], 'primaryCategory': 'p', 'city': 'c', 'country': 'c',
+                                   'latitude': 0.0, 'longitude': 0.0}}
+
+
+def per_entity_ns(functions: List[Callable], args: List[tuple], repeat: int) -> List[float]:
+    """Fastest time per call of each function, timing them in turn within each round."""
+    timers = [timeit.Timer('for arguments in args: function(*arguments)', globals={'function': function, 'args': args})
+              for function in functions]
+    best = [float('inf')] * len(functions)
+    for _ in range(repeat):
+        for index, timer in enumerate(timers):
+            best[index] = min(best[index], timer.timeit(number=1))
+    return [seconds / len(args) * 1e9 for seconds in best]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entities', type=int, default=20000, help="Synthetic entities per document type")
+    parser.add_argument('--repeat', type=int, default=15, help="Timing rounds; the fastest counts")
+    parser.add_argument('--min-speedup', type=float, default=DEFAULT_MIN_SPEEDUP,
+                        help="Fail when the compiled extractors are less than this many times faster")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    texts = ChunkTexts(rng, 40, duplicate_rate=0.0)
+    events = [synthetic_event(rng, texts, locations=1000, mentions=2, chunks=0) for _ in range(args.entities)]
+    locations = [synthetic_location(rng, texts, index, mentions=0, chunks=0) for index in range(args.entities)]
+    check_equivalence(events, locations)
+
+    cases = [
+        ('events', [(event,) for event in events], event_floor, legacy_event_metadata, generate_event_metadata),
+        ('locations', [(location, 'loc1', 'hash1') for location in locations], location_floor,
+         legacy_location_metadata, generate_location_metadata),
+    ]
+    failed = False
+    for name, calls, floor, legacy, compiled in cases:
+        base, before, after = per_entity_ns([floor, legacy, compiled], calls, args.repeat)
+        speedup = (before - base) / max(after - base, 1.0)
+        failed = failed or speedup < args.min_speedup
+        print(f"{name:<10} legacy {before:6.0f} ns  compiled {after:6.0f} ns  (output dicts alone {base:4.0f} ns)  "
+              f"per call {before / after:4.2f}x  field extraction {speedup:4.2f}x")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
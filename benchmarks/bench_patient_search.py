@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Patient name search latency as the table grows: LIKE '%term%' scan vs the FTS5 trigram index.
+
+Fills an SQLite patients table with synthetic names in steps, through the
+same PatientSearchIndex the API uses (so the sync triggers are exercised
+on every insert), and times first-page and deep-page queries after each
+step. The LIKE baseline is only timed up to --like-max rows.
+
+    python benchmarks/bench_patient_search.py [--sizes 10000,100000,1000000] [--max-growth 3]
+
+Exits non-zero when the median indexed query at the largest size is more
+than --max-growth times slower than at the smallest.
+"""
+
+import argparse
+import random
+import sqlite3
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'test-files' / 'hipaa-violations'))
+
+from patient_search import PatientSearchIndex  # noqa: E402
+
+FIRST_NAMES = ("James Mary Robert Patricia John Jennifer Michael Linda David Elizabeth William Barbara Richard "
+               "Susan Joseph Jessica Thomas Sarah Charles Karen Amara Chen Dmitri Fatima Hiroshi Ingrid").split()
+LAST_NAMES = ("Smith Johnson Williams Brown Jones Garcia Miller Davis Rodriguez Martinez Hernandez Lopez "
+              "Gonzalez Wilson Anderson Thomas Taylor Moore Jackson Martin Okafor Nakamura Petrov").split()
+
+DEFAULT_SIZES = '10000,100000,1000000'
+DEFAULT_MAX_GROWTH = 3.0
+TERMS = ['ohns', 'Nakamura', 'ingrid', 'ez M']
+
+
+def fill(index: PatientSearchIndex, rng: random.Random, start: int, stop: int) -> None:
+    with index.conn:
+        index.conn.executemany(
+            "INSERT INTO patient_names (id, name) VALUES (?, ?)",
+            ((str(patient_id), f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {patient_id}")
+             for patient_id in range(start, stop)))
+
+
+def median_ms(query: Callable[[], object], repeat: int) -> float:
+    timings: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        query()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def like_query(conn: sqlite3.Connection, term: str, limit: int) -> list:
+    return conn.execute("SELECT id, name FROM patient_names WHERE name LIKE ? ORDER BY doc LIMIT ?",
+                        (f"%{term}%", limit)).fetchall()
+
+
+def rare_like_query(conn: sqlite3.Connection, limit: int) -> list:
+    # No match at all: LIKE has to read every row to find that out
+    return like_query(conn, 'zzqx', limit)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="Comma-separated table sizes to measure at")
+    parser.add_argument('--like-max', type=int, default=1000000, help="Largest table the LIKE scan is timed on")
+    parser.add_argument('--limit', type=int, default=20, help="Page size")
+    parser.add_argument('--repeat', type=int, default=20, help="Timed runs per query; the median counts")
+    parser.add_argument('--max-growth', type=float, default=DEFAULT_MAX_GROWTH,
+                        help="Fail when indexed latency grows more than this from the smallest to the largest size")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    sizes = sorted(int(size) for size in args.sizes.split(','))
+
+    rng = random.Random(args.seed)
+    index = PatientSearchIndex.open(':memory:')
+    conn = index.conn
+    indexed_ms: List[float] = []
+    rows = 0
+    print(f"{'rows':>10} {'fts page 1':>12} {'fts page 5':>12} {'fts no match':>13} {'LIKE page 1':>12} "
+          f"{'LIKE no match':>14}")
+    for size in sizes:
+        started = time.perf_counter()
+        fill(index, rng, rows, size)
+        load = time.perf_counter() - started
+        rows = size
+
+        # Both must agree before anything is timed
+        for term in TERMS:
+            expected = like_query(conn, term, args.limit)
+            assert [(row['id'], row['name']) for row in index.search(term, args.limit).results] == expected, term
+
+        def first_pages():
+            for term in TERMS:
+                index.search(term, args.limit)
+
+        def deep_pages():
+            for term in TERMS:
+                after = None
+                for _ in range(5):
+                    after = index.search(term, args.limit, after=after).next_after
+
+        first = median_ms(first_pages, args.repeat) / len(TERMS)
+        deep = median_ms(deep_pages, args.repeat) / len(TERMS)
+        miss = median_ms(lambda: index.search('zzqx', args.limit), args.repeat)
+        indexed_ms.append(first)
+        if size <= args.like_max:
+            like_first = median_ms(lambda: [like_query(conn, term, args.limit) for term in TERMS],
+                                   max(3, args.repeat // 4)) / len(TERMS)
+            like_miss = median_ms(lambda: rare_like_query(conn, args.limit), max(3, args.repeat // 4))
+            like = f"{like_first:10.3f}ms {like_miss:12.3f}ms"
+        else:
+            like = f"{'-':>12} {'-':>14}"
+        print(f"{size:>10} {first:10.3f}ms {deep:10.3f}ms {miss:11.3f}ms {like}   (loaded in {load:.1f}s)")
+
+    growth = indexed_ms[-1] / indexed_ms[0]
+    print(f"indexed first-page latency, largest vs smallest table: {growth:.2f}x")
+    return 1 if growth > args.max_growth else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Per-document metadata serialization cost: the old double encoding vs metadata_json.
+
+Before, every document's metadata was encoded twice: pretty-printed for
+the local file and compact for S3. Now it is encoded once, with orjson
+when installed and the stdlib otherwise. All three are timed on metadata
+built from synthetic entities (see synthetic_export.py).
+
+    python benchmarks/bench_serialization.py [--documents 20000] [--repeat 5]
+"""
+
+import argparse
+import json
+import random
+import sys
+import timeit
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import metadata_json  # noqa: E402
+from prepare_events_with_metadata import generate_event_metadata  # noqa: E402
+from prepare_locations_with_metadata import generate_location_metadata  # noqa: E402
+from synthetic_export import ChunkTexts, synthetic_event, synthetic_location  # noqa: E402
+
+
+def double_encoding(metadata: Dict[str, Any]) -> None:
+    json.dumps(metadata, indent=2, ensure_ascii=False).encode('utf-8')
+    json.dumps(metadata).encode('utf-8')
+
+
+def per_document_ns(function, documents: List[Dict[str, Any]], repeat: int) -> float:
+    timer = timeit.Timer('for metadata in documents: function(metadata)',
+                         globals={'function': function, 'documents': documents})
+    return min(timer.repeat(repeat=repeat, number=1)) / len(documents) * 1e9
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--documents', type=int, default=20000, help="Metadata records per document type")
+    parser.add_argument('--repeat', type=int, default=5, help="Timing runs; the fastest counts")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    texts = ChunkTexts(rng, 40)
+    cases = {
+        'events': [generate_event_metadata(synthetic_event(rng, texts, locations=1000, mentions=2, chunks=0))
+                   for _ in range(args.documents)],
+        'locations': [generate_location_metadata(synthetic_location(rng, texts, index, mentions=0, chunks=0),
+                                                 f"loc{index}", '%040x' % rng.getrandbits(160))
+                      for index in range(args.documents)],
+    }
+
+    encoders = [('indent=2 + compact (old)', double_encoding), ('stdlib compact', metadata_json.stdlib_dumps)]
+    if metadata_json.orjson is not None:
+        encoders.append(('orjson', metadata_json.dumps))
+    else:
+        print("orjson is not installed; only the stdlib fallback is timed")
+
+    for name, documents in cases.items():
+        for document in documents[:100]:
+            assert json.loads(metadata_json.dumps(document)) == document
+        baseline = None
+        for label, encoder in encoders:
+            ns = per_document_ns(encoder, documents, args.repeat)
+            baseline = baseline or ns
+            print(f"{name:<10} {label:<26} {ns:8.0f} ns/document  {baseline / ns:5.2f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
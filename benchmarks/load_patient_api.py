@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""Load test for the patient API's read endpoints (test-files/hipaa-violations/patient_api.py).
+
+Start the app first, e.g. under gunicorn with a few workers, then:
+
+    python benchmarks/load_patient_api.py --url http://127.0.0.1:5000 --seed 20000 \
+        [--threads 16] [--duration 10] [--scenario page --scenario poll ...]
+
+Each scenario runs for --duration seconds on --threads keep-alive
+connections and reports throughput, status codes, bytes per response and
+latency percentiles:
+
+  full      GET /api/patients?limit=500            large pages, every field
+  page      GET /api/patients?limit=50             first page
+  deep      walk the cursor chain to the last page
+  fields    GET /api/patients?limit=50&fields=id,name
+  poll      repeat a page with If-None-Match        expect 304s
+  record    GET /api/patients/<id>                  random ids from the seeded range
+"""
+
+import argparse
+import http.client
+import json
+import random
+import socket
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+SCENARIOS = ('full', 'page', 'deep', 'fields', 'poll', 'record')
+
+Request = Tuple[str, Dict[str, str]]
+
+
+class Client:
+    """One keep-alive connection; reconnects after errors."""
+
+    def __init__(self, url: str, timeout: float = 30.0):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.conn: Optional[http.client.HTTPConnection] = None
+
+    def request(self, method: str, path: str, headers: Optional[Dict[str, str]] = None,
+                body: Optional[bytes] = None) -> Tuple[int, Dict[str, str], bytes]:
+        try:
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+                self.conn.connect()
+                # Small requests must not wait on Nagle + delayed ACK
+                self.conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.conn.request(method, path, body=body, headers=headers or {})
+            response = self.conn.getresponse()
+            return response.status, dict(response.getheaders()), response.read()
+        except (OSError, http.client.HTTPException):
+            if self.conn is not None:
+                self.conn.close()
+            self.conn = None
+            raise
+
+
+def seed(url: str, count: int) -> None:
+    client = Client(url)
+    rng = random.Random(0)
+    for patient_id in range(1, count + 1):
+        body = json.dumps({
+            'id': patient_id, 'name': f"Patient {patient_id}", 'ssn': '000-00-0000',
+            'dob': f"19{rng.randint(30, 99)}-01-01", 'diagnosis': 'Synthetic',
+            'medications': ['Placebo'] * rng.randint(1, 4), 'notes': 'x' * rng.randint(50, 500),
+        }).encode('utf-8')
+        status, _, _ = client.request('POST', '/api/patients', {'Content-Type': 'application/json'}, body)
+        if status != 201:
+            raise RuntimeError(f"Seeding failed at patient {patient_id}: HTTP {status}")
+
+
+def scenario_requests(name: str, client: Client, rng: random.Random, seeded: int) -> Callable[[], Request]:
+    """Returns a function producing the next request of a scenario for one thread."""
+    if name == 'full':
+        return lambda: ('/api/patients?limit=500', {})
+    if name == 'page':
+        return lambda: ('/api/patients?limit=50', {})
+    if name == 'fields':
+        return lambda: ('/api/patients?limit=50&fields=id,name', {})
+    if name == 'record':
+        return lambda: (f"/api/patients/{rng.randint(1, max(seeded, 2))}", {})
+    if name == 'poll':
+        _, headers, _ = client.request('GET', '/api/patients?limit=50')
+        etag = headers.get('ETag', '')
+        return lambda: ('/api/patients?limit=50', {'If-None-Match': etag})
+    if name == 'deep':
+        cursor: List[Optional[str]] = [None]
+
+        def next_page() -> Request:
+            path = '/api/patients?limit=50' + (f"&cursor={cursor[0]}" if cursor[0] else '')
+            return path, {}
+        next_page.cursor = cursor  # Advanced from the response by the worker
+        return next_page
+    raise ValueError(f"Unknown scenario {name!r}")
+
+
+def run_scenario(name: str, url: str, threads: int, duration: float, seeded: int) -> Dict[str, object]:
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    sizes: List[int] = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker(index: int) -> None:
+        client = Client(url)
+        rng = random.Random(index)
+        next_request = scenario_requests(name, client, rng, seeded)
+        local_latencies, local_statuses, local_sizes, local_errors = [], Counter(), [], 0
+        while time.monotonic() < deadline:
+            path, headers = next_request()
+            started = time.perf_counter()
+            try:
+                status, response_headers, body = client.request('GET', path, headers)
+            except (OSError, http.client.HTTPException):
+                local_errors += 1
+                continue
+            local_latencies.append(time.perf_counter() - started)
+            local_statuses[status] += 1
+            local_sizes.append(len(body))
+            if name == 'deep' and status == 200:
+                next_request.cursor[0] = json.loads(body).get('next_cursor')
+        with lock:
+            latencies.extend(local_latencies)
+            statuses.update(local_statuses)
+            sizes.extend(local_sizes)
+            errors[0] += local_errors
+
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    started = time.monotonic()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+
+    def percentile(q: float) -> float:
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else 0.0
+
+    return {
+        'scenario': name, 'requests': len(latencies), 'errors': errors[0],
+        'rps': len(latencies) / elapsed if elapsed else 0.0,
+        'statuses': dict(statuses), 'mean_bytes': statistics.mean(sizes) if sizes else 0,
+        'p50_ms': percentile(0.50), 'p95_ms': percentile(0.95), 'p99_ms': percentile(0.99),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help="Base URL of the running app")
+    parser.add_argument('--seed', type=int, default=0, help="POST this many synthetic patients first")
+    parser.add_argument('--threads', type=int, default=16, help="Concurrent keep-alive connections")
+    parser.add_argument('--duration', type=float, default=10.0, help="Seconds per scenario")
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS,
+                        help="Scenario to run (repeatable; default: all)")
+    parser.add_argument('--json', action='store_true', help="Print one JSON object per scenario")
+    args = parser.parse_args(argv)
+
+    if args.seed:
+        started = time.perf_counter()
+        seed(args.url, args.seed)
+        print(f"seeded {args.seed} patients in {time.perf_counter() - started:.1f}s")
+
+    failed = False
+    for name in args.scenario or SCENARIOS:
+        result = run_scenario(name, args.url, args.threads, args.duration, args.seed)
+        failed = failed or result['errors'] > 0 or any(status >= 500 for status in result['statuses'])
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print(f"{name:<7} {result['requests']:>8} req {result['rps']:>9.1f} req/s  "
+                  f"p50 {result['p50_ms']:7.2f} ms  p95 {result['p95_ms']:7.2f} ms  p99 {result['p99_ms']:7.2f} ms  "
+                  f"{result['mean_bytes']:>8.0f} B/resp  {result['statuses']}  errors {result['errors']}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""Generate synthetic Firestore exports shaped like global_events.json and global_locations.json.
+
+    python benchmarks/synthetic_export.py --events 20000 --locations 5000 \
+        --mentions 3 --chunks 4 --chunk-chars 400 --output-dir /tmp/bench
+
+Entities are written one at a time, so exports far larger than memory can
+be generated. The same seed always produces the same files.
+"""
+
+import argparse
+import json
+import random
+from pathlib import Path
+from typing import Any, Dict, List, Optional, TextIO
+
+DEFAULT_SEED = 1234
+
+# Small vocabulary so chunk text compresses and tokenises roughly like real prose
+WORDS = (
+    "the a of and to in for on with at by from festival market concert museum gallery park river "
+    "street night weekend tickets open free local music food art history tour family children "
+    "summer winter opening hours reviews visitors city centre bar cafe restaurant theatre show "
+    "exhibition season event venue community annual celebration live stage outdoor indoor"
+).split()
+
+CITIES = [('Lisbon', 'Portugal'), ('Porto', 'Portugal'), ('Madrid', 'Spain'), ('Berlin', 'Germany'),
+          ('Paris', 'France'), ('Austin', 'United States'), ('Kyoto', 'Japan'), ('Toronto', 'Canada')]
+CATEGORIES = ['music', 'food', 'art', 'nightlife', 'sports', 'family', 'history', 'outdoors']
+
+
+def chunk_text(rng: random.Random, chars: int) -> str:
+    words: List[str] = []
+    length = 0
+    while length < chars:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)[:chars]
+
+
+class ChunkTexts:
+    """Produces chunk texts, repeating earlier ones at duplicate_rate like real cross-posted articles.
+
+    Half of the repeats are verbatim and half have one word replaced, so
+    both exact and near-duplicate dedup have something to find.
+    """
+
+    POOL_SIZE = 1000
+
+    def __init__(self, rng: random.Random, chars: int, duplicate_rate: float = 0.0):
+        self.rng = rng
+        self.chars = chars
+        self.duplicate_rate = duplicate_rate
+        self.pool: List[str] = []
+
+    def __call__(self) -> str:
+        if self.pool and self.rng.random() < self.duplicate_rate:
+            text = self.rng.choice(self.pool)
+            if self.rng.random() < 0.5:
+                words = text.split(' ')
+                words[self.rng.randrange(len(words))] = self.rng.choice(WORDS)
+                text = ' '.join(words)
+            return text
+        text = chunk_text(self.rng, self.chars)
+        if len(self.pool) < self.POOL_SIZE:
+            self.pool.append(text)
+        else:
+            self.pool[self.rng.randrange(self.POOL_SIZE)] = text
+        return text
+
+
+def _article_hash(rng: random.Random) -> str:
+    return '%032x' % rng.getrandbits(128)
+
+
+def synthetic_event(rng: random.Random, texts: ChunkTexts, locations: int, mentions: int,
+                    chunks: int) -> Dict[str, Any]:
+    article_hashes = [_article_hash(rng) for _ in range(mentions)]
+    location = rng.randrange(max(locations, 1))
+    return {
+        'eventHash': '%040x' % rng.getrandbits(160),
+        'articleHashes': article_hashes,
+        'linkedLocationId': f"loc{location:07d}",
+        'linkedLocationName': f"Venue {location}",
+        'category': rng.choice(CATEGORIES),
+        '__collections__': {
+            'contextual_mentions': {
+                article: {'mentions': [{'chunkText': texts()} for _ in range(chunks)]}
+                for article in article_hashes
+            }
+        },
+    }
+
+
+def synthetic_location(rng: random.Random, texts: ChunkTexts, index: int, mentions: int,
+                       chunks: int) -> Dict[str, Any]:
+    city, country = rng.choice(CITIES)
+    categories = rng.sample(CATEGORIES, rng.randint(1, 3))
+    return {
+        'displayName': f"Venue {index}",
+        'categories': categories,
+        'primaryCategory': categories[0],
+        'address': {'city': city, 'country': country},
+        'coordinates': {'latitude': round(rng.uniform(-60, 60), 6), 'longitude': round(rng.uniform(-180, 180), 6)},
+        '__collections__': {
+            'contextual_mentions': {
+                _article_hash(rng): {'chunks': [{'chunkText': texts()} for _ in range(chunks)]}
+                for _ in range(mentions)
+            }
+        },
+    }
+
+
+def _write_object(f: TextIO, items) -> None:
+    f.write('{')
+    for i, (key, value) in enumerate(items):
+        if i:
+            f.write(',\n')
+        f.write(json.dumps(key))
+        f.write(': ')
+        f.write(json.dumps(value, ensure_ascii=False))
+    f.write('}')
+
+
+def write_events_export(path: Path, count: int, locations: int = 1000, mentions: int = 2, chunks: int = 3,
+                        chunk_chars: int = 300, duplicate_rate: float = 0.0, seed: int = DEFAULT_SEED) -> None:
+    """Write a wrapped export ({"data": {...}}) like global_events.json."""
+    rng = random.Random(seed)
+    texts = ChunkTexts(rng, chunk_chars, duplicate_rate)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{"meta": {"synthetic": true}, "data": ')
+        _write_object(f, ((f"evt{i:08d}", synthetic_event(rng, texts, locations, mentions, chunks))
+                          for i in range(count)))
+        f.write('}\n')
+
+
+def write_locations_export(path: Path, count: int, mentions: int = 3, chunks: int = 2, chunk_chars: int = 300,
+                           duplicate_rate: float = 0.0, seed: int = DEFAULT_SEED) -> None:
+    """Write a bare export ({key: entity, ...}) like global_locations.json."""
+    rng = random.Random(seed + 1)
+    texts = ChunkTexts(rng, chunk_chars, duplicate_rate)
+    with open(path, 'w', encoding='utf-8') as f:
+        _write_object(f, ((f"loc{i:07d}", synthetic_location(rng, texts, i, mentions, chunks))
+                          for i in range(count)))
+        f.write('\n')
+
+
+def add_generator_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--events', type=int, default=20000, help="Number of event entities")
+    parser.add_argument('--locations', type=int, default=5000, help="Number of location entities")
+    parser.add_argument('--mentions', type=int, default=3, help="Articles mentioning each entity")
+    parser.add_argument('--chunks', type=int, default=3, help="Text chunks per article mention")
+    parser.add_argument('--chunk-chars', type=int, default=300, help="Characters per text chunk")
+    parser.add_argument('--duplicate-rate', type=float, default=0.0,
+                        help="Fraction of chunks that repeat an earlier chunk (half verbatim, half with one word changed)")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+
+
+def generate(output_dir: Path, args: argparse.Namespace) -> None:
+    """Write both exports into output_dir using the generator options in args."""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    write_events_export(output_dir / 'global_events.json', args.events, locations=args.locations,
+                        mentions=args.mentions, chunks=args.chunks, chunk_chars=args.chunk_chars,
+                        duplicate_rate=args.duplicate_rate, seed=args.seed)
+    write_locations_export(output_dir / 'global_locations.json', args.locations, mentions=args.mentions,
+                           chunks=args.chunks, chunk_chars=args.chunk_chars,
+                           duplicate_rate=args.duplicate_rate, seed=args.seed)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_generator_arguments(parser)
+    parser.add_argument('--output-dir', type=Path, default=Path('.'))
+    args = parser.parse_args(argv)
+    generate(args.output_dir, args)
+    for name in ('global_events.json', 'global_locations.json'):
+        path = args.output_dir / name
+        print(f"{path}: {path.stat().st_size / 1e6:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
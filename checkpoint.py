@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""Periodic checkpoints for long prepare runs, so an interrupted run can resume with --resume."""
+
+import collections
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT_INTERVAL = 30.0  # seconds
+
+# (doc_id, s3_key, content_hash, metadata_hash, entity_key) rows waiting for their uploads to finish
+ManifestRow = Tuple[str, str, str, str, str]
+
+
+@dataclass
+class CheckpointState:
+    """What a previous, interrupted run had finished."""
+
+    source_path: str
+    run_id: int
+    last_entity_key: Optional[str] = None
+    entities_done: int = 0
+    uploaded: Set[str] = field(default_factory=set)
+
+
+@dataclass
+class _PendingEntity:
+    entity_key: str
+    remaining: int
+    rows: List[ManifestRow]
+
+
+class Checkpoint:
+    """Tracks which entities are fully uploaded and periodically persists that to disk.
+
+    Entities are registered in the order they are processed. An entity is
+    finished once every object it queued has been uploaded; the checkpoint
+    position only advances over a contiguous run of finished entities, so
+    everything up to last_entity_key is known to be in S3. Uploaded keys
+    are also appended to a side log so a resumed run skips them even when
+    their entity was only partly done.
+    """
+
+    def __init__(self, path: Union[str, Path], source_path: str, run_id: int,
+                 resume: Optional[CheckpointState] = None,
+                 interval: float = DEFAULT_CHECKPOINT_INTERVAL):
+        self.path = Path(path)
+        self.uploaded_log_path = self.path.with_name(self.path.name + '.uploaded')
+        self.source_path = source_path
+        self.run_id = run_id
+        self.interval = interval
+
+        self.last_entity_key = resume.last_entity_key if resume else None
+        self.entities_done = resume.entities_done if resume else 0
+        self.uploaded: Set[str] = set(resume.uploaded) if resume else set()
+
+        self._lock = threading.Lock()
+        self._pending: Deque[_PendingEntity] = collections.deque()
+        self._by_key: Dict[str, _PendingEntity] = {}
+        self._last_saved = time.monotonic()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if resume is None:
+            self.uploaded_log_path.unlink(missing_ok=True)
+        self._uploaded_log = open(self.uploaded_log_path, 'a', encoding='utf-8')
+        # Written right away, so a run that dies before its first interval still leaves a
+        # checkpoint for load() to pair with the uploaded log
+        self.save()
+
+    @staticmethod
+    def load(path: Union[str, Path]) -> Optional[CheckpointState]:
+        """Read the checkpoint left by an interrupted run, if any."""
+        path = Path(path)
+        if not path.exists():
+            return None
+        data = json.loads(path.read_text())
+        state = CheckpointState(
+            source_path=data['source_path'],
+            run_id=data['run_id'],
+            last_entity_key=data.get('last_entity_key'),
+            entities_done=data.get('entities_done', 0),
+        )
+        uploaded_log = path.with_name(path.name + '.uploaded')
+        if uploaded_log.exists():
+            with open(uploaded_log, encoding='utf-8') as f:
+                state.uploaded = {line.rstrip('\n') for line in f if line.strip()}
+        return state
+
+    def is_uploaded(self, key: str) -> bool:
+        return key in self.uploaded
+
+    def begin_entity(self, entity_key: str, keys: List[str], rows: List[ManifestRow]) -> None:
+        """Register an entity and the object keys it is about to queue, before they are submitted."""
+        entity = _PendingEntity(entity_key, 0, rows)
+        with self._lock:
+            for key in keys:
+                if key in self.uploaded:
+                    continue
+                entity.remaining += 1
+                self._by_key[key] = entity
+            self._pending.append(entity)
+
+    def mark_uploaded(self, key: str) -> None:
+        """Upload-completion callback; safe to call from uploader threads."""
+        with self._lock:
+            self.uploaded.add(key)
+            self._uploaded_log.write(key + '\n')
+            entity = self._by_key.pop(key, None)
+            if entity is not None:
+                entity.remaining -= 1
+
+    def pending_keys(self) -> List[str]:
+        """Keys queued but never confirmed, e.g. because their upload failed."""
+        with self._lock:
+            return list(self._by_key)
+
+    def advance(self) -> List[ManifestRow]:
+        """Move the position past finished entities and return their manifest rows."""
+        rows: List[ManifestRow] = []
+        with self._lock:
+            while self._pending and self._pending[0].remaining == 0:
+                entity = self._pending.popleft()
+                rows.extend(entity.rows)
+                self.last_entity_key = entity.entity_key
+                self.entities_done += 1
+        return rows
+
+    def drain(self) -> List[ManifestRow]:
+        """At the end of a run, advance as far as possible and return rows of every finished entity.
+
+        Entities behind an unfinished one are not covered by the position, but
+        their uploads are done, so their documents can still be recorded.
+        """
+        rows = self.advance()
+        with self._lock:
+            unfinished: Deque[_PendingEntity] = collections.deque()
+            for entity in self._pending:
+                if entity.remaining == 0:
+                    rows.extend(entity.rows)
+                    entity.rows = []
+                unfinished.append(entity)
+            self._pending = unfinished
+        return rows
+
+    @property
+    def pending_entities(self) -> int:
+        """Entities registered but not yet covered by the checkpoint position."""
+        return len(self._pending)
+
+    @property
+    def finished(self) -> bool:
+        """True once every registered entity has been fully uploaded."""
+        with self._lock:
+            return not self._pending
+
+    def due(self) -> bool:
+        return time.monotonic() - self._last_saved >= self.interval
+
+    def save(self) -> None:
+        """Atomically write the current position."""
+        with self._lock:
+            self._uploaded_log.flush()
+            os.fsync(self._uploaded_log.fileno())
+            data: Dict[str, Any] = {
+                'source_path': self.source_path,
+                'run_id': self.run_id,
+                'last_entity_key': self.last_entity_key,
+                'entities_done': self.entities_done,
+                'updated_at': time.time(),
+            }
+        tmp = self.path.with_name(self.path.name + '.tmp')
+        tmp.write_text(json.dumps(data))
+        os.replace(tmp, self.path)
+        self._last_saved = time.monotonic()
+
+    def complete(self) -> None:
+        """The run finished; remove the checkpoint so the next run starts fresh."""
+        self._uploaded_log.close()
+        self.path.unlink(missing_ok=True)
+        self.uploaded_log_path.unlink(missing_ok=True)
+
+    def close(self) -> None:
+        self._uploaded_log.close()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""Exact and near-duplicate chunk elimination across all documents of a run.
+
+The same chunkText often appears under several articles and entities. Each
+document body is split back into its chunks (on the transform's chunk
+separator); chunks already seen earlier in the run are dropped, and a
+document left with no chunks is not written at all.
+
+Exact duplicates are found by a 64-bit hash of the whitespace-normalised
+text. Near duplicates are found with MinHash signatures over word shingles
+and LSH banding, then confirmed by the estimated Jaccard similarity. All
+hashes and signatures live in a scratch SQLite database, so memory stays
+flat however many chunks a run sees.
+"""
+
+import hashlib
+import logging
+import operator
+import os
+import re
+import sqlite3
+import struct
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Set, Union
+
+from parallel_build import DocumentRecord
+
+logger = logging.getLogger(__name__)
+
+DEDUP_MODES = ('off', 'exact', 'near')
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_NUM_PERM = 64
+DEFAULT_BANDS = 8  # 8 bands x 8 rows puts the LSH threshold near 0.77
+DEFAULT_SHINGLE_SIZE = 5
+_MASK64 = (1 << 64) - 1
+_EMPTY = 1 << 64  # Larger than any 64-bit bin value
+_DENSIFY_OFFSET = 0x9E3779B97F4A7C15
+
+_WORD = re.compile(r'\w+')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def _hash64(data: bytes) -> int:
+    """Signed 64-bit hash, so it fits an SQLite INTEGER."""
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'big', signed=True)
+
+
+@dataclass
+class DedupStats:
+    """What deduplication removed during a run."""
+
+    chunks: int = 0
+    exact_duplicates: int = 0
+    near_duplicates: int = 0
+    bytes_saved: int = 0
+    documents_dropped: int = 0
+
+    def log(self) -> None:
+        logger.info(f"Dedup: {self.exact_duplicates} exact and {self.near_duplicates} near-duplicate chunks "
+                    f"of {self.chunks} removed; {self.documents_dropped} documents dropped, "
+                    f"{self.bytes_saved} bytes saved")
+
+
+class ChunkDeduplicator:
+    """Remembers every chunk seen in a run and filters repeats out of later documents."""
+
+    def __init__(self, mode: str = 'exact', threshold: float = DEFAULT_THRESHOLD,
+                 num_perm: int = DEFAULT_NUM_PERM, bands: int = DEFAULT_BANDS,
+                 shingle_size: int = DEFAULT_SHINGLE_SIZE, path: Optional[Union[str, Path]] = None):
+        if mode not in DEDUP_MODES or mode == 'off':
+            raise ValueError(f"Unknown dedup mode: {mode}")
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.mode = mode
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.stats = DedupStats()
+
+        self._band_format = struct.Struct(f'<{self.rows}Q')
+        self._signature_format = struct.Struct(f'<{num_perm}Q')
+
+        # Scratch store; removed on close unless the caller chose the path
+        self._owns_path = path is None
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix='chunk-dedup-', suffix='.sqlite')
+            os.close(fd)
+        self.path = Path(path)
+        self.conn = sqlite3.connect(str(self.path), isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode = OFF")
+        self.conn.execute("PRAGMA synchronous = OFF")
+        self.conn.execute("PRAGMA cache_size = -65536")  # 64 MiB page cache
+        self.conn.execute("DROP TABLE IF EXISTS exact")
+        self.conn.execute("DROP TABLE IF EXISTS signatures")
+        self.conn.execute("DROP TABLE IF EXISTS bands")
+        self.conn.execute("CREATE TABLE exact (hash INTEGER PRIMARY KEY)")
+        self.conn.execute("CREATE TABLE signatures (id INTEGER PRIMARY KEY, signature BLOB NOT NULL)")
+        self.conn.execute("CREATE TABLE bands (band INTEGER, hash INTEGER, id INTEGER, "
+                          "PRIMARY KEY (band, hash, id)) WITHOUT ROWID")
+        self.conn.execute("BEGIN")
+
+    def __enter__(self) -> 'ChunkDeduplicator':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.conn.execute("COMMIT")
+        self.conn.close()
+        if self._owns_path:
+            self.path.unlink(missing_ok=True)
+
+    # Exact
+
+    def _is_exact_duplicate(self, text: str) -> bool:
+        normalised = _WHITESPACE.sub(' ', text).strip()
+        cursor = self.conn.execute("INSERT OR IGNORE INTO exact (hash) VALUES (?)",
+                                   (_hash64(normalised.encode('utf-8')),))
+        return cursor.rowcount == 0
+
+    # Near duplicates
+
+    def signature(self, text: str) -> Optional[List[int]]:
+        """MinHash signature over word shingles; None for text too short to compare reliably.
+
+        Uses one-permutation hashing: each shingle hash lands in one of
+        num_perm bins and each bin keeps its minimum, so the cost is linear
+        in the number of shingles rather than shingles x permutations.
+        Empty bins borrow from the next non-empty bin (densification).
+        """
+        words = _WORD.findall(text.lower())
+        if len(words) < self.shingle_size:
+            return None
+        num_perm = self.num_perm
+        bins = [_EMPTY] * num_perm
+        size = self.shingle_size
+        # Keyed hashing, not hash(): str hashes change with PYTHONHASHSEED, and the kept/dropped
+        # chunks must be the same on every run or unchanged documents look changed to the manifest
+        for shingle in zip(*(words[i:] for i in range(size))):
+            value = int.from_bytes(hashlib.blake2b(' '.join(shingle).encode('utf-8'), digest_size=8).digest(), 'big')
+            slot = value % num_perm
+            value //= num_perm
+            if value < bins[slot]:
+                bins[slot] = value
+        if _EMPTY in bins:
+            raw = bins[:]
+            nearest = None
+            # Walk the bins twice from the right so every empty bin finds the next filled one, wrapping
+            for i in reversed(range(2 * num_perm)):
+                slot = i % num_perm
+                if raw[slot] != _EMPTY:
+                    nearest = i
+                elif i < num_perm:
+                    # Offset by distance so borrowed values stay distinguishable
+                    bins[slot] = (raw[nearest % num_perm] + (nearest - i) * _DENSIFY_OFFSET) & _MASK64
+        return bins
+
+    def _band_hashes(self, signature: List[int]) -> List[int]:
+        return [
+            _hash64(bytes([band]) + self._band_format.pack(*signature[band * self.rows:(band + 1) * self.rows]))
+            for band in range(self.bands)
+        ]
+
+    def _is_near_duplicate(self, text: str) -> bool:
+        signature = self.signature(text)
+        if signature is None:
+            return False
+        band_hashes = self._band_hashes(signature)
+        candidates: Set[int] = set()
+        for band, band_hash in enumerate(band_hashes):
+            for (candidate,) in self.conn.execute("SELECT id FROM bands WHERE band = ? AND hash = ?",
+                                                  (band, band_hash)):
+                candidates.add(candidate)
+        for candidate in candidates:
+            (blob,) = self.conn.execute("SELECT signature FROM signatures WHERE id = ?", (candidate,)).fetchone()
+            other = self._signature_format.unpack(blob)
+            matches = sum(map(operator.eq, signature, other))
+            if matches / self.num_perm >= self.threshold:
+                return True
+
+        cursor = self.conn.execute("INSERT INTO signatures (signature) VALUES (?)",
+                                   (self._signature_format.pack(*signature),))
+        chunk_id = cursor.lastrowid
+        self.conn.executemany("INSERT INTO bands (band, hash, id) VALUES (?, ?, ?)",
+                              ((band, band_hash, chunk_id) for band, band_hash in enumerate(band_hashes)))
+        return False
+
+    # Documents
+
+    def filter_record(self, record: DocumentRecord, separator: str) -> Optional[DocumentRecord]:
+        """The record without chunks seen earlier in the run, or None if nothing new is left."""
+        kept = []
+        removed = False
+        for chunk in record.body.split(separator):
+            if not chunk.strip():
+                continue
+            self.stats.chunks += 1
+            if self._is_exact_duplicate(chunk):
+                self.stats.exact_duplicates += 1
+            elif self.mode == 'near' and self._is_near_duplicate(chunk):
+                self.stats.near_duplicates += 1
+            else:
+                kept.append(chunk)
+                continue
+            removed = True
+            self.stats.bytes_saved += len(chunk.encode('utf-8')) + len(separator)
+
+        if not kept:
+            self.stats.documents_dropped += 1
+            return None
+        if not removed:
+            return record
+        return record._replace(body=separator.join(kept))
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""Size-aware re-chunking of built documents: split oversized ones, merge tiny ones.
+
+Packing runs per source entity, right after the transform's build function
+(and in the same worker process), so merged pieces only ever combine
+documents of one entity and their metadata stays accurate.
+"""
+
+import functools
+import hashlib
+import math
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from parallel_build import BuildFunction, DocumentRecord
+
+PACK_UNITS = ('bytes', 'tokens')
+CHARS_PER_TOKEN = 4  # Rough estimate for English text; no tokenizer dependency
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+_WHITESPACE = re.compile(r'\s+')
+
+
+@dataclass(frozen=True)
+class ChunkPacker:
+    """Packs an entity's documents towards a target size.
+
+    Documents larger than target are split into evenly sized pieces on
+    separator, sentence or whitespace boundaries. Consecutive documents
+    smaller than min_size are merged (up to target) when their metadata
+    matches except for merge_attribute; that attribute then lists the
+    values of every merged document, and is emitted as a list on every
+    other piece too so its type is the same across the knowledge base.
+    """
+
+    target: int
+    min_size: int = 0
+    unit: str = 'bytes'
+    separator: str = '\n'
+    merge_attribute: Optional[str] = None  # e.g. 'article_hash' for locations
+
+    def __post_init__(self):
+        if self.unit not in PACK_UNITS:
+            raise ValueError(f"Unknown pack unit: {self.unit}")
+        if self.target <= 0:
+            raise ValueError("target must be positive")
+
+    def size(self, text: str) -> int:
+        if self.unit == 'tokens':
+            return math.ceil(len(text) / CHARS_PER_TOKEN)
+        return len(text.encode('utf-8'))
+
+    def pack(self, records: List[DocumentRecord]) -> List[DocumentRecord]:
+        packed: List[DocumentRecord] = []
+        for record in self._merge(records):
+            packed.extend(self._split(record))
+        if self.merge_attribute and self.min_size > 0:
+            # One type per attribute across the knowledge base, so filters match every piece
+            packed = [self._as_list(record) for record in packed]
+        return packed
+
+    def _as_list(self, record: DocumentRecord) -> DocumentRecord:
+        attributes = record.metadata.get('metadataAttributes', {})
+        value = attributes.get(self.merge_attribute)
+        if value is None or isinstance(value, list):
+            return record
+        metadata = {**record.metadata, 'metadataAttributes': {**attributes, self.merge_attribute: [value]}}
+        return record._replace(metadata=metadata)
+
+    # Splitting
+
+    def _spans(self, text: str, start: int, end: int) -> List[Tuple[int, int]]:
+        """Break text[start:end] into spans no larger than target, coarsest boundary first.
+
+        Spans index into text, so the delimiters between them stay in the
+        original text rather than being rebuilt from the separator.
+        """
+        if self.size(text[start:end]) <= self.target:
+            return [(start, end)]
+        for pattern in (re.compile(re.escape(self.separator)), _SENTENCE_END, _WHITESPACE):
+            spans = []
+            position = start
+            for match in pattern.finditer(text, start, end):
+                if match.start() > position:
+                    spans.append((position, match.start()))
+                position = max(position, match.end())
+            if position < end:
+                spans.append((position, end))
+            if len(spans) > 1:
+                return [span for part_start, part_end in spans for span in self._spans(text, part_start, part_end)]
+        # A single unbroken run of text; cut it by characters
+        width = max(1, (end - start) * self.target // self.size(text[start:end]))
+        return [(i, min(i + width, end)) for i in range(start, end, width)]
+
+    def _split(self, record: DocumentRecord) -> List[DocumentRecord]:
+        text = record.body
+        total = self.size(text)
+        if total <= self.target:
+            return [record]
+        # Aim for equal pieces rather than full pieces and a small remainder
+        goal = total / math.ceil(total / self.target)
+
+        bodies: List[str] = []
+        piece_start: Optional[int] = None
+        piece_end = 0
+        piece_size = 0
+        for start, end in self._spans(text, 0, len(text)):
+            unit_size = self.size(text[start:end])
+            if piece_start is not None:
+                # A piece keeps the text between its units as it was
+                gap_size = self.size(text[piece_end:start])
+                if piece_size + gap_size + unit_size <= max(goal, unit_size):
+                    piece_size += gap_size + unit_size
+                    piece_end = end
+                    continue
+                bodies.append(text[piece_start:piece_end])
+            piece_start, piece_end, piece_size = start, end, unit_size
+        if piece_start is not None:
+            bodies.append(text[piece_start:piece_end])
+        if len(bodies) == 1:
+            return [record]
+
+        stem, dot, extension = record.key.rpartition('.')
+        if not dot:
+            stem, extension = record.key, ''
+        return [
+            DocumentRecord(f"{stem}-part{i:03d}{dot}{extension}", body, record.metadata, f"{record.doc_id}#part{i:03d}")
+            for i, body in enumerate(bodies)
+        ]
+
+    # Merging
+
+    def _mergeable(self, a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+        attributes_a = dict(a.get('metadataAttributes', {}))
+        attributes_b = dict(b.get('metadataAttributes', {}))
+        if self.merge_attribute:
+            attributes_a.pop(self.merge_attribute, None)
+            attributes_b.pop(self.merge_attribute, None)
+        return attributes_a == attributes_b and {**a, 'metadataAttributes': None} == {**b, 'metadataAttributes': None}
+
+    def _merge(self, records: List[DocumentRecord]) -> List[DocumentRecord]:
+        if self.min_size <= 0 or len(records) < 2:
+            return records
+        merged: List[DocumentRecord] = []
+        group: List[DocumentRecord] = []
+        group_size = 0
+        joiner_size = self.size(self.separator)
+        for record in records:
+            record_size = self.size(record.body)
+            if record_size >= self.min_size:
+                merged.extend(self._combine(group))
+                group, group_size = [], 0
+                merged.append(record)
+                continue
+            if group and (group_size + joiner_size + record_size > self.target
+                          or not self._mergeable(group[0].metadata, record.metadata)):
+                merged.extend(self._combine(group))
+                group, group_size = [], 0
+            group_size += record_size + (joiner_size if group else 0)
+            group.append(record)
+        merged.extend(self._combine(group))
+        return merged
+
+    def _combine(self, group: List[DocumentRecord]) -> List[DocumentRecord]:
+        if len(group) <= 1:
+            return group
+        first = group[0]
+        metadata = dict(first.metadata)
+        attributes = dict(metadata.get('metadataAttributes', {}))
+        if self.merge_attribute:
+            values: List[Any] = []
+            for record in group:
+                value = record.metadata.get('metadataAttributes', {}).get(self.merge_attribute)
+                if value is not None and value not in values:
+                    values.append(value)
+            attributes[self.merge_attribute] = values
+        metadata['metadataAttributes'] = attributes
+
+        doc_id = '+'.join(record.doc_id for record in group)
+        # Named after the whole group, so a different grouping never reuses an old key
+        digest = hashlib.sha1(doc_id.encode('utf-8')).hexdigest()[:16]
+        prefix = first.key.rsplit('/', 1)[0] + '/' if '/' in first.key else ''
+        extension = first.key.rsplit('.', 1)[-1] if '.' in first.key else ''
+        key = f"{prefix}merged-{digest}" + (f".{extension}" if extension else '')
+        body = self.separator.join(record.body for record in group)
+        return [DocumentRecord(key, body, metadata, doc_id)]
+
+
+def _build_and_pack(build: BuildFunction, packer: ChunkPacker, entity_key: str,
+                    entity: Dict[str, Any]) -> List[DocumentRecord]:
+    return packer.pack(build(entity_key, entity))
+
+
+def packed_build(build: BuildFunction, packer: Optional[ChunkPacker]) -> BuildFunction:
+    """Wrap a build function so its output is packed; picklable for worker processes."""
+    if packer is None:
+        return build
+    return functools.partial(_build_and_pack, build, packer)
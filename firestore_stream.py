@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""Incremental reader for Firestore JSON exports (global_events.json, global_locations.json)."""
+
+import json
+import re
+from typing import Any, BinaryIO, Dict, Iterator, Optional, TextIO, Tuple
+
+DEFAULT_CHUNK_SIZE = 1 << 20  # 1 MiB of text per read
+# Top-level keys looked at for a "data" wrapper before an export is taken to be bare
+WRAPPER_LOOKAHEAD = 16
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_STRUCTURAL = re.compile(r'["{}\[\]]')
+# Remainder of a JSON string after its opening quote, up to and including the closing quote
+_STRING_TAIL = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+
+_decoder = json.JSONDecoder()
+
+
+class _Scanner:
+    """Pull-based view over a JSON text stream that only buffers what is being decoded."""
+
+    def __init__(self, fp: TextIO, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.consumed = 0  # Characters dropped from the front of buf
+        self.eof = False
+        self._mark: Optional[int] = None  # Offset that buf must keep text from, for rewind()
+
+    def _fill(self) -> bool:
+        """Drop consumed text and read more; grows geometrically while a single value is pending."""
+        if self.eof:
+            return False
+        keep = self.pos if self._mark is None else self._mark - self.consumed
+        pending = len(self.buf) - keep
+        data = self.fp.read(max(self.chunk_size, pending))
+        if not data:
+            self.eof = True
+            return False
+        self.consumed += keep
+        self.buf = self.buf[keep:] + data
+        self.pos -= keep
+        return True
+
+    def mark(self) -> None:
+        """Keep everything from the cursor on buffered, so rewind() can return to it."""
+        self._mark = self.offset
+
+    def unmark(self) -> None:
+        self._mark = None
+
+    def rewind(self) -> None:
+        """Move the cursor back to the mark and drop it."""
+        self.pos = self._mark - self.consumed
+        self._mark = None
+
+    @property
+    def offset(self) -> int:
+        """Position of the cursor in the stream."""
+        return self.consumed + self.pos
+
+    def peek(self) -> str:
+        """Return the next non-whitespace character without consuming it ('' at EOF)."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Malformed JSON export: expected {char!r}, found {found or 'EOF'!r}")
+        self.pos += 1
+
+    def read_value(self) -> Any:
+        """Decode one complete JSON value starting at the cursor."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A bare number at the end of the buffer may continue in the next chunk
+            if end == len(self.buf) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def skip_value(self) -> None:
+        """Advance past one JSON value without materialising it."""
+        first = self.peek()
+        if first not in '{[':
+            self.read_value()
+            return
+        depth = 0
+        while True:
+            match = _STRUCTURAL.search(self.buf, self.pos)
+            if match is None:
+                self.pos = len(self.buf)
+                if not self._fill():
+                    raise ValueError("Malformed JSON export: unexpected EOF")
+                continue
+            char = match.group()
+            if char == '"':
+                tail = _STRING_TAIL.match(self.buf, match.end())
+                if tail is None:
+                    # String continues past the buffer; keep it (from the quote) and read more
+                    self.pos = match.start()
+                    if not self._fill():
+                        raise ValueError("Malformed JSON export: unterminated string")
+                    continue
+                self.pos = tail.end()
+                continue
+            self.pos = match.end()
+            depth += 1 if char in '{[' else -1
+            if depth == 0:
+                return
+
+
+class _ByteScanner(_Scanner):
+    """Scanner over a file opened as latin-1, so each character is one byte and offsets are byte offsets.
+
+    Only the values it decodes itself (object keys, scalars) need fixing up:
+    their raw bytes are decoded as UTF-8 again.
+    """
+
+    def read_value(self) -> Any:
+        self.peek()
+        start = self.offset
+        value = super().read_value()
+        text = self.buf[start - self.consumed:self.pos]
+        if text.isascii():
+            return value
+        return json.loads(text.encode('latin-1'))
+
+
+def _iter_object_keys(scanner: _Scanner) -> Iterator[str]:
+    """Yield the keys of the object at the cursor; the caller must consume each value before resuming."""
+    scanner.expect('{')
+    yield from _iter_members(scanner)
+
+
+def _iter_members(scanner: _Scanner) -> Iterator[str]:
+    """Like _iter_object_keys, with the cursor already past the opening brace."""
+    if scanner.peek() == '}':
+        scanner.pos += 1
+        return
+    while True:
+        key = scanner.read_value()
+        if not isinstance(key, str):
+            raise ValueError(f"Malformed JSON export: expected object key, found {key!r}")
+        scanner.expect(':')
+        yield key
+        separator = scanner.peek()
+        scanner.pos += 1
+        if separator == '}':
+            return
+        if separator != ',':
+            raise ValueError(f"Malformed JSON export: expected ',' or '}}', found {separator or 'EOF'!r}")
+
+
+def _iter_entity_keys(scanner: _Scanner) -> Iterator[str]:
+    """Yield entity keys with the cursor on each entity; the caller must consume it before resuming.
+
+    The form is decided in the same pass: the first WRAPPER_LOOKAHEAD
+    top-level values are skipped over while looking for a "data" key, and
+    without one the cursor is rewound and every top-level value is an entity.
+    Only that lookahead is held in memory.
+    """
+    scanner.expect('{')
+    scanner.mark()
+    members = _iter_members(scanner)
+    for count, key in enumerate(members):
+        if key == 'data':
+            scanner.unmark()
+            yield from _iter_object_keys(scanner)
+            for _ in members:
+                scanner.skip_value()
+            return
+        if count + 1 >= WRAPPER_LOOKAHEAD:
+            break
+        scanner.skip_value()
+    scanner.rewind()
+    yield from _iter_members(scanner)
+
+
+def iter_firestore_entities(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                            start_after: Optional[str] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yield (key, entity) pairs from a Firestore export one entity at a time.
+
+    Handles both the wrapped form ({"data": {key: entity, ...}, ...}, with "data"
+    among the first WRAPPER_LOOKAHEAD keys) and the bare form ({key: entity, ...}),
+    reading the file once. Memory is bounded by the largest single entity (or
+    the first few, while the form is being decided), not by the size of the
+    file. With start_after, entities up to and including that key are skipped
+    without being decoded.
+    """
+    skipping = start_after is not None
+
+    with open(path, 'r', encoding='utf-8') as f:
+        scanner = _Scanner(f, chunk_size)
+        for entity_key in _iter_entity_keys(scanner):
+            if skipping:
+                scanner.skip_value()
+                skipping = entity_key != start_after
+                continue
+            yield entity_key, scanner.read_value()
+
+    if skipping:
+        raise ValueError(f"Resume key {start_after!r} not found in {path}")
+
+
+def iter_firestore_spans(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Tuple[str, int, int]]:
+    """Yield (key, byte offset, byte length) for every entity in a Firestore export, in file order.
+
+    Entities are skipped over, not decoded; read_entity() loads one later
+    from its span, e.g. for an index that points into the export.
+    """
+    # newline='' keeps \r\n as two characters, so offsets stay byte offsets
+    with open(path, 'r', encoding='latin-1', newline='') as f:
+        scanner = _ByteScanner(f, chunk_size)
+        for entity_key in _iter_entity_keys(scanner):
+            scanner.peek()
+            start = scanner.offset
+            scanner.skip_value()
+            yield entity_key, start, scanner.offset - start
+
+
+def read_entity(fp: BinaryIO, offset: int, length: int) -> Dict[str, Any]:
+    """Decode the entity at a span reported by iter_firestore_spans() from an export opened in binary mode."""
+    fp.seek(offset)
+    data = fp.read(length)
+    if len(data) != length:
+        raise ValueError(f"Export is shorter than expected: no entity at bytes {offset}-{offset + length}")
+    return json.loads(data)
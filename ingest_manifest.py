@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""SQLite manifest of uploaded documents, used to skip unchanged documents and delete removed ones."""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, NamedTuple, Optional, Union
+
+from s3_uploader import delete_keys
+
+logger = logging.getLogger(__name__)
+
+METADATA_SUFFIX = '.metadata.json'
+
+
+def content_hash(content: Union[str, bytes]) -> str:
+    """Hash of a document body."""
+    data = content.encode('utf-8') if isinstance(content, str) else content
+    return hashlib.sha256(data).hexdigest()
+
+
+def metadata_hash(metadata: Dict[str, Any]) -> str:
+    """Hash of a metadata record, independent of key order."""
+    return content_hash(json.dumps(metadata, sort_keys=True, ensure_ascii=False))
+
+
+class ManifestEntry(NamedTuple):
+    doc_id: str
+    s3_key: str
+    content_hash: str
+    metadata_hash: str
+
+
+class IngestManifest:
+    """Tracks the content and metadata hash of every document from the previous runs.
+
+    Each run gets a new run id; documents seen during the run are stamped with
+    it. Anything left with an older run id at the end no longer exists in the
+    source export. Rows also remember the source entity that produced them,
+    so an entity that fails to build can keep its previous documents
+    (keep_entity) instead of having them deleted as stale. Documents are
+    recorded only once their uploads have completed (see
+    checkpoint.Checkpoint), and changes are committed at each checkpoint and
+    in finish_run(), so a crashed run never records work that did not happen.
+    """
+
+    def __init__(self, path: Union[str, Path], run_id: Optional[int] = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_id TEXT PRIMARY KEY,
+                s3_key TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                metadata_hash TEXT NOT NULL,
+                run_id INTEGER NOT NULL,
+                deleted INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            )
+        """)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(documents)")}
+        if 'entity_key' not in columns:
+            # Manifests from before entity tracking; rows fill it in as they are seen again
+            self.conn.execute("ALTER TABLE documents ADD COLUMN entity_key TEXT")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS documents_run ON documents (deleted, run_id)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS documents_key ON documents (s3_key)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS documents_entity ON documents (entity_key)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        if run_id is None:
+            row = self.conn.execute("SELECT COALESCE(MAX(run_id), 0) FROM documents").fetchone()
+            run_id = row[0] + 1
+        # A resumed run keeps the interrupted run's id so its committed documents count as seen
+        self.run_id = run_id
+
+    def __enter__(self) -> 'IngestManifest':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def get(self, doc_id: str) -> Optional[ManifestEntry]:
+        """Return the live entry for a document, if any."""
+        row = self.conn.execute(
+            "SELECT doc_id, s3_key, content_hash, metadata_hash FROM documents WHERE doc_id = ? AND deleted = 0",
+            (doc_id,)
+        ).fetchone()
+        return ManifestEntry(*row) if row else None
+
+    def is_unchanged(self, doc_id: str, s3_key: str, content_digest: str, metadata_digest: str,
+                     entity_key: Optional[str] = None) -> bool:
+        """True if the document was uploaded before under the same key with identical content and metadata.
+
+        Unchanged documents are stamped as seen in the current run.
+        """
+        entry = self.get(doc_id)
+        if (entry is None or entry.s3_key != s3_key
+                or entry.content_hash != content_digest or entry.metadata_hash != metadata_digest):
+            return False
+        self.conn.execute("UPDATE documents SET run_id = ?, entity_key = COALESCE(?, entity_key) WHERE doc_id = ?",
+                          (self.run_id, entity_key, doc_id))
+        return True
+
+    def keep_entity(self, entity_key: str) -> int:
+        """Stamp an entity's live documents as seen without re-uploading them; returns how many.
+
+        Used when the entity could not be built this run, so a transient
+        error does not make its published documents look stale.
+        """
+        return self.conn.execute("UPDATE documents SET run_id = ? WHERE entity_key = ? AND deleted = 0",
+                                 (self.run_id, entity_key)).rowcount
+
+    def record(self, doc_id: str, s3_key: str, content_digest: str, metadata_digest: str,
+               entity_key: Optional[str] = None) -> None:
+        """Record a document written in the current run."""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO documents "
+            "(doc_id, s3_key, content_hash, metadata_hash, run_id, deleted, updated_at, entity_key) "
+            "VALUES (?, ?, ?, ?, ?, 0, ?, ?)",
+            (doc_id, s3_key, content_digest, metadata_digest, self.run_id, time.time(), entity_key)
+        )
+        # The key now belongs to this document (e.g. after re-chunking); the old row must not delete it
+        self.conn.execute("DELETE FROM documents WHERE s3_key = ? AND doc_id != ?", (s3_key, doc_id))
+
+    def forget_keys(self, s3_keys: Iterable[str]) -> None:
+        """Drop entries whose upload failed so the next run retries them.
+
+        Accepts both document keys and their .metadata.json sidecar keys.
+        """
+        doc_keys = {key[:-len(METADATA_SUFFIX)] if key.endswith(METADATA_SUFFIX) else key for key in s3_keys}
+        self.conn.executemany("DELETE FROM documents WHERE s3_key = ?", ((key,) for key in doc_keys))
+
+    def live_keys(self) -> Iterator[str]:
+        """S3 keys of every document the manifest believes is uploaded."""
+        for (s3_key,) in self.conn.execute("SELECT s3_key FROM documents WHERE deleted = 0"):
+            yield s3_key
+
+    def stale_entries(self) -> Iterator[ManifestEntry]:
+        """Entries not seen in the current run, i.e. removed from the source export."""
+        cursor = self.conn.execute(
+            "SELECT doc_id, s3_key, content_hash, metadata_hash FROM documents WHERE deleted = 0 AND run_id < ?",
+            (self.run_id,)
+        )
+        for row in cursor.fetchall():
+            yield ManifestEntry(*row)
+
+    def mark_deleted(self, doc_ids: Iterable[str]) -> None:
+        """Keep a delete marker for documents whose objects have been removed."""
+        now = time.time()
+        self.conn.executemany(
+            "UPDATE documents SET deleted = 1, run_id = ?, updated_at = ? WHERE doc_id = ?",
+            ((self.run_id, now, doc_id) for doc_id in doc_ids)
+        )
+
+    def get_meta(self, name: str) -> Optional[str]:
+        """A value saved by set_meta, e.g. the build options of the last run."""
+        row = self.conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, name: str, value: str) -> None:
+        self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
+
+    def commit(self) -> None:
+        self.conn.commit()
+
+    def finish_run(self) -> None:
+        """Commit everything recorded during the run."""
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def delete_stale_documents(manifest: IngestManifest, s3_client: Any, bucket: str, output_dir: Path) -> int:
+    """Delete documents that are no longer in the export from S3 and the local output.
+
+    Returns the number of documents removed; each keeps a delete marker in the manifest.
+    """
+    stale = list(manifest.stale_entries())
+    if not stale:
+        return 0
+
+    keys = []
+    for entry in stale:
+        keys.append(entry.s3_key)
+        keys.append(entry.s3_key + METADATA_SUFFIX)
+    _, errors = delete_keys(s3_client, bucket, keys)
+    failed = {key[:-len(METADATA_SUFFIX)] if key.endswith(METADATA_SUFFIX) else key for key, _ in errors}
+    for key, error in errors:
+        logger.error(f"Failed to delete {key}: {error}")
+
+    removed = [entry for entry in stale if entry.s3_key not in failed]
+    for entry in removed:
+        name = entry.s3_key.rsplit('/', 1)[-1]
+        (output_dir / name).unlink(missing_ok=True)
+        (output_dir / (name + METADATA_SUFFIX)).unlink(missing_ok=True)
+    manifest.mark_deleted(entry.doc_id for entry in removed)
+
+    return len(removed)
@@ -0,0 +1,767 @@
+#!/usr/bin/env python3
+"""Staged ingestion pipeline shared by the prepare_* scripts.
+
+source (Firestore export) -> transform (per document type) -> local sink -> S3 sink
+    -> knowledge-base ingestion job
+
+Each document type plugs in as a Transform; every stage keeps its own
+StageStats so throughput can be compared stage by stage.
+"""
+
+import argparse
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Container, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from aws_clients import create_async_s3_client, get_bedrock_agent_client, get_config, get_s3_client
+from batch_writer import DEFAULT_SHARD_RECORDS, LOCAL_FORMATS, open_shard_writer
+from checkpoint import DEFAULT_CHECKPOINT_INTERVAL, Checkpoint, ManifestRow
+from chunk_dedup import DEDUP_MODES, DEFAULT_THRESHOLD, ChunkDeduplicator, DedupStats
+from chunk_packing import PACK_UNITS, ChunkPacker, packed_build
+from firestore_stream import iter_firestore_entities
+from ingest_manifest import IngestManifest, content_hash, delete_stale_documents, metadata_hash
+from kb_ingestion import DEFAULT_SETTLE_SECONDS, DEFAULT_TIMEOUT, INGEST_MODES, IngestionJobStats, IngestionTrigger
+from metadata_json import dumps
+from multipart_upload import (DEFAULT_MULTIPART_THRESHOLD, DEFAULT_PART_CONCURRENCY, DEFAULT_PART_SIZE,
+                              MultipartUploader)
+from pipeline_metrics import (DEFAULT_METRICS_INTERVAL, PROFILE_MODES, MetricsReporter, PipelineMetrics,
+                              profiled)
+from parallel_build import BuildFunction, BuildResult, DocumentRecord, build_records
+from s3_uploader import DEFAULT_ASYNC_CONCURRENCY, DEFAULT_CONCURRENCY, S3Uploader, UploadSummary
+
+if TYPE_CHECKING:
+    from async_uploader import AsyncS3Uploader
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_ROOT = Path('documents_to_upload')
+BUILD_OPTIONS_META = 'build_options'
+MB = 1024 * 1024
+DEFAULT_LOCAL_WRITERS = 4
+
+
+@dataclass
+class Transform:
+    """Plugin describing how one document type is built from its Firestore export."""
+
+    name: str                   # Output directory and S3 prefix, e.g. 'events'
+    label: str                  # Singular for log lines, e.g. 'Event'
+    source_path: str            # e.g. 'global_events.json'
+    build: BuildFunction        # Module-level so it can run in worker processes
+    progress_every: int = 50
+    empty_is_skipped: bool = False  # Count entities that produce no documents as skipped
+    chunk_separator: str = '\n'      # How build() joins chunk texts; packing splits on it first
+    merge_attribute: Optional[str] = None  # Metadata attribute that may differ between merged documents
+
+    @property
+    def prefix(self) -> str:
+        return f"{self.name}/"
+
+    @property
+    def output_dir(self) -> Path:
+        return OUTPUT_ROOT / self.name
+
+
+@dataclass
+class StageStats:
+    """Throughput counters for one pipeline stage."""
+
+    name: str
+    items: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+
+    def log(self) -> None:
+        rate = self.items / self.seconds if self.seconds else 0.0
+        mb_rate = self.bytes / self.seconds / 1e6 if self.seconds else 0.0
+        logger.info(f"  {self.name:<10} {self.items:>10} items {self.bytes:>14} bytes "
+                    f"{self.seconds:>8.2f}s  {rate:>10.1f} items/s  {mb_rate:>7.2f} MB/s")
+
+
+@dataclass
+class PipelineResult:
+    """Counters reported at the end of a run."""
+
+    found: int = 0
+    processed: int = 0
+    unchanged: int = 0
+    skipped: int = 0
+    deleted: int = 0
+    upload_summary: Optional[UploadSummary] = None
+    dedup: Optional[DedupStats] = None
+    stages: List[StageStats] = field(default_factory=list)
+
+
+class FirestoreSource:
+    """Source stage: streams (key, entity) pairs from a Firestore export."""
+
+    partial = False  # True for sources that cover only part of the export
+
+    def __init__(self, path: str, start_after: Optional[str] = None):
+        self.path = path
+        self.start_after = start_after  # Resume point from a checkpoint
+        self.stats = StageStats('source')
+
+    def __iter__(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        entities = iter_firestore_entities(self.path, start_after=self.start_after)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(entities)
+            except StopIteration:
+                return
+            finally:
+                self.stats.seconds += time.perf_counter() - started
+            self.stats.items += 1
+            yield item
+
+
+SourceFactory = Callable[[Optional[str]], FirestoreSource]
+
+
+class BuildStage:
+    """Transform stage: runs the plugin's build function inline or on a process pool."""
+
+    def __init__(self, transform: Transform, processes: int = 0, ordered: bool = True,
+                 packer: Optional[ChunkPacker] = None):
+        self.transform = transform
+        self.processes = processes
+        self.ordered = ordered
+        self.packer = packer
+        self.stats = StageStats('transform')
+
+    def run(self, source: Iterable[Tuple[str, Dict[str, Any]]]) -> Iterator[BuildResult]:
+        build = packed_build(self.transform.build, self.packer)
+        results = build_records(source, build, processes=self.processes, ordered=self.ordered)
+        # Inline builds pull from the source inside next(); don't bill its time to this stage
+        source_stats = getattr(source, 'stats', None) if self.processes <= 1 else None
+        while True:
+            started = time.perf_counter()
+            source_before = source_stats.seconds if source_stats else 0.0
+            try:
+                result = next(results)
+            except StopIteration:
+                return
+            finally:
+                source_spent = source_stats.seconds - source_before if source_stats else 0.0
+                self.stats.seconds += time.perf_counter() - started - source_spent
+            self.stats.items += len(result.records)
+            self.stats.bytes += sum(len(record.body) for record in result.records)
+            yield result
+
+
+class DedupStage:
+    """Drops chunks already seen earlier in the run before anything is written."""
+
+    def __init__(self, transform: Transform, deduplicator: ChunkDeduplicator):
+        self.transform = transform
+        self.deduplicator = deduplicator
+        self.stats = StageStats('dedup')
+
+    def run(self, results: Iterable[BuildResult]) -> Iterator[BuildResult]:
+        try:
+            for result in results:
+                started = time.perf_counter()
+                records = []
+                for record in result.records:
+                    filtered = self.deduplicator.filter_record(record, self.transform.chunk_separator)
+                    if filtered is not None:
+                        records.append(filtered)
+                self.stats.seconds += time.perf_counter() - started
+                self.stats.items += len(records)
+                self.stats.bytes += sum(len(record.body) for record in records)
+                yield result._replace(records=records)
+        finally:
+            # The scratch store is only needed while the run is in progress
+            self.deduplicator.close()
+
+
+class LocalSink:
+    """Writes each document and its metadata as a file pair under the output directory."""
+
+    def __init__(self, output_dir: Path):
+        self.output_dir = output_dir
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.stats = StageStats('local')
+
+    def document_path(self, record: DocumentRecord) -> Path:
+        """Where the document body is written."""
+        return self.output_dir / record.key.rsplit('/', 1)[-1]
+
+    def write(self, record: DocumentRecord, metadata: Optional[bytes] = None) -> None:
+        started = time.perf_counter()
+        name = record.key.rsplit('/', 1)[-1]
+
+        body = record.body.encode('utf-8')
+        if metadata is None:
+            metadata = dumps(record.metadata)
+        self._write_files(self.output_dir / name, body, metadata)
+
+        self.stats.items += 1
+        self.stats.bytes += len(body) + len(metadata)
+        self.stats.seconds += time.perf_counter() - started
+
+    def _write_files(self, path: Path, body: bytes, metadata: bytes) -> None:
+        # Document content (plain text only), then its metadata
+        with open(path, 'wb') as f:
+            f.write(body)
+        with open(path.with_name(f"{path.name}.metadata.json"), 'wb') as f:
+            f.write(metadata)
+
+    def close(self) -> None:
+        pass
+
+
+class AsyncLocalSink(LocalSink):
+    """LocalSink whose file writes run on a small thread pool, overlapping with parsing and uploads.
+
+    At most max_pending writes are outstanding; write errors are logged
+    rather than raised, since the local copy is not what gets indexed.
+    """
+
+    def __init__(self, output_dir: Path, writers: int = DEFAULT_LOCAL_WRITERS, max_pending: int = 256):
+        super().__init__(output_dir)
+        self._executor = ThreadPoolExecutor(max_workers=writers, thread_name_prefix='local-write')
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self.failed = 0
+
+    def _write_files(self, path: Path, body: bytes, metadata: bytes) -> None:
+        self._pending.acquire()
+        future = self._executor.submit(super()._write_files, path, body, metadata)
+        future.add_done_callback(lambda done: self._finished(path, done))
+
+    def _finished(self, path: Path, future: Future) -> None:
+        self._pending.release()
+        if future.exception() is not None:
+            self.failed += 1
+            logger.error(f"Failed to write {path}: {future.exception()}")
+
+    def close(self) -> None:
+        started = time.perf_counter()
+        self._executor.shutdown(wait=True)
+        self.stats.seconds += time.perf_counter() - started
+
+
+class ShardSink:
+    """Packs documents and metadata into sharded JSONL or tar files with buffered writes."""
+
+    def __init__(self, output_dir: Path, name: str, local_format: str,
+                 max_records: int = DEFAULT_SHARD_RECORDS):
+        self.output_dir = output_dir
+        self.writer = open_shard_writer(local_format, output_dir, name, max_records=max_records)
+        self.stats = StageStats('local')
+
+    def write(self, record: DocumentRecord, metadata: Optional[bytes] = None) -> None:
+        started = time.perf_counter()
+        self.stats.bytes += self.writer.write(record, metadata)
+        self.stats.items += 1
+        self.stats.seconds += time.perf_counter() - started
+
+    def close(self) -> None:
+        started = time.perf_counter()
+        self.writer.close()
+        self.stats.seconds += time.perf_counter() - started
+        logger.info(f"Wrote {len(self.writer.shards)} shard(s) to {self.output_dir}")
+
+
+class S3Sink:
+    """Queues each document and its metadata on a concurrent uploader (threaded or asyncio).
+
+    Documents that already exist as a local file above the multipart
+    threshold are streamed from that file instead of being queued in memory.
+    """
+
+    def __init__(self, uploader: Union[S3Uploader, 'AsyncS3Uploader'], s3_client: Any,
+                 multipart: Optional[MultipartUploader] = None):
+        self.uploader = uploader
+        self.s3_client = s3_client  # Synchronous client, for deleting stale documents
+        self.bucket = uploader.bucket
+        self.multipart = multipart
+
+    @property
+    def stats(self) -> StageStats:
+        """Live view of the uploader's progress."""
+        summary = self.uploader.summary
+        return StageStats('s3', summary.succeeded, summary.bytes_uploaded, self.uploader.elapsed)
+
+    def write(self, record: DocumentRecord, metadata: Optional[bytes] = None, local_path: Optional[Path] = None,
+              skip_keys: Container[str] = ()) -> None:
+        """Queue the document and its metadata, except keys already known to be uploaded."""
+        if record.key not in skip_keys:
+            if local_path is not None and self.multipart and local_path.stat().st_size >= self.multipart.threshold:
+                self.uploader.submit_file(record.key, local_path)
+            else:
+                self.uploader.submit(record.key, record.body)
+        metadata_key = f"{record.key}.metadata.json"
+        if metadata_key not in skip_keys:
+            self.uploader.submit(metadata_key, dumps(record.metadata) if metadata is None else metadata)
+
+    def close(self) -> UploadSummary:
+        return self.uploader.close()
+
+
+class NullSink:
+    """Stand-in sink for dry runs: counts what would have been written."""
+
+    def __init__(self, name: str):
+        self.stats = StageStats(name)
+
+    def write(self, record: DocumentRecord, metadata: Optional[bytes] = None, **kwargs: Any) -> None:
+        self.stats.items += 1
+        self.stats.bytes += len(record.body.encode('utf-8'))
+
+    def close(self) -> None:
+        return None
+
+
+class Pipeline:
+    """Wires a source, a transform and the sinks together for one run."""
+
+    def __init__(self, transform: Transform, source: FirestoreSource, build: BuildStage,
+                 local_sink: Union[LocalSink, ShardSink, NullSink], s3_sink: Union[S3Sink, NullSink],
+                 manifest: Optional[IngestManifest] = None, force: bool = False,
+                 checkpoint: Optional[Checkpoint] = None, dedup: Optional[DedupStage] = None):
+        self.transform = transform
+        self.source = source
+        self.build = build
+        self.local_sink = local_sink
+        self.s3_sink = s3_sink
+        self.manifest = manifest
+        self.force = force
+        self.checkpoint = checkpoint
+        self.dedup = dedup
+
+    def _is_unchanged(self, record: DocumentRecord, entity_key: str) -> Tuple[bool, str, str]:
+        content_digest = content_hash(record.body)
+        metadata_digest = metadata_hash(record.metadata)
+        unchanged = (self.manifest is not None and not self.force
+                     and self.manifest.is_unchanged(record.doc_id, record.key, content_digest, metadata_digest,
+                                                    entity_key))
+        return unchanged, content_digest, metadata_digest
+
+    def _save_checkpoint(self, final: bool = False) -> None:
+        """Record fully uploaded documents in the manifest, commit, then persist the position."""
+        rows = self.checkpoint.drain() if final else self.checkpoint.advance()
+        if self.manifest is not None:
+            for row in rows:
+                self.manifest.record(*row)
+            self.manifest.commit()
+        self.checkpoint.save()
+
+    def _write_entity(self, entity_key: str, records: List[DocumentRecord], result: PipelineResult) -> None:
+        registered = False
+        written = 0
+        try:
+            changed = self._register_entity(entity_key, records, result)
+            registered = True
+            skip_keys = self.checkpoint.uploaded if self.checkpoint is not None else ()
+            document_path = getattr(self.local_sink, 'document_path', None)
+            for record, _ in changed:
+                # Serialized once; the same bytes go to the local file and to S3
+                metadata = dumps(record.metadata)
+                self.local_sink.write(record, metadata)
+                if isinstance(self.s3_sink, S3Sink):
+                    local_path = document_path(record) if document_path else None
+                    self.s3_sink.write(record, metadata, local_path=local_path, skip_keys=skip_keys)
+                else:
+                    self.s3_sink.write(record, metadata)
+                written += 1
+        except Exception:
+            if registered and self.checkpoint is None and self.manifest is not None:
+                # Recorded up front but never written; the next run has to write them
+                self.manifest.forget_keys(record.key for record, _ in changed[written:])
+            self._keep_entity(entity_key, register=not registered)
+            raise
+
+    def _register_entity(self, entity_key: str, records: List[DocumentRecord],
+                         result: PipelineResult) -> List[Tuple[DocumentRecord, ManifestRow]]:
+        """Drop unchanged records and register the rest with the checkpoint or manifest."""
+        changed = []
+        for record in records:
+            # Skip documents whose content and metadata are unchanged since the last run
+            unchanged, content_digest, metadata_digest = self._is_unchanged(record, entity_key)
+            if unchanged:
+                result.unchanged += 1
+                continue
+            changed.append((record, (record.doc_id, record.key, content_digest, metadata_digest, entity_key)))
+
+        if self.checkpoint is not None:
+            # Registered before submitting so no completion callback can arrive first
+            keys = [key for record, _ in changed for key in (record.key, f"{record.key}.metadata.json")]
+            self.checkpoint.begin_entity(entity_key, keys, [row for _, row in changed])
+        elif self.manifest is not None:
+            for _, row in changed:
+                self.manifest.record(*row)
+        return changed
+
+    def _keep_entity(self, entity_key: str, register: bool = True) -> None:
+        """Leave a failed entity's previously published documents in place for this run.
+
+        register is False when the entity is already registered with the checkpoint.
+        """
+        if self.manifest is not None:
+            kept = self.manifest.keep_entity(entity_key)
+            if kept:
+                logger.info(f"Keeping {kept} existing documents of {entity_key} after the error")
+        if self.checkpoint is not None and register:
+            # Nothing to upload, but the checkpoint position still has to move past it
+            self.checkpoint.begin_entity(entity_key, [], [])
+
+    def run(self) -> PipelineResult:
+        transform = self.transform
+        result = PipelineResult()
+
+        built_results = self.build.run(self.source)
+        if self.dedup is not None:
+            built_results = self.dedup.run(built_results)
+
+        for built in built_results:
+            result.found += 1
+            if built.error:
+                logger.error(f"Error processing {transform.label.lower()} {built.entity_key}: {built.error}")
+                result.skipped += 1
+                self._keep_entity(built.entity_key)
+            elif not built.records and transform.empty_is_skipped:
+                result.skipped += 1
+                self._write_entity(built.entity_key, [], result)
+            else:
+                try:
+                    self._write_entity(built.entity_key, built.records, result)
+                    result.processed += 1
+
+                    if result.processed % transform.progress_every == 0:
+                        logger.info(f"Processed {result.processed} {transform.name}...")
+
+                except Exception as e:
+                    # _write_entity has already kept the entity's published documents
+                    logger.error(f"Error processing {transform.label.lower()} {built.entity_key}: {e}")
+                    result.skipped += 1
+
+            if self.checkpoint is not None and self.checkpoint.due():
+                self._save_checkpoint()
+
+        self.local_sink.close()
+        result.upload_summary = self.s3_sink.close()
+
+        if self.checkpoint is not None:
+            self._save_checkpoint(final=True)
+
+        if self.manifest is not None:
+            # Documents that failed to upload are retried next run; removed ones are deleted
+            self.manifest.forget_keys(key for key, _ in result.upload_summary.failures)
+            if self.source.partial:
+                # Documents outside a partial source were not seen, but are not gone from the export
+                logger.info("Partial run: not deleting documents missing from this run")
+            else:
+                result.deleted = delete_stale_documents(self.manifest, self.s3_sink.s3_client,
+                                                        self.s3_sink.bucket, self.local_sink.output_dir)
+            self.manifest.finish_run()
+
+        if self.checkpoint is not None:
+            if self.checkpoint.finished:
+                self.checkpoint.complete()
+            else:
+                # Keep the checkpoint so --resume picks up what did not make it to S3
+                logger.warning(f"Run incomplete; checkpoint kept at {self.checkpoint.path}")
+                self.checkpoint.close()
+
+        result.stages = [self.source.stats, self.build.stats, self.local_sink.stats, self.s3_sink.stats]
+        if self.dedup is not None:
+            result.stages.insert(2, self.dedup.stats)
+            result.dedup = self.dedup.deduplicator.stats
+        return result
+
+    def metrics(self) -> PipelineMetrics:
+        """Register every stage's live counters for periodic reporting."""
+        metrics = PipelineMetrics(self.transform.name)
+        metrics.add_stage(self.source.stats)
+        metrics.add_stage(self.build.stats)
+        if self.dedup is not None:
+            dedup_stats = self.dedup.deduplicator.stats
+            metrics.add_stage(self.dedup.stats)
+            metrics.add_counter('dedup_chunks_removed',
+                                lambda: dedup_stats.exact_duplicates + dedup_stats.near_duplicates)
+            metrics.add_counter('dedup_bytes_saved', lambda: dedup_stats.bytes_saved)
+            metrics.add_counter('dedup_documents_dropped', lambda: dedup_stats.documents_dropped)
+        metrics.add_stage(self.local_sink.stats)
+        if isinstance(self.s3_sink, S3Sink):
+            uploader = self.s3_sink.uploader
+            metrics.add_stage(lambda: self.s3_sink.stats)
+            metrics.add_counter('uploads_succeeded', lambda: uploader.summary.succeeded)
+            metrics.add_counter('upload_failures', lambda: uploader.summary.failed)
+            metrics.add_counter('upload_retries', lambda: uploader.summary.retries)
+            metrics.add_gauge('upload_queue_depth', lambda: uploader.queue_depth)
+            metrics.add_latency('put_object', uploader.put_latency)
+        else:
+            metrics.add_stage(self.s3_sink.stats)
+        if self.checkpoint is not None:
+            metrics.add_gauge('checkpoint_pending_entities', lambda: self.checkpoint.pending_entities)
+        return metrics
+
+
+
+def add_build_arguments(parser: argparse.ArgumentParser) -> None:
+    """Options that change which documents a run produces; reconcile --from-export takes them too."""
+    parser.add_argument('--pack-target', type=int, default=0,
+                        help="Split documents larger than this many --pack-unit (0 = no re-chunking)")
+    parser.add_argument('--pack-min', type=int, default=0,
+                        help="Merge documents of the same entity smaller than this, up to --pack-target")
+    parser.add_argument('--pack-unit', choices=PACK_UNITS, default='bytes',
+                        help="Unit for --pack-target / --pack-min (tokens are estimated as 4 characters)")
+    parser.add_argument('--dedup', choices=DEDUP_MODES, default='off',
+                        help="Drop chunks seen earlier in the run: exact repeats, or near duplicates too")
+    parser.add_argument('--dedup-threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Estimated Jaccard similarity at which a chunk counts as a near duplicate")
+
+
+def build_options(args: argparse.Namespace) -> str:
+    """The add_build_arguments options as canonical JSON, saved in the manifest by every run."""
+    options = {name: getattr(args, name)
+               for name in ('pack_target', 'pack_min', 'pack_unit', 'dedup', 'dedup_threshold')}
+    if args.dedup != 'off':
+        # Which copy of a duplicate survives depends on the build order
+        options['unordered'] = getattr(args, 'unordered', False)
+    return json.dumps(options, sort_keys=True)
+
+
+def parse_args(transform: Transform, argv: Optional[List[str]] = None,
+               add_arguments: Optional[Callable[[argparse.ArgumentParser], None]] = None) -> argparse.Namespace:
+    """Parse the options shared by every prepare script, plus any script-specific ones."""
+    parser = argparse.ArgumentParser(description=f"Prepare {transform.name} documents with metadata for "
+                                                 f"Bedrock Knowledge Base ingestion.")
+    parser.add_argument('--upload-concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help="Number of concurrent S3 uploads")
+    parser.add_argument('--manifest', default=str(OUTPUT_ROOT / f"{transform.name}.manifest.sqlite"),
+                        help="SQLite manifest of previously uploaded documents")
+    parser.add_argument('--force', action='store_true',
+                        help="Re-upload every document even if it is unchanged")
+    parser.add_argument('--build-workers', type=int, default=0,
+                        help="Worker processes for building documents (0 = build in-process)")
+    parser.add_argument('--unordered', action='store_true',
+                        help="Write documents as workers finish instead of in export order")
+    parser.add_argument('--local-format', choices=LOCAL_FORMATS, default='files',
+                        help="Local output layout: a .txt/.metadata.json pair per document, "
+                             "or sharded JSONL / tar files")
+    parser.add_argument('--shard-records', type=int, default=DEFAULT_SHARD_RECORDS,
+                        help="Documents per shard for the jsonl and tar formats")
+    parser.add_argument('--async-io', action='store_true',
+                        help="Upload from one asyncio event loop (aiobotocore) and write local files "
+                             "in the background, instead of a thread per concurrent upload. Every document "
+                             "goes up as a single PutObject, so the multipart options cannot be combined with it")
+    parser.add_argument('--async-concurrency', type=int, default=DEFAULT_ASYNC_CONCURRENCY,
+                        help="Uploads in flight with --async-io (also the connection pool size)")
+    parser.add_argument('--multipart-threshold-mb', type=int, default=DEFAULT_MULTIPART_THRESHOLD // MB,
+                        help="Documents at least this large use resumable multipart upload (not with --async-io)")
+    parser.add_argument('--part-size-mb', type=int, default=DEFAULT_PART_SIZE // MB,
+                        help="Multipart part size (minimum 5)")
+    parser.add_argument('--part-concurrency', type=int, default=DEFAULT_PART_CONCURRENCY,
+                        help="Parallel part uploads per large document")
+    add_build_arguments(parser)
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue an interrupted run from its last checkpoint")
+    parser.add_argument('--checkpoint-interval', type=float, default=DEFAULT_CHECKPOINT_INTERVAL,
+                        help="Seconds between checkpoints")
+    parser.add_argument('--metrics-interval', type=float, default=DEFAULT_METRICS_INTERVAL,
+                        help="Seconds between structured metrics log lines (0 = only at the end)")
+    parser.add_argument('--metrics-file', default=str(OUTPUT_ROOT / f"{transform.name}.metrics.prom"),
+                        help="Prometheus text-format metrics dump, refreshed with each metrics log line")
+    parser.add_argument('--profile', choices=PROFILE_MODES,
+                        help="Profile the run with cProfile (cpu) or tracemalloc (memory)")
+    parser.add_argument('--ingest', choices=INGEST_MODES, default='start',
+                        help="After uploading, start a knowledge-base ingestion job (default), also wait for it, "
+                             "or leave ingestion alone")
+    parser.add_argument('--ingest-settle', type=float, default=DEFAULT_SETTLE_SECONDS,
+                        help="Seconds to wait before starting ingestion, so back-to-back runs share one job")
+    parser.add_argument('--ingest-timeout', type=float, default=DEFAULT_TIMEOUT,
+                        help="Give up waiting for the ingestion job after this many seconds")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Build every document but write nothing locally or to AWS")
+    if add_arguments:
+        add_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.async_io:
+        # The asyncio uploader has no multipart path; do not let these options be silently ignored
+        multipart_options = [option for option in ('multipart_threshold_mb', 'part_size_mb', 'part_concurrency')
+                             if getattr(args, option) != parser.get_default(option)]
+        if multipart_options:
+            parser.error("--async-io uploads every document as a single PutObject and cannot be combined with "
+                         + ', '.join('--' + option.replace('_', '-') for option in multipart_options))
+    return args
+
+
+def log_result(transform: Transform, result: PipelineResult) -> None:
+    """Log the end-of-run summary."""
+    logger.info(f"\n{'='*60}")
+    logger.info(f"{transform.label} document preparation complete!")
+    logger.info(f"{'='*60}")
+    logger.info(f"Found: {result.found} {transform.name}")
+    logger.info(f"Processed: {result.processed} {transform.name}")
+    logger.info(f"Unchanged: {result.unchanged} documents")
+    logger.info(f"Skipped: {result.skipped} {transform.name}")
+    logger.info(f"Deleted: {result.deleted} documents no longer in the export")
+    logger.info(f"Output directory: {transform.output_dir}")
+    logger.info(f"Files created: {result.processed * 2} (txt + metadata.json pairs)")
+    if result.dedup:
+        result.dedup.log()
+    if result.upload_summary:
+        result.upload_summary.log()
+    logger.info("Stage throughput:")
+    for stats in result.stages:
+        stats.log()
+    logger.info(f"{'='*60}")
+
+
+def create_local_sink(transform: Transform, args: argparse.Namespace) -> Union[LocalSink, ShardSink]:
+    """Local sink for the requested --local-format."""
+    if args.local_format == 'files':
+        return AsyncLocalSink(transform.output_dir) if args.async_io else LocalSink(transform.output_dir)
+    return ShardSink(transform.output_dir, transform.name, args.local_format, max_records=args.shard_records)
+
+
+def create_s3_sink(args: argparse.Namespace, bucket: str, multipart: MultipartUploader,
+                   on_uploaded: Callable[[str], None]) -> S3Sink:
+    """S3 sink on the threaded uploader, or on the asyncio one for --async-io."""
+    if args.async_io:
+        # asyncio is only imported when asked for; it is slow to import
+        from async_uploader import AsyncS3Uploader
+
+        # Every document goes up as a single PutObject (parse_args rejects the multipart options); local
+        # files may not be written yet
+        uploader = AsyncS3Uploader(lambda: create_async_s3_client(args.async_concurrency), bucket,
+                                   concurrency=args.async_concurrency, on_uploaded=on_uploaded)
+        return S3Sink(uploader, get_s3_client())
+    uploader = S3Uploader(get_s3_client(), bucket, concurrency=args.upload_concurrency, multipart=multipart,
+                          on_uploaded=on_uploaded)
+    return S3Sink(uploader, get_s3_client(), multipart=multipart)
+
+
+def create_packer(transform: Transform, args: argparse.Namespace) -> Optional[ChunkPacker]:
+    """Chunk packer for the --pack-* options, or None when re-chunking is off."""
+    if args.pack_target <= 0:
+        return None
+    if args.pack_min > args.pack_target:
+        raise ValueError("--pack-min must not exceed --pack-target")
+    return ChunkPacker(target=args.pack_target, min_size=args.pack_min, unit=args.pack_unit,
+                       separator=transform.chunk_separator, merge_attribute=transform.merge_attribute)
+
+
+def create_dedup(transform: Transform, args: argparse.Namespace) -> Optional[DedupStage]:
+    """Dedup stage for the --dedup option, or None when it is off."""
+    if args.dedup == 'off':
+        return None
+    # Always a fresh store: on --resume, chunks from re-processed entities must not count as seen
+    return DedupStage(transform, ChunkDeduplicator(args.dedup, threshold=args.dedup_threshold))
+
+
+def trigger_ingestion(result: PipelineResult, args: argparse.Namespace,
+                      ready_at: float) -> Optional[IngestionJobStats]:
+    """Sync the knowledge base for the --ingest option if the run changed anything in S3.
+
+    The uploads are already done and recorded in the manifest by now, so
+    ingestion problems (a job outliving --ingest-timeout, an API error) are
+    logged rather than raised: they must not turn a successful run into a
+    failed one.
+    """
+    uploaded = result.upload_summary.succeeded if result.upload_summary else 0
+    if args.ingest == 'off' or not (uploaded or result.deleted):
+        return None
+    trigger = IngestionTrigger(get_bedrock_agent_client(), settle=args.ingest_settle, timeout=args.ingest_timeout)
+    try:
+        stats = trigger.sync(ready_at=ready_at, wait=args.ingest == 'wait')
+    except TimeoutError as e:
+        # The message names the job; it keeps running and can be checked later
+        logger.error(f"Stopped waiting for ingestion: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"Could not start knowledge-base ingestion: {e}")
+        return None
+    stats.log()
+    if stats.status == 'FAILED' or stats.failed:
+        logger.error(f"Ingestion job {stats.job_id} finished {stats.status} with {stats.failed} failed documents")
+    return stats
+
+
+def run_instrumented(pipeline: Pipeline, args: argparse.Namespace) -> PipelineResult:
+    """Run a pipeline with periodic metrics reporting and the optional profiler."""
+    name = pipeline.transform.name
+    suffix = 'prof' if args.profile == 'cpu' else 'tracemalloc.txt'
+    reporter = MetricsReporter(pipeline.metrics(), interval=args.metrics_interval,
+                               prometheus_path=None if args.dry_run else args.metrics_file)
+    with profiled(args.profile, OUTPUT_ROOT / f"{name}.{suffix}"), reporter:
+        return pipeline.run()
+
+
+def run_pipeline(transform: Transform, args: argparse.Namespace,
+                 source_factory: Optional[SourceFactory] = None) -> int:
+    """Run the standard pipeline for a document type; returns the number of processed entities.
+
+    source_factory(start_after) replaces the full-export source, e.g. with a regional one.
+    """
+    if source_factory is None:
+        def source_factory(start_after: Optional[str]) -> FirestoreSource:
+            return FirestoreSource(transform.source_path, start_after=start_after)
+    # Stream entities one at a time instead of loading the whole export
+    logger.info(f"Streaming {transform.name} from {transform.source_path}...")
+
+    build = BuildStage(transform, processes=args.build_workers, ordered=not args.unordered,
+                       packer=create_packer(transform, args))
+
+    if args.dry_run:
+        logger.info("Dry run: nothing will be written locally or to AWS")
+        pipeline = Pipeline(transform, source_factory(None), build,
+                            local_sink=NullSink('local'), s3_sink=NullSink('s3'), dedup=create_dedup(transform, args))
+        result = run_instrumented(pipeline, args)
+        log_result(transform, result)
+        return result.processed
+
+    checkpoint_path = OUTPUT_ROOT / f"{transform.name}.checkpoint.json"
+    resume = Checkpoint.load(checkpoint_path) if args.resume else None
+    if args.resume and resume is None:
+        logger.info("No checkpoint found; starting from the beginning")
+    if resume is not None and resume.source_path != transform.source_path:
+        raise ValueError(f"Checkpoint is for {resume.source_path}, not {transform.source_path}")
+    start_after = None
+    if resume is not None:
+        logger.info(f"Resuming after {resume.entities_done} {transform.name} "
+                    f"({len(resume.uploaded)} objects already uploaded)")
+        # Completion order differs between unordered runs, so only the uploaded-key set is reliable
+        if not args.unordered:
+            start_after = resume.last_entity_key
+    source = source_factory(start_after)
+
+    config = get_config()
+    multipart = MultipartUploader(
+        get_s3_client(), config.s3.data_bucket_name,
+        state_dir=OUTPUT_ROOT / '.multipart',
+        threshold=args.multipart_threshold_mb * MB,
+        part_size=args.part_size_mb * MB,
+        part_concurrency=args.part_concurrency,
+    )
+    with IngestManifest(args.manifest, run_id=resume.run_id if resume else None) as manifest:
+        # Lets reconcile --from-export check that it rebuilds the same documents
+        manifest.set_meta(BUILD_OPTIONS_META, build_options(args))
+        checkpoint = Checkpoint(checkpoint_path, transform.source_path, manifest.run_id,
+                                resume=resume, interval=args.checkpoint_interval)
+        pipeline = Pipeline(
+            transform,
+            source=source,
+            build=build,
+            local_sink=create_local_sink(transform, args),
+            # Uploads run in the background while documents are being built
+            s3_sink=create_s3_sink(args, config.s3.data_bucket_name, multipart, checkpoint.mark_uploaded),
+            manifest=manifest,
+            force=args.force,
+            checkpoint=checkpoint,
+            dedup=create_dedup(transform, args),
+        )
+        result = run_instrumented(pipeline, args)
+    ready_at = time.time()
+
+    log_result(transform, result)
+    trigger_ingestion(result, args, ready_at)
+    return result.processed
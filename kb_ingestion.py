@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""Start and monitor Bedrock knowledge-base ingestion jobs once uploads finish.
+
+A data source runs one ingestion job at a time, and each job scans the
+whole data source. So a run does not need its own job, only one that
+started after its uploads finished: IngestionTrigger waits a short settle
+period (letting the other runs of a burst finish uploading), then joins a
+job that started after its uploads, waits out an older one still running,
+or starts a new one. Back-to-back events and locations runs end up sharing
+a single sync.
+
+Every call goes through the bedrock-agent client passed in, so a stub
+client (and a fake sleep / clock) is enough to exercise it.
+"""
+
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from s3_uploader import error_code
+
+logger = logging.getLogger(__name__)
+
+KNOWLEDGE_BASE_ID = 'RNV8IF58LD'
+DATA_SOURCE_ID = 'ZTFJOUHWFY'
+
+INGEST_MODES = ('off', 'start', 'wait')
+ACTIVE_STATUSES = ('STARTING', 'IN_PROGRESS', 'STOPPING')
+DEFAULT_SETTLE_SECONDS = 15.0
+DEFAULT_POLL_INTERVAL = 5.0
+DEFAULT_MAX_POLL_INTERVAL = 60.0
+DEFAULT_TIMEOUT = 3600.0
+
+# Errors worth retrying after a pause: another job is starting, or we are being throttled
+_RETRY_ERROR_CODES = {'ConflictException', 'ThrottlingException'}
+
+
+@dataclass
+class IngestionJobStats:
+    """Outcome of the ingestion job that covered a run."""
+
+    job_id: str
+    status: str
+    joined: bool = False  # True when another run's job was reused
+    scanned: int = 0
+    metadata_scanned: int = 0
+    indexed: int = 0
+    modified: int = 0
+    deleted: int = 0
+    failed: int = 0
+    duration: float = 0.0  # Job start to its last update
+    waited: float = 0.0  # Time this run spent settling, starting and polling
+    failure_reasons: List[str] = field(default_factory=list)
+
+    @classmethod
+    def from_job(cls, job: Dict[str, Any], joined: bool = False, waited: float = 0.0) -> 'IngestionJobStats':
+        statistics = job.get('statistics', {})
+        started, updated = job.get('startedAt'), job.get('updatedAt')
+        return cls(
+            job_id=job['ingestionJobId'],
+            status=job['status'],
+            joined=joined,
+            scanned=statistics.get('numberOfDocumentsScanned', 0),
+            metadata_scanned=statistics.get('numberOfMetadataDocumentsScanned', 0),
+            indexed=statistics.get('numberOfNewDocumentsIndexed', 0),
+            modified=(statistics.get('numberOfModifiedDocumentsIndexed', 0)
+                      + statistics.get('numberOfMetadataDocumentsModified', 0)),
+            deleted=statistics.get('numberOfDocumentsDeleted', 0),
+            failed=statistics.get('numberOfDocumentsFailed', 0),
+            duration=(updated - started).total_seconds() if started and updated else 0.0,
+            waited=waited,
+            failure_reasons=list(job.get('failureReasons', [])),
+        )
+
+    def log(self) -> None:
+        how = "joined" if self.joined else "started"
+        logger.info(f"Ingestion job {self.job_id} ({how}): {self.status} in {self.duration:.0f}s "
+                    f"(waited {self.waited:.0f}s)")
+        logger.info(f"  scanned {self.scanned} documents and {self.metadata_scanned} metadata files; "
+                    f"indexed {self.indexed} new, {self.modified} modified, deleted {self.deleted}, "
+                    f"failed {self.failed}")
+        for reason in self.failure_reasons[:20]:
+            logger.error(f"  {reason}")
+
+
+class IngestionTrigger:
+    """Starts (or joins) a data-source ingestion job and polls it to completion.
+
+    Polling starts at poll_interval and doubles up to max_poll_interval;
+    wait() raises TimeoutError if the job has not finished after timeout
+    seconds.
+    """
+
+    def __init__(self, client: Any, kb_id: str = KNOWLEDGE_BASE_ID, data_source_id: str = DATA_SOURCE_ID,
+                 settle: float = DEFAULT_SETTLE_SECONDS,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 max_poll_interval: float = DEFAULT_MAX_POLL_INTERVAL,
+                 timeout: float = DEFAULT_TIMEOUT,
+                 sleep: Callable[[float], None] = time.sleep,
+                 clock: Callable[[], float] = time.time):
+        self.client = client
+        self.kb_id = kb_id
+        self.data_source_id = data_source_id
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.timeout = timeout
+        self.sleep = sleep
+        self.clock = clock
+
+    def latest_job(self) -> Optional[Dict[str, Any]]:
+        """Summary of the most recently started ingestion job, if any."""
+        response = self.client.list_ingestion_jobs(
+            knowledgeBaseId=self.kb_id,
+            dataSourceId=self.data_source_id,
+            sortBy={'attribute': 'STARTED_AT', 'order': 'DESCENDING'},
+            maxResults=1,
+        )
+        summaries = response.get('ingestionJobSummaries', [])
+        return summaries[0] if summaries else None
+
+    def get_job(self, job_id: str) -> Dict[str, Any]:
+        return self.client.get_ingestion_job(
+            knowledgeBaseId=self.kb_id, dataSourceId=self.data_source_id, ingestionJobId=job_id
+        )['ingestionJob']
+
+    def ensure_job(self, ready_at: Optional[float] = None) -> Any:
+        """A job that starts after ready_at (when our uploads finished): (job, joined).
+
+        Blocks while an older job is still running, since its scan may
+        have missed our uploads and a new one cannot start until it ends.
+        ready_at comes from this host's clock and is compared with the
+        job's startedAt from Bedrock, so it assumes the two clocks agree
+        (e.g. both NTP-synced); skew of more than a second or two could let
+        a run join a job that started just before its last upload.
+        """
+        ready_at = self.clock() if ready_at is None else ready_at
+        if self.settle > 0:
+            self.sleep(self.settle)
+        delay = self.poll_interval
+        while True:
+            job = self.latest_job()
+            if job is not None and job['startedAt'].timestamp() >= ready_at:
+                logger.info(f"Joining ingestion job {job['ingestionJobId']}, started after our uploads")
+                return job, True
+            if job is not None and job['status'] in ACTIVE_STATUSES:
+                logger.info(f"Ingestion job {job['ingestionJobId']} is {job['status']}; "
+                            f"waiting for it before starting a new one")
+                self.wait(job['ingestionJobId'])
+                continue
+            try:
+                response = self.client.start_ingestion_job(
+                    knowledgeBaseId=self.kb_id,
+                    dataSourceId=self.data_source_id,
+                    description="Started by the ingestion pipeline",
+                )
+            except Exception as e:
+                if error_code(e) not in _RETRY_ERROR_CODES:
+                    raise
+                # Another run got there first (or we are throttled); look again shortly
+                logger.info(f"Could not start ingestion yet ({error_code(e)}); retrying in {delay:.0f}s")
+                self.sleep(delay)
+                delay = min(delay * 2, self.max_poll_interval)
+                continue
+            job = response['ingestionJob']
+            logger.info(f"Started ingestion job {job['ingestionJobId']}")
+            return job, False
+
+    def wait(self, job_id: str) -> Dict[str, Any]:
+        """Poll a job with exponential backoff until it leaves the active statuses."""
+        deadline = self.clock() + self.timeout
+        delay = self.poll_interval
+        while True:
+            job = self.get_job(job_id)
+            if job['status'] not in ACTIVE_STATUSES:
+                return job
+            if self.clock() + delay > deadline:
+                raise TimeoutError(f"Ingestion job {job_id} still {job['status']} after {self.timeout:.0f}s")
+            statistics = job.get('statistics', {})
+            logger.info(f"Ingestion job {job_id} {job['status']}: "
+                        f"{statistics.get('numberOfDocumentsScanned', 0)} scanned")
+            self.sleep(delay)
+            delay = min(delay * 2, self.max_poll_interval)
+
+    def sync(self, ready_at: Optional[float] = None, wait: bool = True) -> IngestionJobStats:
+        """Make sure an ingestion job covers uploads finished at ready_at; optionally wait for it."""
+        started = self.clock()
+        job, joined = self.ensure_job(ready_at if ready_at is not None else started)
+        if wait:
+            job = self.wait(job['ingestionJobId'])
+        return IngestionJobStats.from_job(job, joined=joined, waited=self.clock() - started)
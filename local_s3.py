@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Local-filesystem stand-in for the subset of the boto3 S3 client used by the ingestion scripts."""
+
+import asyncio
+import functools
+import io
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Union
+
+
+class LocalS3Client:
+    """Writes objects to <root>/<Bucket>/<Key> so uploads can be exercised without AWS."""
+
+    def __init__(self, root: Union[str, Path]):
+        self.root = Path(root)
+
+    def _path(self, bucket: str, key: str) -> Path:
+        return self.root / bucket / key
+
+    def put_object(self, Bucket: str, Key: str, Body: Union[str, bytes], **kwargs: Any) -> Dict[str, Any]:
+        path = self._path(Bucket, Key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if hasattr(Body, 'read'):
+            Body = Body.read()
+        data = Body.encode('utf-8') if isinstance(Body, str) else Body
+        tmp = path.with_name(path.name + '.tmp')
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        return {'ETag': f'"{len(data)}"'}
+
+    def get_object(self, Bucket: str, Key: str, **kwargs: Any) -> Dict[str, Any]:
+        path = self._path(Bucket, Key)
+        if not path.exists():
+            raise KeyError(Key)
+        data = path.read_bytes()
+        return {'Body': io.BytesIO(data), 'ContentLength': len(data)}
+
+    def delete_objects(self, Bucket: str, Delete: Dict[str, Any], **kwargs: Any) -> Dict[str, Any]:
+        deleted: List[Dict[str, str]] = []
+        for obj in Delete['Objects']:
+            path = self._path(Bucket, obj['Key'])
+            if path.exists():
+                path.unlink()
+            deleted.append({'Key': obj['Key']})
+        return {} if Delete.get('Quiet') else {'Deleted': deleted}
+
+    def list_objects_v2(self, Bucket: str, Prefix: str = '', ContinuationToken: str = '',
+                        StartAfter: str = '', MaxKeys: int = 1000, **kwargs: Any) -> Dict[str, Any]:
+        bucket_root = self.root / Bucket
+        keys = sorted(
+            path.relative_to(bucket_root).as_posix()
+            for path in bucket_root.rglob('*')
+            if path.is_file() and not path.name.endswith('.tmp')
+        ) if bucket_root.exists() else []
+        keys = [key for key in keys if key.startswith(Prefix) and key > max(ContinuationToken, StartAfter)]
+        page = keys[:MaxKeys]
+        response: Dict[str, Any] = {
+            'Contents': [{'Key': key, 'Size': (bucket_root / key).stat().st_size} for key in page],
+            'KeyCount': len(page),
+            'IsTruncated': len(keys) > MaxKeys,
+        }
+        if response['IsTruncated']:
+            response['NextContinuationToken'] = page[-1]
+        return response
+
+    def _upload_dir(self, upload_id: str) -> Path:
+        return self.root / '.multipart' / upload_id
+
+    def _missing_upload(self, upload_id: str) -> Exception:
+        error = KeyError(upload_id)
+        error.response = {'Error': {'Code': 'NoSuchUpload'}}
+        return error
+
+    def create_multipart_upload(self, Bucket: str, Key: str, **kwargs: Any) -> Dict[str, Any]:
+        upload_id = uuid.uuid4().hex
+        self._upload_dir(upload_id).mkdir(parents=True)
+        return {'Bucket': Bucket, 'Key': Key, 'UploadId': upload_id}
+
+    def upload_part(self, Bucket: str, Key: str, UploadId: str, PartNumber: int,
+                    Body: Union[str, bytes], **kwargs: Any) -> Dict[str, Any]:
+        upload_dir = self._upload_dir(UploadId)
+        if not upload_dir.exists():
+            raise self._missing_upload(UploadId)
+        data = Body.encode('utf-8') if isinstance(Body, str) else Body
+        (upload_dir / f"{PartNumber:05d}").write_bytes(data)
+        return {'ETag': f'"{PartNumber}-{len(data)}"'}
+
+    def list_parts(self, Bucket: str, Key: str, UploadId: str, **kwargs: Any) -> Dict[str, Any]:
+        upload_dir = self._upload_dir(UploadId)
+        if not upload_dir.exists():
+            raise self._missing_upload(UploadId)
+        parts = []
+        for path in sorted(upload_dir.iterdir()):
+            size = path.stat().st_size
+            parts.append({'PartNumber': int(path.name), 'ETag': f'"{int(path.name)}-{size}"', 'Size': size})
+        return {'Parts': parts, 'IsTruncated': False}
+
+    def complete_multipart_upload(self, Bucket: str, Key: str, UploadId: str,
+                                  MultipartUpload: Dict[str, Any], **kwargs: Any) -> Dict[str, Any]:
+        upload_dir = self._upload_dir(UploadId)
+        if not upload_dir.exists():
+            raise self._missing_upload(UploadId)
+        path = self._path(Bucket, Key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'wb') as out:
+            for part in MultipartUpload['Parts']:
+                out.write((upload_dir / f"{part['PartNumber']:05d}").read_bytes())
+        shutil.rmtree(upload_dir)
+        return {'Bucket': Bucket, 'Key': Key}
+
+    def abort_multipart_upload(self, Bucket: str, Key: str, UploadId: str, **kwargs: Any) -> Dict[str, Any]:
+        shutil.rmtree(self._upload_dir(UploadId), ignore_errors=True)
+        return {}
+
+
+class AsyncLocalS3Client:
+    """asyncio face of a LocalS3Client, usable where an aiobotocore client context is expected.
+
+    latency adds a simulated round trip to every request, so concurrency
+    limits behave as they would against S3.
+    """
+
+    def __init__(self, client: LocalS3Client, latency: float = 0.0):
+        self.client = client
+        self.latency = latency
+
+    async def __aenter__(self) -> 'AsyncLocalS3Client':
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        return None
+
+    async def put_object(self, **kwargs: Any) -> Dict[str, Any]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        # Like a real async client, file I/O must not block the event loop
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(self.client.put_object, **kwargs))
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""On-disk spatial index over the locations export, for regional prepare runs.
+
+Built once per export: a single pass records where each location sits in
+the export file (byte offset and length) next to the latitude, longitude,
+city and country that go into its Bedrock metadata. Coordinates are kept
+in an SQLite R*Tree. A regional run looks up the matching locations in the
+index and reads only those entities from the export, instead of parsing
+the whole file.
+
+The index is rebuilt automatically when the export's size or modification
+time changes.
+"""
+
+import argparse
+import logging
+import math
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from firestore_stream import iter_firestore_spans, read_entity
+from ingestion_pipeline import OUTPUT_ROOT, FirestoreSource
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+EARTH_RADIUS_KM = 6371.0088
+BUILD_BATCH = 5000
+
+# (location_id, entity) -> metadata attributes with latitude, longitude, city and country
+AttributeFunction = Callable[[str, Dict[str, Any]], Dict[str, Any]]
+
+
+class IndexEntry(NamedTuple):
+    key: str
+    offset: int
+    length: int
+
+
+def _normalize(name: str) -> str:
+    return ' '.join(str(name).split()).casefold()
+
+
+def _parse_floats(value: str, count: int, option: str) -> Tuple[float, ...]:
+    try:
+        numbers = tuple(float(part) for part in value.split(','))
+    except ValueError:
+        numbers = ()
+    if len(numbers) != count or not all(math.isfinite(number) for number in numbers):
+        raise ValueError(f"{option} expects {count} comma-separated numbers, got {value!r}")
+    return numbers
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _longitude_ranges(west: float, east: float) -> List[Tuple[float, float]]:
+    """Split a west-to-east longitude span that may cross the antimeridian into plain ranges."""
+    if east - west >= 360:
+        return [(-180.0, 180.0)]
+    if west < -180:
+        west += 360
+    if east > 180:
+        east -= 360
+    if west <= east:
+        return [(west, east)]
+    return [(west, 180.0), (-180.0, east)]
+
+
+@dataclass(frozen=True)
+class Region:
+    """Which locations a regional run covers; every given filter must match.
+
+    bbox is (min_lat, min_lon, max_lat, max_lon); min_lon > max_lon crosses
+    the antimeridian. near and radius_km select a circle. Cities and
+    countries match case-insensitively, any one of each list.
+    """
+
+    bbox: Optional[Tuple[float, float, float, float]] = None
+    near: Optional[Tuple[float, float]] = None
+    radius_km: Optional[float] = None
+    cities: Tuple[str, ...] = ()
+    countries: Tuple[str, ...] = ()
+
+    def __post_init__(self):
+        if (self.near is None) != (self.radius_km is None):
+            raise ValueError("--near and --radius-km must be given together")
+        if self.radius_km is not None and self.radius_km <= 0:
+            raise ValueError("--radius-km must be positive")
+        for lat, lon in self._points():
+            if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                raise ValueError(f"Coordinates out of range: {lat}, {lon}")
+        if self.bbox is not None and self.bbox[0] > self.bbox[2]:
+            raise ValueError("--bbox min_lat must not exceed max_lat")
+
+    def _points(self) -> Iterator[Tuple[float, float]]:
+        if self.bbox is not None:
+            yield self.bbox[0], self.bbox[1]
+            yield self.bbox[2], self.bbox[3]
+        if self.near is not None:
+            yield self.near
+
+    @property
+    def is_spatial(self) -> bool:
+        return self.bbox is not None or self.near is not None
+
+    def boxes(self) -> List[Tuple[float, float, float, float]]:
+        """(min_lat, max_lat, min_lon, max_lon) boxes to look up in the R*Tree; empty when not spatial."""
+        if self.bbox is not None:
+            min_lat, min_lon, max_lat, max_lon = self.bbox
+            west, east = min_lon, max_lon if max_lon >= min_lon else max_lon + 360
+        else:
+            lat, lon = self.near
+            angle = self.radius_km / EARTH_RADIUS_KM
+            min_lat, max_lat = lat - math.degrees(angle), lat + math.degrees(angle)
+            spread = math.sin(angle) / math.cos(math.radians(lat)) if abs(lat) < 90 else 2.0
+            if min_lat <= -90 or max_lat >= 90 or angle >= math.pi / 2 or spread >= 1:
+                # The circle contains a pole or is wider than any longitude span
+                west, east = -180.0, 180.0
+            else:
+                delta = math.degrees(math.asin(spread))
+                west, east = lon - delta, lon + delta
+            min_lat, max_lat = max(min_lat, -90.0), min(max_lat, 90.0)
+        return [(min_lat, max_lat, low, high) for low, high in _longitude_ranges(west, east)]
+
+    def contains(self, latitude: float, longitude: float) -> bool:
+        """Exact spatial test, applied to the R*Tree candidates."""
+        if self.bbox is not None:
+            min_lat, min_lon, max_lat, max_lon = self.bbox
+            if not min_lat <= latitude <= max_lat:
+                return False
+            if min_lon <= max_lon:
+                if not min_lon <= longitude <= max_lon:
+                    return False
+            elif max_lon < longitude < min_lon:
+                return False
+        if self.near is not None:
+            return haversine_km(self.near[0], self.near[1], latitude, longitude) <= self.radius_km
+        return True
+
+    def describe(self) -> str:
+        parts = []
+        if self.bbox is not None:
+            parts.append(f"bbox {','.join(f'{value:g}' for value in self.bbox)}")
+        if self.near is not None:
+            parts.append(f"within {self.radius_km:g} km of {self.near[0]:g},{self.near[1]:g}")
+        if self.cities:
+            parts.append(f"city in {list(self.cities)}")
+        if self.countries:
+            parts.append(f"country in {list(self.countries)}")
+        return ' and '.join(parts)
+
+
+def add_region_arguments(parser: argparse.ArgumentParser) -> None:
+    """Options that restrict a run to a region; without any of them the whole export is processed."""
+    parser.add_argument('--bbox', metavar='MIN_LAT,MIN_LON,MAX_LAT,MAX_LON',
+                        help="Only locations inside this box (min_lon > max_lon crosses the antimeridian)")
+    parser.add_argument('--near', metavar='LAT,LON', help="Only locations within --radius-km of this point")
+    parser.add_argument('--radius-km', type=float, help="Radius for --near")
+    parser.add_argument('--city', action='append', default=[],
+                        help="Only locations in this city (repeatable, case-insensitive)")
+    parser.add_argument('--country', action='append', default=[],
+                        help="Only locations in this country (repeatable, case-insensitive)")
+    parser.add_argument('--location-index', default=str(OUTPUT_ROOT / 'locations.index.sqlite'),
+                        help="Spatial index of the locations export, built on first use")
+    parser.add_argument('--rebuild-index', action='store_true',
+                        help="Rebuild the spatial index even if the export looks unchanged")
+
+
+def region_from_args(args: argparse.Namespace) -> Optional[Region]:
+    """Region for the --bbox/--near/--city/--country options, or None for a full run."""
+    if not (args.bbox or args.near or args.radius_km is not None or args.city or args.country):
+        return None
+    return Region(
+        bbox=_parse_floats(args.bbox, 4, '--bbox') if args.bbox else None,
+        near=_parse_floats(args.near, 2, '--near') if args.near else None,
+        radius_km=args.radius_km,
+        cities=tuple(args.city),
+        countries=tuple(args.country),
+    )
+
+
+class LocationIndex:
+    """SQLite index from location coordinates, city and country to entity spans in the export."""
+
+    def __init__(self, path: Union[str, Path], source_path: Union[str, Path], attributes: AttributeFunction):
+        self.path = Path(path)
+        self.source_path = Path(source_path)
+        self.attributes = attributes
+        self.conn: Optional[sqlite3.Connection] = None
+
+    def __enter__(self) -> 'LocationIndex':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def _fingerprint(self) -> Dict[str, str]:
+        stat = self.source_path.stat()
+        return {'version': str(INDEX_VERSION), 'source': str(self.source_path.resolve()),
+                'size': str(stat.st_size), 'mtime_ns': str(stat.st_mtime_ns)}
+
+    def _stored_fingerprint(self) -> Dict[str, str]:
+        try:
+            return dict(self.conn.execute("SELECT key, value FROM meta").fetchall())
+        except sqlite3.DatabaseError:
+            return {}
+
+    def open(self, rebuild: bool = False) -> 'LocationIndex':
+        """Open the index, building it first if it is missing, stale or rebuild is set."""
+        fingerprint = self._fingerprint()
+        if self.path.exists() and not rebuild:
+            self.conn = sqlite3.connect(str(self.path))
+            if self._stored_fingerprint() == fingerprint:
+                return self
+            logger.info(f"{self.source_path} changed since {self.path} was built; rebuilding")
+            self.close()
+        self.build(fingerprint)
+        self.conn = sqlite3.connect(str(self.path))
+        return self
+
+    def build(self, fingerprint: Optional[Dict[str, str]] = None) -> int:
+        """Index every location in the export; returns the number indexed.
+
+        Written to a temporary file and moved into place, so an interrupted
+        build never leaves a partial index that looks current.
+        """
+        fingerprint = fingerprint or self._fingerprint()
+        started = time.perf_counter()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        tmp_path.unlink(missing_ok=True)
+        conn = sqlite3.connect(str(tmp_path))
+        indexed = placed = 0
+        try:
+            conn.execute("PRAGMA journal_mode=OFF")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            conn.execute("""
+                CREATE TABLE locations (
+                    id INTEGER PRIMARY KEY,
+                    key TEXT NOT NULL,
+                    offset INTEGER NOT NULL,
+                    length INTEGER NOT NULL,
+                    latitude REAL,
+                    longitude REAL,
+                    city TEXT NOT NULL,
+                    country TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE VIRTUAL TABLE location_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon)")
+
+            rows: List[tuple] = []
+            points: List[tuple] = []
+            with open(self.source_path, 'rb') as export:
+                # Export order doubles as the row id, so query results come back in file order
+                for row_id, (key, offset, length) in enumerate(iter_firestore_spans(str(self.source_path))):
+                    entity = read_entity(export, offset, length)
+                    attributes = self.attributes(key, entity if isinstance(entity, dict) else {})
+                    latitude, longitude = attributes['latitude'], attributes['longitude']
+                    # 0,0 is the metadata default for a location without coordinates
+                    if (latitude, longitude) == (0.0, 0.0) or not (-90 <= latitude <= 90
+                                                                     and -180 <= longitude <= 180):
+                        latitude = longitude = None
+                    else:
+                        points.append((row_id, latitude, latitude, longitude, longitude))
+                    rows.append((row_id, key, offset, length, latitude, longitude,
+                                 _normalize(attributes['city']), _normalize(attributes['country'])))
+                    if len(rows) >= BUILD_BATCH:
+                        indexed, placed = self._insert(conn, rows, points, indexed, placed)
+                indexed, placed = self._insert(conn, rows, points, indexed, placed)
+
+            conn.execute("CREATE INDEX locations_city ON locations (city)")
+            conn.execute("CREATE INDEX locations_country ON locations (country)")
+            conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", fingerprint.items())
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp_path, self.path)
+        logger.info(f"Indexed {indexed} locations ({placed} with coordinates) from {self.source_path} "
+                    f"in {time.perf_counter() - started:.2f}s")
+        return indexed
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, rows: List[tuple], points: List[tuple],
+                indexed: int, placed: int) -> Tuple[int, int]:
+        conn.executemany("INSERT INTO locations VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.executemany("INSERT INTO location_rtree VALUES (?, ?, ?, ?, ?)", points)
+        counts = indexed + len(rows), placed + len(points)
+        rows.clear()
+        points.clear()
+        return counts
+
+    def query(self, region: Region) -> List[IndexEntry]:
+        """Spans of the locations in a region, in export order."""
+        if self.conn is None:
+            raise RuntimeError("Index is not open")
+        conditions: List[str] = []
+        params: List[Any] = []
+        for column, names in (('city', region.cities), ('country', region.countries)):
+            if names:
+                conditions.append(f"l.{column} IN ({', '.join('?' * len(names))})")
+                params.extend(_normalize(name) for name in names)
+
+        if not region.is_spatial:
+            where = ' AND '.join(conditions)
+            cursor = self.conn.execute(f"SELECT l.key, l.offset, l.length FROM locations l WHERE {where} "
+                                       f"ORDER BY l.id", params)
+            return [IndexEntry(*row) for row in cursor]
+
+        matches: Dict[int, IndexEntry] = {}
+        where = ''.join(f" AND {condition}" for condition in conditions)
+        for box in region.boxes():
+            cursor = self.conn.execute(
+                "SELECT l.id, l.key, l.offset, l.length, l.latitude, l.longitude "
+                "FROM location_rtree r JOIN locations l ON l.id = r.id "
+                f"WHERE r.min_lat <= ? AND r.max_lat >= ? AND r.min_lon <= ? AND r.max_lon >= ?{where}",
+                [box[1], box[0], box[3], box[2]] + params)
+            for row_id, key, offset, length, latitude, longitude in cursor:
+                # The R*Tree stores 32-bit bounds rounded outwards, so check the exact coordinates
+                if region.contains(latitude, longitude):
+                    matches[row_id] = IndexEntry(key, offset, length)
+        return [matches[row_id] for row_id in sorted(matches)]
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class RegionSource(FirestoreSource):
+    """Source stage that reads only the indexed entities of a region from the export."""
+
+    partial = True
+
+    def __init__(self, path: str, entries: Sequence[IndexEntry], start_after: Optional[str] = None):
+        super().__init__(path, start_after=start_after)
+        self.entries = entries
+
+    def __iter__(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        entries = self.entries
+        if self.start_after is not None:
+            keys = [entry.key for entry in entries]
+            if self.start_after not in keys:
+                raise ValueError(f"Resume key {self.start_after!r} is not in the selected region")
+            entries = entries[keys.index(self.start_after) + 1:]
+        with open(self.path, 'rb') as export:
+            for entry in entries:
+                started = time.perf_counter()
+                entity = read_entity(export, entry.offset, entry.length)
+                self.stats.seconds += time.perf_counter() - started
+                self.stats.items += 1
+                yield entry.key, entity
+
+
+def regional_source_factory(region: Region, args: argparse.Namespace, source_path: str,
+                            attributes: AttributeFunction) -> Callable[[Optional[str]], RegionSource]:
+    """Look up a region in the (possibly freshly built) index; returns a source factory for run_pipeline."""
+    with LocationIndex(args.location_index, source_path, attributes).open(rebuild=args.rebuild_index) as index:
+        started = time.perf_counter()
+        entries = index.query(region)
+    logger.info(f"Region {region.describe()}: {len(entries)} locations "
+                f"(index lookup {time.perf_counter() - started:.3f}s)")
+    return lambda start_after: RegionSource(source_path, entries, start_after=start_after)
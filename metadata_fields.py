@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""Declarative metadata field specs, compiled once into a single extractor function.
+
+Each document type lists its Bedrock metadata attributes as Field specs.
+compile_metadata() turns the list into the source of one straight-line
+function (the same trick namedtuple and dataclasses use), so building an
+entity's metadata costs one dict lookup per path segment and no per-field
+interpretation or call. benchmarks/bench_metadata.py keeps it honest
+against the hand-written functions it replaced.
+
+Nothing from a spec reaches that source except identifiers checked
+against a strict pattern and repr() of plain str / int / bool / None /
+finite float values; every other value (defaults, coercion callables) is
+passed in through the function's namespace. The function only sees the
+few builtins it needs.
+
+Per field, in order:
+  path      dotted lookup into the entity ('address.city'); a tuple of paths
+            is coalesced, the first truthy value wins
+  param     take the value from an extractor argument instead of the entity
+  first     a list value is replaced by its first element
+  default   used when the value is missing (and, unless empty is given,
+            when it is falsy: None, '', 0, [])
+  empty     used when the value is present but falsy
+  coerce    type conversion for values found in the entity; a value that
+            does not convert falls back to default
+  as_list   a scalar is wrapped in a one-element list
+  limit     lists are truncated to this many items
+"""
+
+import builtins
+import keyword
+import math
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+METADATA_ATTRIBUTES = 'metadataAttributes'
+
+MetadataExtractor = Callable[..., Dict[str, Any]]
+
+
+class _Missing:
+    """Falsy marker for a path that is not in the entity."""
+
+    __slots__ = ()
+
+    def __bool__(self) -> bool:
+        return False
+
+    def __repr__(self) -> str:
+        return '<missing>'
+
+
+_MISSING = _Missing()
+_UNSET = object()
+
+# Locals of the generated function, which argument names must not shadow
+_GENERATED_NAME = re.compile(r'(?:[vp]\d+|w)\Z')
+# All the generated source may call
+_ALLOWED_BUILTINS = {name: getattr(builtins, name)
+                     for name in ('bool', 'dict', 'float', 'int', 'list', 'str', 'TypeError', 'ValueError')}
+
+
+def _check_identifier(name: Any) -> str:
+    if (type(name) is not str or not name.isidentifier() or keyword.iskeyword(name)
+            or name.startswith('_') or _GENERATED_NAME.match(name)):
+        raise ValueError(f"Invalid name: {name!r}")
+    return name
+
+
+@dataclass(frozen=True)
+class Field:
+    """One metadata attribute and the rules for deriving it from an entity."""
+
+    name: str
+    path: Union[str, Tuple[str, ...]] = ''
+    param: Optional[str] = None
+    default: Any = None
+    empty: Any = _UNSET
+    coerce: Optional[Callable[[Any], Any]] = None
+    first: bool = False
+    as_list: bool = False
+    limit: Optional[int] = None
+
+    def __post_init__(self):
+        if type(self.name) is not str:
+            raise ValueError(f"Field name must be a string: {self.name!r}")
+        if bool(self.path) == bool(self.param):
+            raise ValueError(f"Field {self.name!r} needs exactly one of path or param")
+        if self.param:
+            _check_identifier(self.param)
+        for path in self.paths if self.path else ():
+            if type(path) is not str or not all(path.split('.')):
+                raise ValueError(f"Field {self.name!r} has an invalid path: {path!r}")
+        if self.limit is not None and type(self.limit) is not int:
+            raise ValueError(f"Field {self.name!r} needs an integer limit: {self.limit!r}")
+
+    @property
+    def paths(self) -> Tuple[str, ...]:
+        return (self.path,) if isinstance(self.path, str) else tuple(self.path)
+
+
+# Coercions that are skipped for values already of the target type
+_BUILTIN_TYPES = (str, int, float, bool)
+
+
+def _constant(value: Any, name: str, namespace: Dict[str, Any]) -> str:
+    """Expression for a default: a literal where possible; mutable values are copied per call."""
+    if value is None or type(value) in (str, int, bool) or (type(value) is float and math.isfinite(value)):
+        return repr(value)
+    namespace[name] = value
+    if isinstance(value, list):
+        return f"{name}[:]"
+    if isinstance(value, dict):
+        return f"dict({name})"
+    return name
+
+
+def _lookup(path: str, target: str, entity: str, missing: str,
+            parents: Optional[Dict[str, str]] = None) -> List[str]:
+    """Lines that set target to the value at path; parents caches nested dicts shared between fields."""
+    *parent_segments, leaf = path.split('.')
+    lines: List[str] = []
+    source = entity
+    for depth, segment in enumerate(parent_segments):
+        parent = '.'.join(parent_segments[:depth + 1])
+        if parents is not None and parent in parents:
+            source = parents[parent]
+            continue
+        name = f"p{len(parents)}" if parents is not None else target
+        if source == entity:
+            lines.append(f"{name} = {entity}.get({segment!r})")
+        else:
+            lines.append(f"{name} = {source}.get({segment!r}) if {source}.__class__ is dict else None")
+        if parents is not None:
+            parents[parent] = name
+        source = name
+    get_leaf = f"{source}.get({leaf!r}{', _MISSING' if missing == '_MISSING' else ''})"
+    if source == entity:
+        lines.append(f"{target} = {get_leaf}")
+    else:
+        lines.append(f"{target} = {get_leaf} if {source}.__class__ is dict else {missing}")
+    return lines
+
+
+def _coercion(index: int, coerce: Callable[[Any], Any], value: str, namespace: Dict[str, Any]) -> Tuple[str, str]:
+    """(condition under which value needs converting, conversion expression)."""
+    if any(coerce is builtin for builtin in _BUILTIN_TYPES):
+        return f"{value}.__class__ is not {coerce.__name__}", f"{coerce.__name__}({value})"
+    namespace[f"_coerce{index}"] = coerce
+    return 'True', f"_coerce{index}({value})"
+
+
+def _field_source(index: int, field: Field, entity: str, namespace: Dict[str, Any],
+                  parents: Dict[str, str]) -> List[str]:
+    v = f"v{index}"
+    if field.param:
+        lines = [f"{v} = {field.param}"]
+        if field.coerce:
+            condition, conversion = _coercion(index, field.coerce, v, namespace)
+            lines.append(f"if {condition}: {v} = {conversion}")
+        return lines
+
+    default = _constant(field.default, f"_default{index}", namespace)
+    empty = default if field.empty is _UNSET else _constant(field.empty, f"_empty{index}", namespace)
+    paths = field.paths
+    # Only tell missing from falsy when a rule depends on it; a plain .get() is cheaper
+    missing = '_MISSING' if field.empty is not _UNSET or len(paths) > 1 else 'None'
+
+    lines = _lookup(paths[0], v, entity, missing, parents)
+    for path in paths[1:]:
+        lines.append(f"if not {v}:")
+        lines.extend(f"    {line}" for line in _lookup(path, 'w', entity, missing))
+        # A present-but-empty value still beats a missing one
+        lines.append(f"    if w or {v} is _MISSING: {v} = w")
+    if field.first:
+        lines.append(f"if {v}.__class__ is list: {v} = {v}[0] if {v} else None")
+
+    lines.append(f"if not {v}:")
+    if field.empty is _UNSET:
+        lines.append(f"    {v} = {default}")
+    else:
+        lines.append(f"    {v} = {default} if {v} is _MISSING else {empty}")
+    if field.coerce:
+        condition, conversion = _coercion(index, field.coerce, v, namespace)
+        lines.append(f"elif {condition}:")
+        lines.append("    try:")
+        lines.append(f"        {v} = {conversion}")
+        lines.append("    except (TypeError, ValueError):")
+        lines.append(f"        {v} = {default}")
+    limit = None if field.limit is None else int(field.limit)
+    if field.as_list and limit is not None and limit > 0:
+        lines.append(f"{v} = {v}[:{limit}] if {v}.__class__ is list else [{v}]")
+    else:
+        if field.as_list:
+            lines.append(f"if {v}.__class__ is not list: {v} = [{v}]")
+        if limit is not None:
+            lines.append(f"{v} = {v}[:{limit}]")
+    return lines
+
+
+def compile_metadata(fields: Sequence[Field], params: Sequence[str] = (), name: str = 'extract_metadata',
+                     entity: str = 'entity', doc: Optional[str] = None) -> MetadataExtractor:
+    """Compile field specs into name(entity, *params) -> Bedrock metadata dict."""
+    arguments = (entity,) + tuple(params)
+    for argument in (name,) + arguments:
+        _check_identifier(argument)
+    if len(set(arguments)) != len(arguments):
+        raise ValueError(f"Duplicate argument names: {list(arguments)}")
+    unknown = {field.param for field in fields if field.param} - set(params)
+    if unknown:
+        raise ValueError(f"Fields use undeclared params: {sorted(unknown)}")
+
+    namespace: Dict[str, Any] = {'__builtins__': _ALLOWED_BUILTINS, '_MISSING': _MISSING}
+    parents: Dict[str, str] = {}
+    body: List[str] = []
+    for index, field in enumerate(fields):
+        body.extend(_field_source(index, field, entity, namespace, parents))
+    attributes = ', '.join(f"{field.name!r}: v{index}" for index, field in enumerate(fields))
+    body.append(f"return {{{METADATA_ATTRIBUTES!r}: {{{attributes}}}}}")
+
+    signature = ', '.join(arguments)
+    source = f"def {name}({signature}):\n" + ''.join(f"    {line}\n" for line in body)
+    exec(compile(source, f"<metadata spec {name}>", 'exec'), namespace)
+    extractor = namespace[name]
+    extractor.__doc__ = doc
+    extractor.__source__ = source  # For debugging a spec
+    return extractor
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""Compact JSON encoding for metadata files and shard records.
+
+Uses orjson when it is installed and the stdlib encoder otherwise; both
+produce compact UTF-8 bytes (no whitespace, non-ASCII kept as is), so a
+metadata record is serialized once and the same bytes go to every sink.
+Shards are read back with the same backend.
+"""
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_BACKEND = 'orjson' if orjson is not None else 'json'
+
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+def stdlib_dumps(obj: Any) -> bytes:
+    """Compact UTF-8 JSON with the stdlib encoder."""
+    return _encoder.encode(obj).encode('utf-8')
+
+
+if orjson is not None:
+    loads = orjson.loads
+
+    def dumps(obj: Any) -> bytes:
+        """Compact UTF-8 JSON bytes."""
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # Values orjson rejects but the stdlib accepts, e.g. integers beyond 64 bits
+            return stdlib_dumps(obj)
+else:
+    loads = json.loads
+    dumps = stdlib_dumps
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""Resumable, parallel multipart upload of large local files to S3."""
+
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+from s3_uploader import error_code
+
+logger = logging.getLogger(__name__)
+
+MIN_PART_SIZE = 5 * 1024 * 1024  # S3 minimum for every part but the last
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+DEFAULT_MULTIPART_THRESHOLD = 16 * 1024 * 1024
+DEFAULT_PART_CONCURRENCY = 4
+DEFAULT_STATE_DIR = Path('documents_to_upload/.multipart')
+
+
+def file_fingerprint(path: Path) -> str:
+    """Size plus content hash, so a rewritten but identical file still matches its saved state."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return f"{path.stat().st_size}:{digest.hexdigest()}"
+
+
+class MultipartUploader:
+    """Uploads a file in parts on a thread pool and records finished parts on disk.
+
+    Progress for each key lives in a small JSON state file. If a run is
+    interrupted, the next upload_file() call for the same key and identical
+    file content picks up the existing multipart upload and only sends the
+    parts that are still missing.
+    """
+
+    def __init__(self, s3_client: Any, bucket: str,
+                 state_dir: Union[str, Path] = DEFAULT_STATE_DIR,
+                 threshold: int = DEFAULT_MULTIPART_THRESHOLD,
+                 part_size: int = DEFAULT_PART_SIZE,
+                 part_concurrency: int = DEFAULT_PART_CONCURRENCY,
+                 max_attempts: int = 5,
+                 base_delay: float = 0.2,
+                 max_delay: float = 10.0):
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(f"part_size must be at least {MIN_PART_SIZE} bytes")
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.state_dir = Path(state_dir)
+        self.threshold = max(threshold, part_size)
+        self.part_size = part_size
+        self.part_concurrency = part_concurrency
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def _state_path(self, key: str) -> Path:
+        name = hashlib.sha1(f"{self.bucket}/{key}".encode('utf-8')).hexdigest()
+        return self.state_dir / f"{name}.json"
+
+    def _load_state(self, key: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        path = self._state_path(key)
+        if not path.exists():
+            return None
+        try:
+            state = json.loads(path.read_text())
+        except ValueError:
+            return None
+        if state.get('fingerprint') != fingerprint or state.get('part_size') != self.part_size:
+            # The file changed since the interrupted attempt; its parts are useless
+            self._abort(key, state.get('upload_id'))
+            path.unlink(missing_ok=True)
+            return None
+        return state
+
+    def _save_state(self, key: str, state: Dict[str, Any]) -> None:
+        path = self._state_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + '.tmp')
+        tmp.write_text(json.dumps(state))
+        os.replace(tmp, path)
+
+    def _abort(self, key: str, upload_id: Optional[str]) -> None:
+        if not upload_id:
+            return
+        try:
+            self.s3_client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+        except Exception as e:
+            logger.warning(f"Could not abort multipart upload for {key}: {e}")
+
+    def _confirmed_parts(self, key: str, upload_id: str) -> Optional[Dict[str, str]]:
+        """Parts S3 already holds for an upload, or None if the upload no longer exists."""
+        parts: Dict[str, str] = {}
+        kwargs = {'Bucket': self.bucket, 'Key': key, 'UploadId': upload_id}
+        try:
+            while True:
+                response = self.s3_client.list_parts(**kwargs)
+                for part in response.get('Parts', []):
+                    parts[str(part['PartNumber'])] = part['ETag']
+                if not response.get('IsTruncated'):
+                    return parts
+                kwargs['PartNumberMarker'] = response['NextPartNumberMarker']
+        except Exception as e:
+            if error_code(e) == 'NoSuchUpload':
+                return None
+            raise
+
+    def _with_retries(self, description: str, operation):
+        for attempt in range(self.max_attempts):
+            try:
+                return operation()
+            except Exception as e:
+                if attempt + 1 >= self.max_attempts:
+                    raise
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+                logger.warning(f"{description} failed ({e}); retrying in {delay:.2f}s")
+                time.sleep(delay)
+
+    def upload_file(self, key: str, path: Union[str, Path]) -> int:
+        """Upload a file with multipart upload, resuming a previous attempt when possible.
+
+        Returns the number of bytes sent in this call (resumed parts are not resent).
+        """
+        path = Path(path)
+        size = path.stat().st_size
+        fingerprint = file_fingerprint(path)
+
+        state = self._load_state(key, fingerprint)
+        if state is not None:
+            confirmed = self._confirmed_parts(key, state['upload_id'])
+            if confirmed is None:
+                state = None
+            else:
+                state['parts'] = confirmed
+                logger.info(f"Resuming multipart upload of {key}: {len(confirmed)} part(s) already uploaded")
+        if state is None:
+            response = self.s3_client.create_multipart_upload(Bucket=self.bucket, Key=key)
+            state = {
+                'bucket': self.bucket,
+                'key': key,
+                'upload_id': response['UploadId'],
+                'fingerprint': fingerprint,
+                'part_size': self.part_size,
+                'parts': {},
+            }
+            self._save_state(key, state)
+
+        upload_id = state['upload_id']
+        part_count = max(1, -(-size // self.part_size))
+        missing = [number for number in range(1, part_count + 1) if str(number) not in state['parts']]
+        lock = threading.Lock()
+        sent = 0
+
+        def upload_part(number: int) -> None:
+            nonlocal sent
+            offset = (number - 1) * self.part_size
+            # Each part is read from disk on demand, so at most part_concurrency parts are in memory
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                data = f.read(self.part_size)
+            response = self._with_retries(
+                f"Part {number} of {key}",
+                lambda: self.s3_client.upload_part(Bucket=self.bucket, Key=key, UploadId=upload_id,
+                                                   PartNumber=number, Body=data)
+            )
+            with lock:
+                state['parts'][str(number)] = response['ETag']
+                sent += len(data)
+                self._save_state(key, state)
+
+        with ThreadPoolExecutor(max_workers=self.part_concurrency) as pool:
+            # list() re-raises the first part failure; saved state keeps the finished parts
+            list(pool.map(upload_part, missing))
+
+        parts = [{'PartNumber': int(number), 'ETag': etag}
+                 for number, etag in sorted(state['parts'].items(), key=lambda item: int(item[0]))]
+        self._with_retries(
+            f"Completing {key}",
+            lambda: self.s3_client.complete_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id,
+                                                             MultipartUpload={'Parts': parts})
+        )
+        self._state_path(key).unlink(missing_ok=True)
+        return sent
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Process-pool document build stage for the prepare_* scripts."""
+
+import collections
+import queue
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_MAX_INFLIGHT_PER_WORKER = 4
+
+
+class DocumentRecord(NamedTuple):
+    """A ready-to-write document: S3 key, text body and Bedrock metadata."""
+
+    key: str
+    body: str
+    metadata: Dict[str, Any]
+    doc_id: str  # Stable identity used by the ingestion manifest
+
+
+class BuildResult(NamedTuple):
+    """Documents built from one source entity, or the error that prevented it."""
+
+    entity_key: str
+    records: List[DocumentRecord]
+    error: Optional[str] = None
+
+
+BuildFunction = Callable[[str, Dict[str, Any]], List[DocumentRecord]]
+
+
+def _build_one(build: BuildFunction, entity_key: str, entity: Dict[str, Any]) -> BuildResult:
+    try:
+        return BuildResult(entity_key, build(entity_key, entity))
+    except Exception as e:
+        return BuildResult(entity_key, [], str(e))
+
+
+def _build_batch(build: BuildFunction, batch: List[Tuple[str, Dict[str, Any]]]) -> List[BuildResult]:
+    return [_build_one(build, entity_key, entity) for entity_key, entity in batch]
+
+
+def _batches(entities: Iterable[Tuple[str, Dict[str, Any]]], size: int) -> Iterator[List[Tuple[str, Dict[str, Any]]]]:
+    iterator = iter(entities)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def build_records(entities: Iterable[Tuple[str, Dict[str, Any]]],
+                  build: BuildFunction,
+                  processes: int = 0,
+                  ordered: bool = True,
+                  batch_size: int = DEFAULT_BATCH_SIZE,
+                  max_inflight: Optional[int] = None) -> Iterator[BuildResult]:
+    """Run build over a stream of (key, entity) pairs, optionally across a process pool.
+
+    With processes <= 1 the build runs inline. Otherwise entities are sent to
+    the pool in batches; at most max_inflight batches are outstanding at once
+    so a multi-GB export is never read ahead of the consumer. Results come back
+    in source order when ordered is True, or as soon as each batch completes.
+    build must be a module-level function so it can be pickled.
+    """
+    if processes <= 1:
+        for entity_key, entity in entities:
+            yield _build_one(build, entity_key, entity)
+        return
+
+    import multiprocessing  # Only paid for when a pool is actually used
+
+    max_inflight = max_inflight or processes * DEFAULT_MAX_INFLIGHT_PER_WORKER
+    batches = _batches(entities, batch_size)
+
+    with multiprocessing.Pool(processes) as pool:
+        if ordered:
+            pending = collections.deque()
+            for batch in batches:
+                pending.append(pool.apply_async(_build_batch, (build, batch)))
+                if len(pending) >= max_inflight:
+                    yield from pending.popleft().get()
+            while pending:
+                yield from pending.popleft().get()
+        else:
+            done = queue.Queue()
+            inflight = 0
+            for batch in batches:
+                pool.apply_async(_build_batch, (build, batch), callback=done.put, error_callback=done.put)
+                inflight += 1
+                if inflight >= max_inflight:
+                    yield from _completed(done.get())
+                    inflight -= 1
+            while inflight:
+                yield from _completed(done.get())
+                inflight -= 1
+
+
+def _completed(outcome: Any) -> List[BuildResult]:
+    """Unwrap a pool callback value, re-raising pool-level failures."""
+    if isinstance(outcome, BaseException):
+        raise outcome
+    return outcome
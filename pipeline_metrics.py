@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""Run-time metrics for the ingestion pipeline: periodic structured logs, Prometheus text and profiling."""
+
+import contextlib
+import json
+import logging
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Union
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_METRICS_INTERVAL = 60.0  # seconds
+DEFAULT_RESERVOIR_SIZE = 4096
+QUANTILES = (0.5, 0.95, 0.99)
+PROFILE_MODES = ('cpu', 'memory')
+
+
+class LatencySummary:
+    """Count, sum and a fixed-size uniform sample of observations, for p50/p95/p99.
+
+    Reservoir sampling keeps memory constant however many uploads a run
+    makes; percentiles are exact until the reservoir fills and a close
+    estimate after that.
+    """
+
+    def __init__(self, reservoir_size: int = DEFAULT_RESERVOIR_SIZE):
+        self.reservoir_size = reservoir_size
+        self.count = 0
+        self.total = 0.0
+        self._samples: List[float] = []
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            if len(self._samples) < self.reservoir_size:
+                self._samples.append(seconds)
+            else:
+                slot = random.randrange(self.count)
+                if slot < self.reservoir_size:
+                    self._samples[slot] = seconds
+
+    def quantiles(self, quantiles: Sequence[float] = QUANTILES) -> Dict[float, float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {q: 0.0 for q in quantiles}
+        return {q: samples[min(len(samples) - 1, int(q * len(samples)))] for q in quantiles}
+
+
+class PipelineMetrics:
+    """Collects counters, gauges and latency summaries from the stages of one run.
+
+    Stages keep their own counters (StageStats, UploadSummary); they are
+    registered here as callables so a snapshot always reads live values.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.monotonic()
+        self._stages: List[Union[Any, Callable[[], Any]]] = []
+        self._counters: Dict[str, Callable[[], float]] = {}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+        self._latencies: Dict[str, LatencySummary] = {}
+
+    def add_stage(self, stats: Union[Any, Callable[[], Any]]) -> None:
+        """Track a StageStats-like object (name, items, bytes, seconds), or a callable returning one."""
+        self._stages.append(stats)
+
+    def _stage_stats(self) -> List[Any]:
+        return [stats() if callable(stats) else stats for stats in self._stages]
+
+    def add_counter(self, name: str, read: Callable[[], float]) -> None:
+        self._counters[name] = read
+
+    def add_gauge(self, name: str, read: Callable[[], float]) -> None:
+        self._gauges[name] = read
+
+    def add_latency(self, name: str, summary: LatencySummary) -> None:
+        self._latencies[name] = summary
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current values as a JSON-serialisable dict."""
+        elapsed = time.monotonic() - self.started
+        stages = {}
+        for stats in self._stage_stats():
+            stages[stats.name] = {
+                'items': stats.items,
+                'bytes': stats.bytes,
+                'seconds': round(stats.seconds, 3),
+                'items_per_second': round(stats.items / stats.seconds, 1) if stats.seconds else 0.0,
+                'bytes_per_second': round(stats.bytes / stats.seconds, 1) if stats.seconds else 0.0,
+            }
+        latencies = {}
+        for name, summary in self._latencies.items():
+            latencies[name] = {f"p{int(q * 100)}": round(value, 6)
+                               for q, value in summary.quantiles().items()}
+            latencies[name]['count'] = summary.count
+        return {
+            'pipeline': self.name,
+            'elapsed': round(elapsed, 3),
+            'stages': stages,
+            'counters': {name: read() for name, read in self._counters.items()},
+            'gauges': {name: read() for name, read in self._gauges.items()},
+            'latency_seconds': latencies,
+        }
+
+    def log_snapshot(self) -> None:
+        logger.info(f"metrics {json.dumps(self.snapshot(), sort_keys=True)}")
+
+    def prometheus_text(self) -> str:
+        """Render the current values in the Prometheus text exposition format."""
+        label = f'pipeline="{self.name}"'
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str, samples: List[str]) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+
+        stages = self._stage_stats()
+        for unit in ('items', 'bytes', 'seconds'):
+            name = f"ingest_stage_{unit}_total"
+            metric(name, 'counter', f"Work done by each pipeline stage ({unit})", [
+                f'{name}{{{label},stage="{stats.name}"}} {getattr(stats, unit)}' for stats in stages
+            ])
+        for counter, read in self._counters.items():
+            name = f"ingest_{counter}_total"
+            metric(name, 'counter', counter.replace('_', ' ').capitalize(), [f"{name}{{{label}}} {read()}"])
+        for gauge, read in self._gauges.items():
+            name = f"ingest_{gauge}"
+            metric(name, 'gauge', gauge.replace('_', ' ').capitalize(), [f"{name}{{{label}}} {read()}"])
+        for latency, summary in self._latencies.items():
+            name = f"ingest_{latency}_seconds"
+            samples = [f'{name}{{{label},quantile="{q}"}} {value}' for q, value in summary.quantiles().items()]
+            samples.append(f"{name}_sum{{{label}}} {summary.total}")
+            samples.append(f"{name}_count{{{label}}} {summary.count}")
+            metric(name, 'summary', latency.replace('_', ' ').capitalize() + " latency", samples)
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path: Union[str, Path]) -> None:
+        """Atomically write the text dump, e.g. for node_exporter's textfile collector."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + '.tmp')
+        tmp.write_text(self.prometheus_text())
+        tmp.replace(path)
+
+
+class MetricsReporter:
+    """Background thread that logs a metrics snapshot (and refreshes the text dump) every interval."""
+
+    def __init__(self, metrics: PipelineMetrics, interval: float = DEFAULT_METRICS_INTERVAL,
+                 prometheus_path: Optional[Union[str, Path]] = None):
+        self.metrics = metrics
+        self.interval = interval
+        self.prometheus_path = prometheus_path
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> 'MetricsReporter':
+        if self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name='metrics-reporter', daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._report()
+
+    def _report(self) -> None:
+        try:
+            self.metrics.log_snapshot()
+            if self.prometheus_path:
+                self.metrics.write_prometheus(self.prometheus_path)
+        except Exception as e:
+            logger.warning(f"Could not report metrics: {e}")
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._report()
+
+
+@contextlib.contextmanager
+def profiled(mode: Optional[str], output_path: Union[str, Path], top: int = 25) -> Iterator[None]:
+    """Run the body under cProfile ('cpu') or tracemalloc ('memory'); a no-op when mode is None.
+
+    CPU profiles are saved to output_path for snakeviz / pstats; both modes
+    log their top entries when the body finishes.
+    """
+    if mode is None:
+        yield
+        return
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode: {mode}")
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    if mode == 'cpu':
+        import cProfile
+        import io
+        import pstats
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(str(output_path))
+            report = io.StringIO()
+            pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(top)
+            logger.info(f"CPU profile saved to {output_path}\n{report.getvalue()}")
+        return
+
+    import tracemalloc
+
+    tracemalloc.start(10)
+    try:
+        yield
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        stats = snapshot.statistics('lineno')
+        with open(output_path, 'w', encoding='utf-8') as f:
+            for stat in stats[:top * 4]:
+                f.write(f"{stat}\n")
+        lines = '\n'.join(f"  {stat}" for stat in stats[:top])
+        logger.info(f"Peak traced memory: {peak / 1e6:.1f} MB; top allocations (saved to {output_path}):\n{lines}")
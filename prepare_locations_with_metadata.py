@@ -1,162 +1,152 @@
 #!/usr/bin/env python3
 """Prepare location documents with metadata for Bedrock Knowledge Base ingestion."""
 
-import json
+import argparse
 import logging
 import uuid
-import boto3
 from pathlib import Path
-from typing import Dict, Any, List
-from src.config import load_config
+from typing import Dict, Any, List, Optional
+from metadata_fields import Field, compile_metadata
+from parallel_build import DocumentRecord
+from s3_uploader import delete_keys, iter_object_keys
+from aws_clients import get_config, get_s3_client
+from ingestion_pipeline import Transform, parse_args, run_pipeline
+from location_index import add_region_arguments, region_from_args, regional_source_factory
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-config = load_config()
-s3_client = boto3.client(
-        's3',
-        region_name=config.aws.region,
-        aws_access_key_id=config.aws.access_key_id,
-        aws_secret_access_key=config.aws.secret_access_key
-    )
+# Namespace for uuid5 document ids derived from (location_id, article_hash)
+LOCATION_DOCUMENT_NAMESPACE = uuid.UUID('2b72a12b-94a2-47cb-9e65-2e0a0b76f0dd')
 
 
-def generate_location_metadata(location: Dict[str, Any], location_id: str, article_hash: str) -> Dict[str, Any]:
-    """Generate Bedrock-compatible metadata for a location."""
-    
-    # Extract basic info
-    display_name = location.get('displayName', 'Unknown Location') if location.get('displayName', 'Unknown Location') else 'unknown'
-    categories = location.get('categories', []) if location.get('categories', []) else []
-    primary_category = location.get('primaryCategory', 'general') if location.get('primaryCategory', 'general') else 'unknown'
-    
-    # Extract address info
-    address_data = location.get('address', {})
-    city = address_data.get('city', 'unknown') if address_data.get('city', 'unknown') else 'unknown'
-    country = address_data.get('country', 'unknown') if address_data.get('country', 'unknown') else 'unknown'
-    
-    # Extract coordinates
-    coords = location.get('coordinates', {})
-    latitude = coords.get('latitude', 0.0) if coords.get('latitude', 0.0) else 0.0
-    longitude = coords.get('longitude', 0.0) if coords.get('longitude', 0.0) else 0.0
+def location_document_id(location_id: str, article_hash: str) -> str:
+    """Deterministic document id for one article of a location."""
+    return str(uuid.uuid5(LOCATION_DOCUMENT_NAMESPACE, f"{location_id}/{article_hash}"))
+
+
+def is_orphaned_document_key(key: str) -> bool:
+    """True for objects named by the old random uuid4 scheme.
+
+    Current document ids are uuid5 values, so any uuid4-named object in the
+    locations/ prefix was written by an earlier run and is no longer referenced.
+    """
+    name = key.rsplit('/', 1)[-1]
+    stem = name.split('.', 1)[0]
+    try:
+        return uuid.UUID(stem).version == 4
+    except ValueError:
+        return False
+
+
+def cleanup_orphaned_documents(s3_client: Any, bucket: str, output_dir: Path) -> int:
+    """Delete uuid4-named location documents from S3 and the local output directory."""
+    orphans = (key for key in iter_object_keys(s3_client, bucket, "locations/") if is_orphaned_document_key(key))
+    deleted, errors = delete_keys(s3_client, bucket, orphans)
+    for key, error in errors:
+        logger.error(f"Failed to delete {key}: {error}")
+
+    if output_dir.exists():
+        for path in output_dir.iterdir():
+            if is_orphaned_document_key(path.name):
+                path.unlink()
+
+    return deleted
+
+
+LOCATION_METADATA_FIELDS = [
+    Field('locationId', param='location_id', coerce=str),
+    Field('article_hash', param='article_hash'),
+    Field('displayName', 'displayName', default='Unknown Location', empty='unknown'),
+    # Bedrock requires arrays to have at least one value
+    Field('categories', 'categories', default=['general'], limit=10),
+    Field('primaryCategory', 'primaryCategory', default='general', empty='unknown'),
+    Field('city', 'address.city', default='unknown'),
+    Field('country', 'address.country', default='unknown'),
+    Field('latitude', 'coordinates.latitude', default=0.0, coerce=float),
+    Field('longitude', 'coordinates.longitude', default=0.0, coerce=float),
+]
+
+generate_location_metadata = compile_metadata(
+    LOCATION_METADATA_FIELDS, params=('location_id', 'article_hash'), name='generate_location_metadata',
+    entity='location', doc="Generate Bedrock-compatible metadata for a location.")
+
+
+def location_attributes(location_id: str, location_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Metadata attributes of a location, as the spatial index sees them."""
+    return generate_location_metadata(location_data, location_id, '')['metadataAttributes']
+
 
+def build_location_documents(location_id: str, location_data: Dict[str, Any]) -> List[DocumentRecord]:
+    """Build one document per article that mentions a location.
+
+    Pure CPU work on the entity dict, so it can run in a worker process.
+    """
+    records = []
     
-    # Ensure arrays have at least one value (Bedrock requirement)
-    if not categories:
-        categories = ["general"]
+    collections = location_data.get('__collections__', {})
+    mentions = collections.get('contextual_mentions', {})
     
-    # Build metadata in AWS Bedrock format
-    metadata = {
-        "metadataAttributes": {
-            "locationId": str(location_id),
-            "article_hash": article_hash,
-            "displayName": display_name,
-            "categories":categories[:10],  # Limit to 10
-            "primaryCategory": primary_category,
-            "city": city,
-            "country": country,
-            "latitude": latitude,
-            "longitude": longitude
-        }
-    }
+    for article_hash, mention_data in mentions.items():
+        chunks = mention_data.get('chunks', [])
+        chunk_texts = []
+        for chunk in chunks:
+            chunk_text = chunk.get('chunkText', '').strip()
+            if chunk_text:
+                chunk_texts.append(chunk_text)
+
+        content = "\n".join(chunk_texts)
+        metadata = generate_location_metadata(location=location_data, 
+                                              location_id=location_id,
+                                              article_hash=article_hash)
+        
+        # Stable key, so re-runs overwrite instead of adding new objects
+        document_id = location_document_id(location_id, article_hash)
+        prefix = "locations/"
+        records.append(DocumentRecord(f"{prefix}{document_id}.txt", content, metadata,
+                                      f"{location_id}/{article_hash}"))
     
-    return metadata
+    return records
+
 
+LOCATIONS = Transform(
+    name='locations',
+    label='Location',
+    source_path='global_locations.json',
+    build=build_location_documents,
+    progress_every=50,
+    chunk_separator='\n',
+    merge_attribute='article_hash',
+)
 
-def main():
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Location-specific command-line options."""
+    parser.add_argument('--cleanup-orphans', action='store_true',
+                        help="Delete uuid4-named documents left by earlier runs, then exit")
+    add_region_arguments(parser)
+
+
+def main(argv: Optional[List[str]] = None):
     """Prepare location documents with metadata."""
     
-    # Load config
-    config = load_config()
-    
-    # Load locations
-    logger.info("Loading locations from global_locations.json...")
-    with open('global_locations.json', 'r') as f:
-        json_data = json.load(f)
+    args = parse_args(LOCATIONS, argv, add_arguments)
     
-    # Handle Firestore export format
-    if isinstance(json_data, dict) and 'data' in json_data:
-        locations_dict = json_data['data']
-    else:
-        locations_dict = json_data
+    if args.cleanup_orphans:
+        logger.info("Deleting orphaned uuid4-named documents from locations/...")
+        deleted = cleanup_orphaned_documents(get_s3_client(), get_config().s3.data_bucket_name,
+                                             LOCATIONS.output_dir)
+        logger.info(f"Deleted {deleted} orphaned objects")
+        return 0
     
-    logger.info(f"Found {len(locations_dict)} locations")
+    # A regional run reads only the matching locations, found through the spatial index
+    region = region_from_args(args)
+    source_factory = None
+    if region is not None:
+        source_factory = regional_source_factory(region, args, LOCATIONS.source_path, location_attributes)
 
-    
-    # Create output directory
-    output_dir = Path('documents_to_upload/locations')
-    output_dir.mkdir(exist_ok=True)
-    
-    # Process locations
-    processed = 0
-    skipped = 0
-    
-    for location_id, location_data in locations_dict.items():
-        try:
-            collections = location_data.get('__collections__', {})
-            mentions = collections.get('contextual_mentions', {})
-            
-            for article_hash, mention_data in mentions.items():
-                chunks = mention_data.get('chunks', [])
-                chunk_texts = []
-                for chunk in chunks:
-                    chunk_text = chunk.get('chunkText', '').strip()
-                    if chunk_text:
-                        chunk_texts.append(chunk_text)
-
-                content = "\n".join(chunk_texts)
-                random_id = uuid.uuid4()
-                # Save document content (plain text only)
-                doc_file = output_dir / f"{random_id}.txt"
-                with open(doc_file, 'w', encoding='utf-8') as f:
-                    f.write(content)
-                
-                # Generate and save metadata
-                metadata = generate_location_metadata(location=location_data, 
-                                                      location_id=location_id,
-                                                      article_hash=article_hash)
-                metadata_file = output_dir / f"{random_id}.txt.metadata.json"
-                with open(metadata_file, 'w', encoding='utf-8') as f:
-                    json.dump(metadata, f, indent=2, ensure_ascii=False)
-
-                # Upload to S3
-
-                prefix = "locations/"
-                s3_article_key = f"{prefix}{random_id}.txt"
-                s3_client.put_object(Bucket=config.s3.data_bucket_name,
-                                     Key=s3_article_key,
-                                     Body=content)
-                
-                s3_metadata_key = f"{prefix}{random_id}.txt.metadata.json"
-                s3_client.put_object(Bucket=config.s3.data_bucket_name,
-                                     Key=s3_metadata_key,
-                                     Body=json.dumps(metadata))
-            
-            processed += 1
-            
-            if processed % 50 == 0:
-                logger.info(f"Processed {processed} locations...")
-        
-        except Exception as e:
-            logger.error(f"Error processing location {location_id}: {e}")
-            skipped += 1
-            continue
-    
-    logger.info(f"\n{'='*60}")
-    logger.info(f"Location document preparation complete!")
-    logger.info(f"{'='*60}")
-    logger.info(f"Processed: {processed} locations")
-    logger.info(f"Skipped: {skipped} locations")
-    logger.info(f"Output directory: {output_dir}")
-    logger.info(f"Files created: {processed * 2} (txt + metadata.json pairs)")
-    logger.info(f"{'='*60}")
-    
-    return processed
+    return run_pipeline(LOCATIONS, args, source_factory)
 
 
 if __name__ == "__main__":
     main()
-
-#%%
-temp = "Hello" if not None else "World"
-print(temp)
-# %%
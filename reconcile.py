@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""Reconcile the knowledge-base bucket with what the prepare scripts produced.
+
+Lists every managed prefix (events/, locations/) with parallel, paginated
+ListObjectsV2 calls, diffs the listing against the expected document keys
+and removes stale objects with batched DeleteObjects. Optionally syncs the
+data source's inclusion prefixes.
+
+Expected keys come from each script's manifest by default, which reflects
+the last run exactly (including --pack-* and --dedup). With --from-export
+they are rebuilt from the Firestore export instead, through the same
+build, pack and dedup stages as a prepare run; pass the --pack-* and
+--dedup options that run used. --delete refuses to run when they differ
+from the options recorded in the manifest, since every packed or deduped
+object would otherwise look stale.
+
+Each prefix is listed as several key ranges in parallel. Range bounds are
+taken from the expected keys, so they follow however the documents are
+actually named; with nothing expected, the prefix is listed in one go.
+
+Run it while no prepare script is uploading; objects uploaded after the
+listing started may otherwise look stale.
+"""
+
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterable, List, Optional, Set
+
+from aws_clients import get_bedrock_agent_client, get_config, get_s3_client
+from ingest_manifest import METADATA_SUFFIX, IngestManifest
+from ingestion_pipeline import (BUILD_OPTIONS_META, OUTPUT_ROOT, BuildStage, FirestoreSource, Transform,
+                                add_build_arguments, build_options, create_dedup, create_packer)
+from kb_ingestion import INGEST_MODES, IngestionTrigger
+from prepare_events_with_metadata import EVENTS
+from prepare_locations_with_metadata import LOCATIONS
+from s3_uploader import delete_keys, iter_object_keys
+from update_data_source_prefixes import INCLUSION_PREFIXES, sync_inclusion_prefixes
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TRANSFORMS = [EVENTS, LOCATIONS]
+
+DEFAULT_LIST_WORKERS = 16
+
+
+@dataclass
+class ReconcileReport:
+    """Differences between the bucket and the expected documents for one prefix."""
+
+    prefix: str
+    listed: int = 0
+    expected: int = 0
+    stale: List[str] = field(default_factory=list)
+    missing: List[str] = field(default_factory=list)
+    deleted: int = 0
+
+    def log(self) -> None:
+        logger.info(f"{self.prefix:<12} listed {self.listed:>9}  expected {self.expected:>9}  "
+                    f"stale {len(self.stale):>8}  missing {len(self.missing):>8}  deleted {self.deleted:>8}")
+
+
+def partition_bounds(keys: Iterable[str], partitions: int) -> List[str]:
+    """Keys splitting the sorted keys into about equal ranges; empty when there is nothing to split."""
+    ordered = sorted(keys)
+    if partitions <= 1 or len(ordered) < partitions:
+        return []
+    step = len(ordered) / partitions
+    return sorted({ordered[int(i * step)] for i in range(1, partitions)})
+
+
+def list_prefix(s3_client: Any, bucket: str, prefix: str, workers: int = DEFAULT_LIST_WORKERS,
+                bounds: Iterable[str] = ()) -> Set[str]:
+    """List every key under a prefix, split at bounds into key ranges that are paginated in parallel.
+
+    The ranges always cover the whole prefix, so bounds only affect how
+    evenly the work is spread, never which keys are found.
+    """
+    bounds = sorted(bound for bound in bounds if bound.startswith(prefix) and len(bound) > len(prefix))
+    # StartAfter is exclusive; resuming after the previous range's last possible key keeps the boundary key
+    starts = [None] + [_key_before(bound) for bound in bounds]
+    ranges = list(zip(starts, bounds + [None]))
+
+    def list_range(key_range) -> List[str]:
+        start_after, end_before = key_range
+        return list(iter_object_keys(s3_client, bucket, prefix, start_after=start_after, end_before=end_before))
+
+    keys: Set[str] = set()
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(ranges)))) as pool:
+        for range_keys in pool.map(list_range, ranges):
+            keys.update(range_keys)
+    return keys
+
+
+def _key_before(key: str) -> str:
+    """A key sorting after everything below key, but before key itself."""
+    return key[:-1] + chr(ord(key[-1]) - 1) + '\U0010ffff'
+
+
+def manifest_path(transform: Transform) -> Path:
+    return OUTPUT_ROOT / f"{transform.name}.manifest.sqlite"
+
+
+def expected_from_manifest(transform: Transform) -> Set[str]:
+    path = manifest_path(transform)
+    if not path.exists():
+        raise FileNotFoundError(f"No manifest at {path}; run the prepare script first or use --from-export")
+    with IngestManifest(path) as manifest:
+        return _with_metadata(manifest.live_keys())
+
+
+def recorded_build_options(transform: Transform) -> Optional[str]:
+    """Build options saved by the last prepare run, if its manifest has them."""
+    path = manifest_path(transform)
+    if not path.exists():
+        return None
+    with IngestManifest(path) as manifest:
+        return manifest.get_meta(BUILD_OPTIONS_META)
+
+
+def expected_from_export(transform: Transform, args: argparse.Namespace) -> Set[str]:
+    """Document keys a prepare run with the same build options would produce."""
+    # Ordered like a prepare run: which copy of a duplicate chunk survives depends on the order
+    build = BuildStage(transform, processes=args.build_workers, ordered=True, packer=create_packer(transform, args))
+    results = build.run(FirestoreSource(transform.source_path))
+    dedup = create_dedup(transform, args)
+    if dedup is not None:
+        results = dedup.run(results)
+    return _with_metadata(record.key for result in results for record in result.records)
+
+
+def _with_metadata(keys: Iterable[str]) -> Set[str]:
+    expected = set()
+    for key in keys:
+        expected.add(key)
+        expected.add(key + METADATA_SUFFIX)
+    return expected
+
+
+def reconcile_prefix(s3_client: Any, bucket: str, transform: Transform, expected: Set[str],
+                     delete: bool = False, workers: int = DEFAULT_LIST_WORKERS) -> ReconcileReport:
+    """Diff one prefix against its expected keys and optionally delete what is stale."""
+    bounds = partition_bounds((key for key in expected if not key.endswith(METADATA_SUFFIX)), workers)
+    listed = list_prefix(s3_client, bucket, transform.prefix, workers=workers, bounds=bounds)
+    report = ReconcileReport(transform.prefix, listed=len(listed), expected=len(expected))
+    report.stale = sorted(listed - expected)
+    report.missing = sorted(expected - listed)
+    if delete and report.stale:
+        report.deleted, errors = delete_keys(s3_client, bucket, report.stale)
+        for key, error in errors:
+            logger.error(f"Failed to delete {key}: {error}")
+    return report
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command-line options."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--delete', action='store_true',
+                        help="Delete stale objects (without it, only report them)")
+    parser.add_argument('--from-export', action='store_true',
+                        help="Rebuild expected keys from the Firestore exports instead of the manifests")
+    parser.add_argument('--build-workers', type=int, default=0,
+                        help="Worker processes for --from-export")
+    add_build_arguments(parser)
+    parser.add_argument('--repair-manifest', action='store_true',
+                        help="Forget manifest entries whose objects are missing, so the next run re-uploads them")
+    parser.add_argument('--sync-prefixes', action='store_true',
+                        help="Set the data source's inclusion prefixes to the managed prefixes")
+    parser.add_argument('--ingest', choices=INGEST_MODES, default='off',
+                        help="After deleting, start a knowledge-base ingestion job (and optionally wait for it)")
+    parser.add_argument('--list-workers', type=int, default=DEFAULT_LIST_WORKERS,
+                        help="Parallel ListObjectsV2 ranges per prefix")
+    parser.add_argument('--only', choices=[transform.name for transform in TRANSFORMS], action='append',
+                        help="Reconcile only this document type (repeatable)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> List[ReconcileReport]:
+    """Reconcile every managed prefix."""
+
+    args = parse_args(argv)
+    s3_client = get_s3_client()
+    bucket = get_config().s3.data_bucket_name
+
+    reports = []
+    for transform in TRANSFORMS:
+        if args.only and transform.name not in args.only:
+            continue
+        if args.from_export:
+            recorded = recorded_build_options(transform)
+            if recorded is not None and recorded != build_options(args):
+                message = (f"The last {transform.name} run used build options {recorded}, "
+                           f"not {build_options(args)}; pass the same --pack-* / --dedup options")
+                if args.delete:
+                    raise ValueError(message + " to delete with --from-export")
+                logger.warning(message)
+            expected = expected_from_export(transform, args)
+        else:
+            expected = expected_from_manifest(transform)
+        report = reconcile_prefix(s3_client, bucket, transform, expected, delete=args.delete,
+                                  workers=args.list_workers)
+        reports.append(report)
+
+        if args.repair_manifest and report.missing:
+            with IngestManifest(manifest_path(transform)) as manifest:
+                manifest.forget_keys(report.missing)
+                manifest.commit()
+
+    logger.info(f"\n{'='*60}")
+    logger.info(f"Reconciliation of s3://{bucket}")
+    logger.info(f"{'='*60}")
+    for report in reports:
+        report.log()
+        for key in report.stale[:10]:
+            logger.info(f"  stale:   {key}")
+        for key in report.missing[:10]:
+            logger.info(f"  missing: {key}")
+    if not args.delete and any(report.stale for report in reports):
+        logger.info("Re-run with --delete to remove stale objects")
+
+    if args.sync_prefixes:
+        sync_inclusion_prefixes(get_bedrock_agent_client(), bucket, INCLUSION_PREFIXES)
+    if args.ingest != 'off' and any(report.deleted for report in reports):
+        # Deletions only leave the index once the data source is synced
+        IngestionTrigger(get_bedrock_agent_client(), settle=0).sync(wait=args.ingest == 'wait').log()
+    logger.info(f"{'='*60}")
+
+    return reports
+
+
+if __name__ == "__main__":
+    main()
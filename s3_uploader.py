@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""Concurrent S3 upload stage shared by the prepare_* scripts."""
+
+import logging
+import queue
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple, Union
+
+from pipeline_metrics import LatencySummary
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 16
+DEFAULT_ASYNC_CONCURRENCY = 256  # Requests in flight on the asyncio uploader
+DEFAULT_MAX_ATTEMPTS = 5
+DELETE_BATCH_SIZE = 1000  # S3 DeleteObjects limit
+
+# Errors that will not go away by retrying
+NON_RETRYABLE_ERROR_CODES = {
+    'AccessDenied',
+    'InvalidAccessKeyId',
+    'NoSuchBucket',
+    'SignatureDoesNotMatch',
+}
+
+_STOP = object()
+
+
+@dataclass
+class UploadSummary:
+    """Outcome of an upload run."""
+
+    succeeded: int = 0
+    failed: int = 0
+    retries: int = 0
+    bytes_uploaded: int = 0
+    elapsed: float = 0.0
+    failures: List[Tuple[str, str]] = field(default_factory=list)
+
+    def log(self) -> None:
+        rate = self.succeeded / self.elapsed if self.elapsed else 0.0
+        logger.info(f"Uploaded: {self.succeeded} objects ({self.bytes_uploaded} bytes, {rate:.1f} objects/s)")
+        logger.info(f"Failed uploads: {self.failed}")
+        logger.info(f"Retries: {self.retries}")
+        for key, error in self.failures[:20]:
+            logger.error(f"  {key}: {error}")
+        if len(self.failures) > 20:
+            logger.error(f"  ... and {len(self.failures) - 20} more")
+
+
+def error_code(error: Exception) -> Optional[str]:
+    """Extract the AWS error code from a botocore ClientError-like exception."""
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict):
+        return response.get('Error', {}).get('Code')
+    return None
+
+
+class S3Uploader:
+    """Uploads objects with a fixed pool of worker threads fed by a bounded queue.
+
+    submit() blocks once max_pending objects are waiting, which caps the
+    memory held by bodies that have been produced but not yet uploaded.
+    Each object is retried with full-jitter exponential backoff.
+
+    submit_file() queues a local file instead of an in-memory body; it is
+    streamed from disk, and files above the multipart uploader's threshold
+    go through parallel, resumable multipart upload.
+    """
+
+    def __init__(self, s3_client: Any, bucket: str,
+                 concurrency: int = DEFAULT_CONCURRENCY,
+                 max_pending: Optional[int] = None,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 base_delay: float = 0.2,
+                 max_delay: float = 10.0,
+                 multipart: Optional[Any] = None,
+                 on_uploaded: Optional[Callable[[str], None]] = None):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multipart = multipart  # multipart_upload.MultipartUploader
+        self.on_uploaded = on_uploaded  # Called from worker threads with each uploaded key
+        self.summary = UploadSummary()
+        self.put_latency = LatencySummary()  # Per-attempt put_object latency
+
+        self._queue = queue.Queue(maxsize=max_pending or concurrency * 4)
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._closed = False
+        self._workers = [
+            threading.Thread(target=self._worker, name=f"s3-upload-{i}", daemon=True)
+            for i in range(concurrency)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def __enter__(self) -> 'S3Uploader':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def submit(self, key: str, body: Union[str, bytes]) -> None:
+        """Queue an object for upload, blocking while the queue is full."""
+        if self._closed:
+            raise RuntimeError("Uploader is closed")
+        self._queue.put((key, body, None))
+
+    def submit_file(self, key: str, path: Union[str, Path]) -> None:
+        """Queue a local file for upload without reading it into memory."""
+        if self._closed:
+            raise RuntimeError("Uploader is closed")
+        self._queue.put((key, None, Path(path)))
+
+    @property
+    def queue_depth(self) -> int:
+        """Objects submitted but not yet picked up by a worker."""
+        return self._queue.qsize()
+
+    @property
+    def elapsed(self) -> float:
+        return self.summary.elapsed if self._closed else time.monotonic() - self._started
+
+    def close(self) -> UploadSummary:
+        """Wait for all queued uploads to finish and return the summary."""
+        if not self._closed:
+            self._closed = True
+            for _ in self._workers:
+                self._queue.put(_STOP)
+            for worker in self._workers:
+                worker.join()
+            self.summary.elapsed = time.monotonic() - self._started
+        return self.summary
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _worker(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                key, body, path = item
+                try:
+                    if (path is not None and self.multipart is not None
+                            and path.stat().st_size >= self.multipart.threshold):
+                        self._upload_multipart(key, path)
+                    else:
+                        self._upload(key, body, path)
+                except Exception as e:
+                    # A vanished file or a failing on_uploaded callback must not take the worker down
+                    self._record_failure(key, 1, e)
+            finally:
+                self._queue.task_done()
+
+    def _record_success(self, key: str, size: int) -> None:
+        # The callback goes first: if it fails, the object counts as failed rather than both
+        if self.on_uploaded is not None:
+            self.on_uploaded(key)
+        with self._lock:
+            self.summary.succeeded += 1
+            self.summary.bytes_uploaded += size
+
+    def _record_failure(self, key: str, attempts: int, error: Exception) -> None:
+        logger.error(f"Upload failed for {key} after {attempts} attempt(s): {error}")
+        with self._lock:
+            self.summary.failed += 1
+            self.summary.failures.append((key, str(error)))
+
+    def _upload_multipart(self, key: str, path: Path) -> None:
+        # Parts are retried individually; a failure leaves resumable state behind
+        try:
+            sent = self.multipart.upload_file(key, path)
+        except Exception as e:
+            self._record_failure(key, 1, e)
+            return
+        self._record_success(key, sent)
+
+    def _put(self, key: str, body: Optional[Union[str, bytes]], path: Optional[Path]) -> None:
+        started = time.perf_counter()
+        try:
+            if path is None:
+                self.s3_client.put_object(Bucket=self.bucket, Key=key, Body=body)
+                return
+            with open(path, 'rb') as f:
+                self.s3_client.put_object(Bucket=self.bucket, Key=key, Body=f)
+        finally:
+            self.put_latency.observe(time.perf_counter() - started)
+
+    def _upload(self, key: str, body: Optional[Union[str, bytes]], path: Optional[Path]) -> None:
+        if path is not None:
+            size = path.stat().st_size
+        else:
+            size = len(body.encode('utf-8')) if isinstance(body, str) else len(body)
+        for attempt in range(self.max_attempts):
+            try:
+                self._put(key, body, path)
+            except Exception as e:
+                last_attempt = attempt + 1 >= self.max_attempts
+                if last_attempt or error_code(e) in NON_RETRYABLE_ERROR_CODES:
+                    self._record_failure(key, attempt + 1, e)
+                    return
+                with self._lock:
+                    self.summary.retries += 1
+                time.sleep(self._backoff(attempt))
+            else:
+                self._record_success(key, size)
+                return
+
+
+def iter_object_keys(s3_client: Any, bucket: str, prefix: str = '', start_after: Optional[str] = None,
+                     end_before: Optional[str] = None) -> Iterator[str]:
+    """Yield every key under a prefix, following ListObjectsV2 pagination.
+
+    start_after / end_before restrict the listing to a key range, so one
+    prefix can be listed as several ranges in parallel.
+    """
+    kwargs = {'Bucket': bucket, 'Prefix': prefix}
+    if start_after:
+        kwargs['StartAfter'] = start_after
+    while True:
+        response = s3_client.list_objects_v2(**kwargs)
+        for obj in response.get('Contents', []):
+            if end_before is not None and obj['Key'] >= end_before:
+                return
+            yield obj['Key']
+        if not response.get('IsTruncated'):
+            return
+        kwargs['ContinuationToken'] = response['NextContinuationToken']
+
+
+def delete_keys(s3_client: Any, bucket: str, keys: Iterable[str]) -> Tuple[int, List[Tuple[str, str]]]:
+    """Delete objects in DeleteObjects batches of up to 1000 keys.
+
+    Returns the number of deleted keys and a list of (key, error) pairs.
+    """
+    deleted = 0
+    errors: List[Tuple[str, str]] = []
+
+    def flush(batch: List[str]) -> None:
+        nonlocal deleted
+        response = s3_client.delete_objects(
+            Bucket=bucket,
+            Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+        )
+        batch_errors = response.get('Errors', [])
+        errors.extend((error['Key'], error.get('Message', error.get('Code', ''))) for error in batch_errors)
+        deleted += len(batch) - len(batch_errors)
+
+    batch: List[str] = []
+    for key in keys:
+        batch.append(key)
+        if len(batch) == DELETE_BATCH_SIZE:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    return deleted, errors
@@ -52,18 +52,51 @@ def send_patient_data_via_http(patient):
     return response
 
 
+MIN_SEARCH_TERM = 3  # Trigrams need at least three characters
+_search_index_installed = False
+
+
+def install_search_index(conn):
+    """Trigram FTS5 index over patients.name, kept in sync by triggers; filled once when first created"""
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'patients_fts'").fetchone()
+    with conn:
+        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS patients_fts USING fts5("
+                     "name, content='patients', content_rowid='rowid', tokenize='trigram')")
+        conn.execute("CREATE TRIGGER IF NOT EXISTS patients_fts_insert AFTER INSERT ON patients BEGIN "
+                     "INSERT INTO patients_fts (rowid, name) VALUES (new.rowid, new.name); END")
+        conn.execute("CREATE TRIGGER IF NOT EXISTS patients_fts_delete AFTER DELETE ON patients BEGIN "
+                     "INSERT INTO patients_fts (patients_fts, rowid, name) VALUES ('delete', old.rowid, old.name); END")
+        conn.execute("CREATE TRIGGER IF NOT EXISTS patients_fts_update AFTER UPDATE ON patients BEGIN "
+                     "INSERT INTO patients_fts (patients_fts, rowid, name) VALUES ('delete', old.rowid, old.name); "
+                     "INSERT INTO patients_fts (rowid, name) VALUES (new.rowid, new.name); END")
+        if not exists:
+            conn.execute("INSERT INTO patients_fts (patients_fts) VALUES ('rebuild')")
+
+
 def search_patients(search_term):
-    """VIOLATION 8: SQL injection vulnerability with PHI"""
+    """Full patient rows whose name contains search_term, as before, through the trigram index
+
+    Raises ValueError for terms shorter than MIN_SEARCH_TERM, as the patient API's search does.
+    """
     import sqlite3
+    global _search_index_installed
     
-    conn = sqlite3.connect('patients.db')
-    cursor = conn.cursor()
+    term = search_term.strip()
+    if len(term) < MIN_SEARCH_TERM:
+        raise ValueError(f"Search term must be at least {MIN_SEARCH_TERM} characters")
     
-    # VIOLATION 9: SQL injection - no parameterized queries
-    query = f"SELECT * FROM patients WHERE name LIKE '%{search_term}%'"
-    cursor.execute(query)
-    
-    results = cursor.fetchall()
+    conn = sqlite3.connect('patients.db')
+    try:
+        if not _search_index_installed:
+            install_search_index(conn)
+            _search_index_installed = True
+        
+        phrase = '"' + term.replace('"', '""') + '"'
+        results = conn.execute(
+            "SELECT patients.* FROM patients_fts JOIN patients ON patients.rowid = patients_fts.rowid "
+            "WHERE patients_fts MATCH ? ORDER BY patients.rowid", (phrase,)).fetchall()
+    finally:
+        conn.close()
     
     # VIOLATION 10: Returning PHI without access control
     return results
@@ -0,0 +1,282 @@
+"""
+Audit log for patient access, written off the request path.
+
+Handlers call AuditLog.event(), which puts a small dict on a bounded
+queue. One background thread takes events off the queue in batches,
+redacts them, serializes each as one compact JSON line and writes the
+batch with a single write(). The file is fsynced at most every
+fsync_interval seconds (and on close), and rotated by size like
+logging.handlers.RotatingFileHandler (audit.log -> audit.log.1 -> ...).
+
+An audit trail may not lose events, so a full queue is not a reason to
+drop one: event() waits up to put_timeout for room, then writes the event
+itself, synchronously. Only an event that cannot be written at all is
+counted as dropped, and that is logged as an error.
+
+Several worker processes may share one audit file. Every write and
+rotation happens under an flock on <path>.lock, and a writer that finds
+the file rotated underneath it reopens it. Without fcntl (Windows) each
+process writes its own <path>.<pid> file instead.
+
+Redaction runs before serialization. Values under PHI field names are
+replaced, as are SSN-shaped substrings in any string, so a handler that
+passes too much still does not put PHI on disk.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, List, Optional, Union
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_BATCH_SIZE = 512
+DEFAULT_FLUSH_INTERVAL = 0.2   # seconds an event may wait for a batch to fill
+DEFAULT_PUT_TIMEOUT = 0.1      # seconds event() waits for queue room before writing synchronously
+DEFAULT_FSYNC_INTERVAL = 1.0   # seconds between fsyncs; 0 = after every batch
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 10
+
+REDACTED = '[REDACTED]'
+PHI_FIELDS = frozenset({
+    'name', 'ssn', 'dob', 'address', 'phone', 'email', 'recipient', 'diagnosis', 'medications',
+    'lab_results', 'insurance', 'emergency_contact', 'notes', 'query', 'patient', 'data',
+})
+_SSN = re.compile(r'\b\d{3}-\d{2}-\d{4}\b')
+
+_STOP = object()
+
+
+def redact(value: Any, fields: FrozenSet[str] = PHI_FIELDS) -> Any:
+    """Copy of an event value with PHI fields and SSN-shaped strings replaced."""
+    if isinstance(value, dict):
+        return {key: REDACTED if key in fields else redact(item, fields) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(item, fields) for item in value]
+    if isinstance(value, str):
+        return _SSN.sub(REDACTED, value)
+    return value
+
+
+@dataclass
+class AuditStats:
+    enqueued: int = 0
+    sync_writes: int = 0       # Events written by event() itself because the queue was full
+    dropped: int = 0           # Events that could not be written at all
+    written: int = 0
+    batches: int = 0
+    fsyncs: int = 0
+    rotations: int = 0
+    errors: int = 0
+
+
+class AuditLog:
+    """Queue-fed, batching audit log writer; see the module docstring."""
+
+    def __init__(self, path: Union[str, Path], queue_size: int = DEFAULT_QUEUE_SIZE,
+                 batch_size: int = DEFAULT_BATCH_SIZE, flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 fsync_interval: float = DEFAULT_FSYNC_INTERVAL, max_bytes: int = DEFAULT_MAX_BYTES,
+                 backup_count: int = DEFAULT_BACKUP_COUNT, redact_fields: FrozenSet[str] = PHI_FIELDS,
+                 put_timeout: float = DEFAULT_PUT_TIMEOUT):
+        self.path = Path(path)
+        if fcntl is None:
+            self.path = self.path.with_name(f"{self.path.name}.{os.getpid()}")
+        self.batch_size = batch_size
+        self.put_timeout = put_timeout
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.redact_fields = redact_fields
+        self.stats = AuditStats()
+        self._queue: 'queue.Queue[Any]' = queue.Queue(maxsize=queue_size)
+        self._encoder = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False, default=str)
+        self._file = None
+        self._lock_file = None
+        self._write_lock = threading.Lock()  # The writer thread and synchronous event() calls
+        self._last_fsync = time.monotonic()
+        self._closed = False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name='audit-log', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def event(self, action: str, **fields: Any) -> None:
+        """Record an audit event; fields should be small and JSON-serializable.
+
+        Normally only queues the event. When the queue stays full for
+        put_timeout, or the log is closed, the event is written before
+        this returns.
+        """
+        fields['ts'] = time.time()
+        fields['action'] = action
+        if not self._closed:
+            try:
+                self._queue.put(fields, timeout=self.put_timeout)
+                self.stats.enqueued += 1
+                return
+            except queue.Full:
+                pass
+        self.stats.sync_writes += 1
+        self._write_or_report([fields])
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Write out everything queued, fsync and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch: List[Dict[str, Any]] = []
+            item = self._queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._write_or_report(batch, force_fsync=stopping)
+        with self._write_lock:
+            self._close_file()
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+
+    def _write_or_report(self, batch: List[Dict[str, Any]], force_fsync: bool = False) -> None:
+        """Write a batch, retrying once on a fresh file; events that still fail are counted and logged."""
+        for _ in range(2):
+            try:
+                with self._write_lock:
+                    self._write(batch, force_fsync)
+                return
+            except OSError as e:
+                self.stats.errors += 1
+                with self._write_lock:
+                    self._close_file()
+                error = e
+        self.stats.dropped += len(batch)
+        logger.error(f"Audit log {self.path}: {len(batch)} events could not be written: {error}")
+
+    def _write(self, batch: List[Dict[str, Any]], force_fsync: bool = False) -> None:
+        """Append a batch under the cross-process lock; called with _write_lock held."""
+        if batch:
+            data = ''.join(self._encoder.encode(redact(event, self.redact_fields)) + '\n'
+                           for event in batch).encode('utf-8')
+            self._lock()
+            try:
+                f = self._open_current()
+                size = os.fstat(f.fileno()).st_size
+                if size and size + len(data) > self.max_bytes:
+                    f = self._rotate()
+                f.write(data)
+                f.flush()
+            finally:
+                self._unlock()
+            self.stats.written += len(batch)
+            self.stats.batches += 1
+        now = time.monotonic()
+        if self._file is not None and (force_fsync or now - self._last_fsync >= self.fsync_interval):
+            self._last_fsync = now
+            try:
+                os.fsync(self._file.fileno())
+            except OSError as e:
+                # The batch is already written; retrying it would only duplicate it
+                self.stats.errors += 1
+                logger.error(f"Audit log {self.path}: fsync failed: {e}")
+                return
+            self.stats.fsyncs += 1
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, 'ab')
+        return self._file
+
+    def _open_current(self):
+        """The open file, reopened if another process has rotated it away."""
+        f = self._open()
+        try:
+            current = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            current = None
+        if current != os.fstat(f.fileno()).st_ino:
+            self._close_file()
+            f = self._open()
+        return f
+
+    def _lock(self) -> None:
+        if fcntl is None:
+            return  # One file per process, nothing to share
+        if self._lock_file is None:
+            self._lock_file = open(self.path.with_name(f"{self.path.name}.lock"), 'ab')
+        fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+
+    def _unlock(self) -> None:
+        if self._lock_file is not None:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _close_file(self) -> None:
+        if self._file is not None:
+            try:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+            except OSError:
+                self.stats.errors += 1
+            self._file = None
+
+    def _rotate(self):
+        """Shift the backups along and start a new file; called with the cross-process lock held."""
+        self._close_file()
+        for index in range(self.backup_count - 1, 0, -1):
+            source = self.path.with_name(f"{self.path.name}.{index}")
+            if source.exists():
+                os.replace(source, self.path.with_name(f"{self.path.name}.{index + 1}"))
+        if self.backup_count > 0:
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink(missing_ok=True)
+        self.stats.rotations += 1
+        return self._open()
+
+    def snapshot(self) -> Dict[str, Any]:
+        stats = asdict(self.stats)
+        stats['queue_depth'] = self.queue_depth
+        return stats
+
+
+def create_audit_log(environ: Optional[Dict[str, str]] = None) -> AuditLog:
+    """Audit log configured by PATIENT_AUDIT_LOG (path), PATIENT_AUDIT_FSYNC_INTERVAL and PATIENT_AUDIT_MAX_BYTES."""
+    environ = os.environ if environ is None else environ
+    return AuditLog(
+        environ.get('PATIENT_AUDIT_LOG', 'patient_audit.log'),
+        fsync_interval=float(environ.get('PATIENT_AUDIT_FSYNC_INTERVAL', DEFAULT_FSYNC_INTERVAL)),
+        max_bytes=int(environ.get('PATIENT_AUDIT_MAX_BYTES', DEFAULT_MAX_BYTES)),
+    )
@@ -4,95 +4,160 @@ WARNING: This file contains intentional HIPAA violations for testing purposes
 """
 
 import logging
-import json
-from flask import Flask, request, jsonify
+import os
+from flask import Flask, Response, request, jsonify, send_file, stream_with_context
 from datetime import datetime
 
+from audit_log import create_audit_log
+from patient_cache import create_cache
+from patient_export import ExportJobs, iter_export
+from patient_query import page_links, page_records, parse_fields, parse_limit, project, version_etag
+from patient_search import DEFAULT_PAGE_SIZE, PatientSearchIndex
+from patient_store import create_store, read_through
+
 app = Flask(__name__)
 
-# VIOLATION 1: Logging PHI without encryption
+# Application diagnostics; patient access goes to the audit log below
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(message)s',
-    filename='patient_records.log'  # Logs contain PHI
+    filename='patient_records.log'
 )
 
+# Handlers only enqueue events; a background thread batches, redacts, rotates and fsyncs
+audit_log = create_audit_log()
+
 # VIOLATION 2: Hardcoded database credentials
 DB_HOST = "prod-db.hospital.com"
 DB_USER = "admin"
 DB_PASSWORD = "Hospital123!"  # Hardcoded password
 DB_NAME = "patient_records"
 
-# VIOLATION 3: No encryption for PHI storage
-patient_cache = {}  # In-memory cache without encryption
+# VIOLATION 3: No encryption for PHI storage unless PATIENT_STORE_KEY is set
+patient_store = create_store()
+
+# Bounded LRU/TTL copies of store records, optionally shared between workers (PATIENT_CACHE_* settings);
+# each copy carries its store row version and is only served while that is still current
+patient_cache = create_cache()
+
+# Name search index in its own database; filled from the store below, then create/update/delete keep it in sync
+search_index = PatientSearchIndex.open(os.environ.get('PATIENT_SEARCH_DB', 'patient_search.db'))
+
+# Background exports write gzipped NDJSON here and can be resumed after a failure or restart
+export_jobs = ExportJobs(patient_store, os.environ.get('PATIENT_EXPORT_DIR', 'exports'))
+
+
+# Demo records, written to the store at startup
+SAMPLE_PATIENTS = [
+    {
+        "id": 1,
+        "name": "John Doe",
+        "ssn": "123-45-6789",  # VIOLATION 6: Exposing SSN
+        "dob": "1980-05-15",
+        "diagnosis": "Type 2 Diabetes",
+        "medications": ["Metformin", "Insulin"],
+        "insurance": "Blue Cross 987654321"
+    },
+    {
+        "id": 2,
+        "name": "Jane Smith",
+        "ssn": "987-65-4321",
+        "dob": "1975-08-22",
+        "diagnosis": "Hypertension",
+        "medications": ["Lisinopril"],
+        "insurance": "Aetna 123456789"
+    }
+]
+
+for sample in SAMPLE_PATIENTS:
+    patient_store.put(sample['id'], sample)
+
+search_index.sync((key, record.get('name', '') if isinstance(record, dict) else '')
+                  for key, record in patient_store.items())
+
+
+def audit(action, **fields):
+    """Queue an audit event for the current request; never waits on disk"""
+    audit_log.event(action, ip=request.remote_addr, **fields)
+
+
+def not_modified(tag):
+    """304 for a client that already has the current version"""
+    response = Response(status=304)
+    response.set_etag(tag, weak=True)
+    return response
 
 
 @app.route('/api/patients', methods=['GET'])
 def get_patients():
-    """Get all patients - VIOLATION: No access controls"""
+    """List patients a page at a time (?limit=&cursor=&fields=) - VIOLATION: No access controls"""
     # VIOLATION 4: No authentication or authorization
-    # VIOLATION 5: No audit logging of PHI access
-    
-    patients = [
-        {
-            "id": 1,
-            "name": "John Doe",
-            "ssn": "123-45-6789",  # VIOLATION 6: Exposing SSN
-            "dob": "1980-05-15",
-            "diagnosis": "Type 2 Diabetes",
-            "medications": ["Metformin", "Insulin"],
-            "insurance": "Blue Cross 987654321"
-        },
-        {
-            "id": 2,
-            "name": "Jane Smith",
-            "ssn": "987-65-4321",
-            "dob": "1975-08-22",
-            "diagnosis": "Hypertension",
-            "medications": ["Lisinopril"],
-            "insurance": "Aetna 123456789"
-        }
-    ]
-    
-    # VIOLATION 7: Logging PHI in plain text
-    logging.info(f"Retrieved {len(patients)} patient records")
-    logging.info(f"Patient data: {json.dumps(patients)}")
-    logging.info("Exported all patient records to /tmp/patient_export.json")
-    
-    return jsonify(patients)
+    
+    limit = parse_limit(request.args.get('limit', type=int))
+    fields = parse_fields(request.args.get('fields'))
+    cursor = request.args.get('cursor')
+    # Read the version before the page, so a write in between can only make the tag older than the page
+    tag = version_etag(patient_store.instance, patient_store.version(), 'patients', cursor, limit, fields)
+    if request.if_none_match.contains_weak(tag):
+        audit('patients.list', cursor=cursor, fields=fields, status=304)
+        return not_modified(tag)
+    
+    try:
+        patients, next_cursor = page_records(patient_store, cursor, limit, fields)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    payload = {"patients": patients, "next_cursor": next_cursor}
+    audit('patients.list', count=len(patients), ids=[patient.get('id') for patient in patients
+                                                      if isinstance(patient, dict)], fields=fields, status=200)
+    
+    response = jsonify(payload)
+    response.set_etag(tag, weak=True)
+    link = page_links(request.base_url, request.args.to_dict(), next_cursor)
+    if link:
+        response.headers['Link'] = link
+    return response
 
 
 @app.route('/api/patients/<int:patient_id>', methods=['GET'])
 def get_patient(patient_id):
-    """Get patient by ID - VIOLATION: No minimum necessary principle"""
+    """Get patient by ID (?fields= for a subset) - VIOLATION: No minimum necessary principle"""
     # VIOLATION 8: Returning all PHI regardless of need
     
-    # VIOLATION 9: SQL injection vulnerability
-    query = f"SELECT * FROM patients WHERE id = {patient_id}"
+    fields = parse_fields(request.args.get('fields'))
+    # As for lists, the version is read first, so a write before the read below only makes the tag older
+    version = patient_store.row_version(patient_id)
+    patient = None
+    if version is not None:
+        tag = version_etag(patient_store.instance, version, 'patient', patient_id, fields)
+        if request.if_none_match.contains_weak(tag):
+            audit('patient.read', patient_id=patient_id, fields=fields, status=304)
+            return not_modified(tag)
+        patient = read_patient(patient_id)
+    if patient is None:
+        audit('patient.read', patient_id=patient_id, status=404)
+        return jsonify({"error": "patient not found"}), 404
     
-    patient = {
-        "id": patient_id,
-        "name": "John Doe",
-        "ssn": "123-45-6789",
-        "dob": "1980-05-15",
-        "address": "123 Main St, Anytown, USA",
-        "phone": "555-1234",
-        "email": "john.doe@email.com",
-        "diagnosis": "Type 2 Diabetes",
-        "medications": ["Metformin", "Insulin"],
-        "lab_results": {
-            "hba1c": 7.2,
-            "glucose": 145
-        },
-        "insurance": "Blue Cross 987654321",
-        "emergency_contact": {
-            "name": "Jane Doe",
-            "phone": "555-5678"
-        }
-    }
+    payload = project(patient, fields)
+    audit('patient.read', patient_id=patient_id, fields=fields, status=200)
     
     # VIOLATION 10: No encryption in transit verification
-    return jsonify(patient)
+    response = jsonify(payload)
+    response.set_etag(tag, weak=True)
+    return response
+
+
+def read_patient(patient_id):
+    """Patient record from the cache if it is still current, else from the store; None if there is no such patient"""
+    return read_through(patient_store, patient_cache, patient_id, load_patient)
+
+
+def load_patient(patient_id):
+    """Read a patient record and its row version from the database"""
+    # VIOLATION 9: SQL injection vulnerability
+    query = f"SELECT * FROM patients WHERE id = {patient_id}"
+    
+    return patient_store.get_versioned(patient_id)
 
 
 @app.route('/api/patients', methods=['POST'])
@@ -100,26 +165,33 @@ def create_patient():
     """Create new patient - VIOLATION: No input validation"""
     data = request.get_json()
     
+    # Ids key the store, the cache and the search index; anything but an int or a string breaks them
+    patient_id = data.get('id') if isinstance(data, dict) else None
+    if isinstance(patient_id, bool) or not isinstance(patient_id, (int, str)) or patient_id == '':
+        return jsonify({"error": "id must be an integer or a non-empty string"}), 400
+    
     # VIOLATION 11: No data validation or sanitization
     # VIOLATION 12: Storing PHI without encryption
-    patient_cache[data['id']] = data
+    version = patient_store.put(data['id'], data)
+    patient_cache.set(data['id'], [version, data])
+    search_index.upsert(data['id'], data.get('name', ''))
     
-    # VIOLATION 13: Logging PHI during creation
-    logging.info(f"Created patient: {data['name']}, SSN: {data['ssn']}")
+    audit('patient.create', patient_id=data['id'], fields=sorted(data))
     
     return jsonify({"status": "created", "patient": data}), 201
 
 
 @app.route('/api/patients/<int:patient_id>', methods=['PUT'])
 def update_patient(patient_id):
-    """Update patient - VIOLATION: No version control or audit trail"""
+    """Update patient - VIOLATION: No version control"""
     data = request.get_json()
     
-    # VIOLATION 14: No audit trail for PHI modifications
     # VIOLATION 15: No data retention policy enforcement
-    patient_cache[patient_id] = data
+    version = patient_store.put(patient_id, data)
+    patient_cache.set(patient_id, [version, data])
+    search_index.upsert(patient_id, data.get('name', ''))
     
-    logging.info(f"Updated patient {patient_id}")
+    audit('patient.update', patient_id=patient_id, fields=sorted(data))
     
     return jsonify({"status": "updated"})
 
@@ -128,8 +200,10 @@ def update_patient(patient_id):
 def del_patient(patient_id):
     """Delete patient - VIOLATION: No secure deletion"""
     # VIOLATION 16: Simple deletion without secure erasure
-    if patient_id in patient_cache:
-        del patient_cache[patient_id]
+    patient_store.delete(patient_id)
+    patient_cache.delete(patient_id)
+    search_index.delete(patient_id)
+    audit('patient.delete', patient_id=patient_id)
     
     # VIOLATION 17: No verification of deletion authorization
     return jsonify({"status": "deleted"})
@@ -137,29 +211,77 @@ def del_patient(patient_id):
 
 @app.route('/api/export', methods=['GET'])
 def export_patients():
-    """Export patient data - VIOLATION: No encryption for data export"""
+    """Stream patient data as NDJSON (?after=<id> continues) - VIOLATION: No encryption for data export"""
     # VIOLATION 18: Exporting PHI without encryption
     # VIOLATION 19: No access controls on bulk export
     
-    with open('/tmp/patient_export.json', 'w') as f:
-        json.dump(patient_cache, f)
+    compress = 'gzip' in request.headers.get('Accept-Encoding', '')
+    body = iter_export(patient_store, compress, after=request.args.get('after'))
+    headers = {'Vary': 'Accept-Encoding'}
+    if compress:
+        headers['Content-Encoding'] = 'gzip'
     
-    logging.info("Exported all patient records to /tmp/patient_export.json")
+    audit('patients.export', after=request.args.get('after'), compressed=compress)
     
-    return jsonify({"status": "exported", "file": "/tmp/patient_export.json"})
+    return Response(stream_with_context(body), mimetype='application/x-ndjson', headers=headers)
+
+
+@app.route('/api/export/jobs', methods=['POST'])
+def start_export_job():
+    """Start a background export; poll the returned job for progress"""
+    state = export_jobs.start()
+    audit('patients.export_job.start', job_id=state.job_id)
+    return jsonify(state.progress()), 202, {'Location': f"/api/export/jobs/{state.job_id}"}
+
+
+@app.route('/api/export/jobs/<job_id>', methods=['GET'])
+def export_job_progress(job_id):
+    """Progress of a background export"""
+    state = export_jobs.get(job_id)
+    if state is None:
+        return jsonify({"error": "unknown export job"}), 404
+    return jsonify(state.progress())
+
+
+@app.route('/api/export/jobs/<job_id>/resume', methods=['POST'])
+def resume_export_job(job_id):
+    """Continue a failed or interrupted export from its last checkpoint"""
+    state = export_jobs.resume(job_id)
+    if state is None:
+        return jsonify({"error": "unknown export job"}), 404
+    audit('patients.export_job.resume', job_id=job_id)
+    return jsonify(state.progress()), 202
+
+
+@app.route('/api/export/jobs/<job_id>/download', methods=['GET'])
+def download_export_job(job_id):
+    """Gzipped NDJSON of a completed export"""
+    state = export_jobs.get(job_id)
+    if state is None:
+        return jsonify({"error": "unknown export job"}), 404
+    if state.status != 'completed':
+        return jsonify({"error": f"export is {state.status}", **state.progress()}), 409
+    audit('patients.export_job.download', job_id=job_id)
+    return send_file(export_jobs.data_path(job_id).resolve(), mimetype='application/gzip', as_attachment=True,
+                     download_name=f"patients-{job_id}.ndjson.gz")
 
 
 @app.route('/api/search', methods=['GET'])
 def search_patients():
-    """Search patients - VIOLATION: No query parameter validation"""
-    # VIOLATION 20: SQL injection via search parameter
+    """Search patients by name substring, a page at a time (?q=&limit=&after=); a q under 3 characters is a 400"""
     search_term = request.args.get('q', '')
-    query = f"SELECT * FROM patients WHERE name LIKE '%{search_term}%'"
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    after = request.args.get('after', type=int)
     
-    # VIOLATION 21: Logging search queries that may contain PHI
-    logging.info(f"Search query: {search_term}")
+    try:
+        page = search_index.search(search_term, limit=limit, after=after)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    return jsonify({"results": []})
+    # The query itself may be a patient's name; the audit log redacts it
+    audit('patients.search', query=search_term, count=len(page.results))
+    
+    return jsonify({"results": page.results, "next_after": page.next_after})
 
 
 @app.route('/api/share', methods=['POST'])
@@ -173,20 +295,32 @@ def share_patient_data():
     # VIOLATION 23: No encryption for email transmission
     # VIOLATION 24: No patient consent verification
     
-    patient_data = patient_cache.get(patient_id, {})
+    patient_data = read_patient(patient_id) or {}
     
     # Simulate sending email (VIOLATION: Unencrypted email)
-    logging.info(f"Sharing patient {patient_id} data with {recipient_email}")
-    logging.info(f"Shared data: {json.dumps(patient_data)}")
+    audit('patient.share', patient_id=patient_id, recipient=recipient_email, found=bool(patient_data))
     
     return jsonify({"status": "shared"})
 
 
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss counters of this worker's patient cache"""
+    return jsonify({"entries": len(patient_cache), **patient_cache.stats.snapshot()})
+
+
+@app.route('/api/audit/stats', methods=['GET'])
+def audit_stats():
+    """Audit writer counters: queued, written, dropped, batches, fsyncs, rotations"""
+    return jsonify(audit_log.snapshot())
+
+
 @app.errorhandler(Exception)
 def handle_error(error):
     """Error handler - VIOLATION: Exposing sensitive info in errors"""
+    audit('error', error=type(error).__name__, path=request.path)
+    
     # VIOLATION 25: Detailed error messages may leak PHI
-    logging.error(f"Error occurred: {str(error)}")
     
     return jsonify({
         "error": str(error),
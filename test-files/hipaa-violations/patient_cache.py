@@ -0,0 +1,298 @@
+"""
+Bounded patient record cache with LRU and TTL eviction.
+
+Two interchangeable backends behind get/set/delete:
+
+  MemoryCache   per-process OrderedDict, bounded by entry count and bytes
+  SQLiteCache   one SQLite file shared by every worker process on a host
+
+Values are stored as compact JSON bytes, encrypted with Fernet when a key
+is configured (the cryptography package is then required). The shared
+backend puts records on disk, so it refuses to run without a key unless
+told otherwise. Each cache counts its own hits, misses, evictions and
+expirations; for SQLiteCache those are per process.
+
+Neither backend knows whether its copy is still current: a MemoryCache in
+one worker never hears about a write handled by another. Callers store
+the record's patient_store row version next to it and compare that with
+the store on every hit (see patient_api.read_patient).
+
+create_cache() builds the backend from the PATIENT_CACHE_* environment
+variables, e.g. PATIENT_CACHE_URL=sqlite:////var/run/patient-cache.db.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:
+    Fernet = None
+
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_TTL = 300.0  # seconds
+
+Key = Union[int, str]
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    sets: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        stats = asdict(self)
+        lookups = self.hits + self.misses
+        stats['hit_ratio'] = round(self.hits / lookups, 4) if lookups else 0.0
+        return stats
+
+
+class RecordCodec:
+    """Turns records into compact bytes and back, encrypting them when given a Fernet key."""
+
+    def __init__(self, key: Optional[Union[str, bytes]] = None):
+        if key and Fernet is None:
+            raise RuntimeError("Encrypting the patient cache requires the cryptography package")
+        self.fernet = Fernet(key) if key else None
+
+    @property
+    def encrypted(self) -> bool:
+        return self.fernet is not None
+
+    def encode(self, value: Any) -> bytes:
+        data = json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        return self.fernet.encrypt(data) if self.fernet else data
+
+    def decode(self, data: bytes) -> Any:
+        if self.fernet:
+            data = self.fernet.decrypt(data)
+        return json.loads(data)
+
+
+def _key(key: Key) -> str:
+    # Route ids are ints and JSON bodies may carry either, so both map to one entry
+    return str(key)
+
+
+class MemoryCache:
+    """In-process LRU cache; the least recently used entries go first once a bound is reached."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES,
+                 ttl: float = DEFAULT_TTL, codec: Optional[RecordCodec] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.codec = codec or RecordCodec()
+        self.clock = clock
+        self.stats = CacheStats()
+        self.bytes = 0
+        self._entries: 'OrderedDict[str, Tuple[float, bytes]]' = OrderedDict()
+        # Write order; every write gets the same ttl, so this is also expiry order
+        self._expiry: 'OrderedDict[str, float]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._expire()
+            return len(self._entries)
+
+    def get(self, key: Key) -> Optional[Any]:
+        key = _key(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self.clock():
+                self._remove(key)
+                self.stats.expirations += 1
+                entry = None
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+        return self.codec.decode(entry[1])
+
+    def set(self, key: Key, value: Any) -> None:
+        key = _key(key)
+        data = self.codec.encode(value)
+        with self._lock:
+            self._remove(key)
+            self._insert(key, data)
+
+    def _insert(self, key: str, data: bytes) -> None:
+        self.stats.sets += 1
+        if len(data) > self.max_bytes:
+            return
+        expires_at = self.clock() + self.ttl
+        self._entries[key] = (expires_at, data)
+        self._expiry[key] = expires_at
+        self.bytes += len(data)
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats.evictions += 1
+
+    def delete(self, key: Key) -> None:
+        with self._lock:
+            self._remove(_key(key))
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            del self._expiry[key]
+            self.bytes -= len(entry[1])
+
+    def _expire(self) -> None:
+        """Drop expired entries; called with the lock held."""
+        now = self.clock()
+        while self._expiry:
+            key, expires_at = next(iter(self._expiry.items()))
+            if expires_at > now:
+                return
+            self._remove(key)
+            self.stats.expirations += 1
+
+
+class SQLiteCache:
+    """LRU cache in an SQLite file, shared by every process that opens the same path.
+
+    Recency is tracked per entry but only written back once per
+    touch_interval, so hot reads do not turn into a write each. Bounds are
+    enforced every prune_every writes, so the table can briefly run over
+    max_entries by that many rows.
+    """
+
+    def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL,
+                 codec: Optional[RecordCodec] = None, touch_interval: float = 1.0, prune_every: int = 64,
+                 clock: Callable[[], float] = time.time):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.codec = codec or RecordCodec()
+        self.touch_interval = touch_interval
+        self.prune_every = prune_every
+        self.clock = clock  # Wall clock: expiry times are compared across processes
+        self.stats = CacheStats()
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._conn()
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM cache WHERE expires_at > ?", (self.clock(),)).fetchone()[0]
+
+    def get(self, key: Key) -> Optional[Any]:
+        key = _key(key)
+        conn = self._conn()
+        now = self.clock()
+        row = conn.execute("SELECT value, expires_at, accessed_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is not None and row[1] <= now:
+            with conn:
+                conn.execute("DELETE FROM cache WHERE key = ? AND expires_at <= ?", (key, now))
+            self.stats.expirations += 1
+            row = None
+        if row is None:
+            self.stats.misses += 1
+            return None
+        if now - row[2] >= self.touch_interval:
+            with conn:
+                conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        self.stats.hits += 1
+        return self.codec.decode(row[0])
+
+    def set(self, key: Key, value: Any) -> None:
+        data = self.codec.encode(value)
+        now = self.clock()
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at, "
+                "accessed_at = excluded.accessed_at",
+                (_key(key), data, now + self.ttl, now))
+        self.stats.sets += 1
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            self.prune()
+
+    def delete(self, key: Key) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM cache WHERE key = ?", (_key(key),))
+
+    def prune(self) -> None:
+        """Drop expired entries, then the least recently used ones beyond max_entries."""
+        conn = self._conn()
+        self._expire(conn)
+        with conn:
+            excess = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.max_entries
+            if excess > 0:
+                evicted = conn.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed_at LIMIT ?)",
+                    (excess,)).rowcount
+                self.stats.evictions += evicted
+
+    def _expire(self, conn: sqlite3.Connection) -> None:
+        """Delete expired entries."""
+        now = self.clock()
+        # Look before taking the write lock; most calls find nothing to do
+        if conn.execute("SELECT 1 FROM cache WHERE expires_at <= ? LIMIT 1", (now,)).fetchone() is None:
+            return
+        with conn:
+            expired = conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,)).rowcount
+        self.stats.expirations += expired
+
+
+PatientCache = Union[MemoryCache, SQLiteCache]
+
+
+def create_cache(environ: Optional[Dict[str, str]] = None) -> PatientCache:
+    """Cache configured by PATIENT_CACHE_URL (memory, or sqlite:///path), _MAX_ENTRIES, _TTL and _KEY.
+
+    The SQLite backend stores records on disk and needs PATIENT_CACHE_KEY
+    (a Fernet key) unless PATIENT_CACHE_ALLOW_PLAINTEXT=1.
+    """
+    environ = os.environ if environ is None else environ
+    url = environ.get('PATIENT_CACHE_URL', 'memory')
+    max_entries = int(environ.get('PATIENT_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+    ttl = float(environ.get('PATIENT_CACHE_TTL', DEFAULT_TTL))
+    codec = RecordCodec(environ.get('PATIENT_CACHE_KEY'))
+
+    if url == 'memory':
+        max_bytes = int(environ.get('PATIENT_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+        return MemoryCache(max_entries=max_entries, max_bytes=max_bytes, ttl=ttl, codec=codec)
+    if url.startswith('sqlite:///'):
+        if not codec.encrypted and environ.get('PATIENT_CACHE_ALLOW_PLAINTEXT') != '1':
+            raise RuntimeError("The shared patient cache is on disk; set PATIENT_CACHE_KEY to encrypt it")
+        return SQLiteCache(url[len('sqlite:///'):], max_entries=max_entries, ttl=ttl, codec=codec)
+    raise ValueError(f"Unsupported PATIENT_CACHE_URL: {url!r}")
@@ -0,0 +1,193 @@
+"""
+Streaming patient exports: NDJSON generated record by record, gzip-compressed on the fly.
+
+iter_export() feeds a streaming HTTP response directly. Large exports run
+as ExportJob background threads that write <job id>.ndjson.gz into the
+export directory. Every checkpoint_every records the job closes the
+current gzip member and saves its progress (last key, record count, file
+offset) to <job id>.json. A job that failed or was cut short by a restart
+resumes from that point: the file is truncated to the saved offset and
+writing continues with a new gzip member. gunzip reads the concatenated
+members as one stream.
+
+Records are read from the durable store in key order (see
+patient_store.PatientStore.items), never from the evicting cache, so an
+export holds every patient and memory use does not grow with its size.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+import zlib
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+GZIP_WBITS = 31  # zlib container flag for gzip framing
+DEFAULT_LEVEL = 6
+FLUSH_BYTES = 64 * 1024
+DEFAULT_CHECKPOINT_EVERY = 1000
+
+JOB_STATUSES = ('running', 'completed', 'failed', 'interrupted')
+
+
+def _ndjson_line(key: str, record: Any) -> bytes:
+    # A record without an id still needs one to be resumable and joinable
+    if isinstance(record, dict) and 'id' not in record:
+        record = {'id': key, **record}
+    return json.dumps(record, separators=(',', ':'), ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+def iter_ndjson(store, after: Optional[str] = None) -> Iterator[bytes]:
+    """One NDJSON line per stored patient, in key order, starting after the given key."""
+    for key, record in store.items(after=after):
+        yield _ndjson_line(key, record)
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = DEFAULT_LEVEL, flush_bytes: int = FLUSH_BYTES) -> Iterator[bytes]:
+    """Compress a byte stream into one gzip member, emitting output every flush_bytes of input."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+    pending = 0
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        pending += len(chunk)
+        if pending >= flush_bytes:
+            # A sync flush hands the client everything so far without ending the member
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_export(store, compress: bool, after: Optional[str] = None) -> Iterator[bytes]:
+    """Body of a streaming export response."""
+    lines = iter_ndjson(store, after=after)
+    return gzip_chunks(lines) if compress else lines
+
+
+@dataclass
+class ExportJobState:
+    job_id: str
+    status: str = 'running'
+    total: int = 0              # Store size when the job started; the store may change meanwhile
+    exported: int = 0
+    last_key: Optional[str] = None
+    offset: int = 0             # File size at the last checkpoint
+    started_at: float = 0.0
+    updated_at: float = 0.0
+    error: Optional[str] = None
+
+    def progress(self) -> Dict[str, Any]:
+        state = asdict(self)
+        state['percent'] = round(100.0 * self.exported / self.total, 1) if self.total else 100.0
+        return state
+
+
+class ExportJobs:
+    """Runs export jobs in background threads and keeps their state on disk."""
+
+    def __init__(self, store, directory: str, checkpoint_every: int = DEFAULT_CHECKPOINT_EVERY,
+                 level: int = DEFAULT_LEVEL):
+        self.store = store
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.checkpoint_every = checkpoint_every
+        self.level = level
+        self._threads: Dict[str, threading.Thread] = {}
+        self._lock = threading.Lock()
+
+    def data_path(self, job_id: str) -> Path:
+        return self.directory / f"{job_id}.ndjson.gz"
+
+    def _state_path(self, job_id: str) -> Path:
+        return self.directory / f"{job_id}.json"
+
+    def _save(self, state: ExportJobState) -> None:
+        state.updated_at = time.time()
+        path = self._state_path(state.job_id)
+        tmp_path = path.with_name(path.name + '.tmp')
+        tmp_path.write_text(json.dumps(asdict(state)))
+        os.replace(tmp_path, path)
+
+    def get(self, job_id: str) -> Optional[ExportJobState]:
+        """Current state of a job; a 'running' job with no live thread was cut short and is 'interrupted'."""
+        try:
+            uuid.UUID(job_id)  # Job ids become file names
+            data = json.loads(self._state_path(job_id).read_text())
+        except (ValueError, OSError):
+            return None
+        state = ExportJobState(**data)
+        if state.status == 'running' and not self._is_alive(job_id):
+            state.status = 'interrupted'
+        return state
+
+    def _is_alive(self, job_id: str) -> bool:
+        thread = self._threads.get(job_id)
+        return thread is not None and thread.is_alive()
+
+    def start(self) -> ExportJobState:
+        now = time.time()
+        state = ExportJobState(job_id=str(uuid.uuid4()), total=len(self.store), started_at=now)
+        self.data_path(state.job_id).write_bytes(b'')
+        self._save(state)
+        self._launch(state)
+        return state
+
+    def resume(self, job_id: str) -> Optional[ExportJobState]:
+        """Continue a failed or interrupted job from its last checkpoint; None if there is no such job."""
+        with self._lock:
+            state = self.get(job_id)
+            if state is None or state.status in ('running', 'completed'):
+                return state
+            state.status = 'running'
+            state.error = None
+            self._save(state)
+            self._launch(state)
+        return state
+
+    def _launch(self, state: ExportJobState) -> None:
+        thread = threading.Thread(target=self._run, args=(state,), name=f"export-{state.job_id[:8]}", daemon=True)
+        self._threads[state.job_id] = thread
+        thread.start()
+
+    def _run(self, state: ExportJobState) -> None:
+        try:
+            with open(self.data_path(state.job_id), 'r+b') as f:
+                # Drop anything written after the last checkpoint
+                f.truncate(state.offset)
+                f.seek(state.offset)
+                compressor = zlib.compressobj(self.level, zlib.DEFLATED, GZIP_WBITS)
+                in_member = 0
+                for key, record in self.store.items(after=state.last_key):
+                    f.write(compressor.compress(_ndjson_line(key, record)))
+                    state.last_key = key
+                    in_member += 1
+                    if in_member >= self.checkpoint_every:
+                        self._checkpoint(f, compressor, state, in_member)
+                        compressor = zlib.compressobj(self.level, zlib.DEFLATED, GZIP_WBITS)
+                        in_member = 0
+                self._checkpoint(f, compressor, state, in_member)
+            state.status = 'completed'
+        except Exception as e:
+            logger.error(f"Export job {state.job_id} failed: {e}")
+            # Progress stays at the last checkpoint, which is where a resume starts
+            saved = self.get(state.job_id)
+            state = saved or state
+            state.status = 'failed'
+            state.error = str(e)
+        self._save(state)
+
+    def _checkpoint(self, f, compressor, state: ExportJobState, records: int) -> None:
+        """End the current gzip member and persist the position after it."""
+        f.write(compressor.flush())
+        f.flush()
+        os.fsync(f.fileno())
+        state.exported += records
+        state.offset = f.tell()
+        self._save(state)
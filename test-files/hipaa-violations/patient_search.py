@@ -0,0 +1,163 @@
+"""
+Patient name search backed by an SQLite FTS5 trigram index.
+
+The index is an external-content FTS5 table over the patients table, kept
+in sync by triggers on INSERT, UPDATE and DELETE, so every write path
+updates it and nothing can forget to. A trigram index answers substring
+matches ("%term%") without scanning the table; results come back in
+rowid order and are paginated by rowid (keyset), so a page costs the
+same however deep it is and however many rows the table holds.
+
+FTS5 needs an integer rowid, but patient ids may be strings. The
+standalone index (open()) therefore keeps the id as text in its own column
+next to an integer rowid; results turn integer ids back into ints, as the
+rest of the API returns them. It lives in its own database, so sync()
+fills it from the patient store at startup.
+
+Terms shorter than MIN_TERM_LENGTH (including an empty one) are rejected
+with ValueError rather than answered by a table scan.
+"""
+
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+MIN_TERM_LENGTH = 3  # Trigrams need at least three characters
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+@dataclass
+class SearchPage:
+    """One page of matches; pass next_after back as after= for the next page."""
+
+    results: List[Dict[str, Any]] = field(default_factory=list)
+    next_after: Optional[int] = None  # A rowid, not a patient id
+
+
+def _match_expression(term: str) -> str:
+    """Quote a search term as a single FTS5 phrase, so operators in it are matched literally."""
+    term = term.strip()
+    if len(term) < MIN_TERM_LENGTH:
+        raise ValueError(f"Search term must be at least {MIN_TERM_LENGTH} characters")
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _patient_id(value: Any) -> Any:
+    """An id read back from a text column: an int if it was one, else unchanged."""
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return value
+    return number if str(number) == value else value
+
+
+class PatientSearchIndex:
+    """FTS5 trigram index over one text column of a patients table.
+
+    key is the table's INTEGER PRIMARY KEY, used as the FTS rowid. ref is
+    the column holding the patient id that upsert/delete take and results
+    return; it defaults to key, and must be UNIQUE when it is another column.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, table: str = 'patients', column: str = 'name',
+                 key: str = 'id', ref: Optional[str] = None):
+        ref = ref or key
+        for name in (table, column, key, ref):
+            if not name.isidentifier():
+                raise ValueError(f"Invalid identifier: {name!r}")
+        self.conn = conn
+        self.table = table
+        self.column = column
+        self.key = key
+        self.ref = ref
+        self.fts = f"{table}_fts"
+        self.lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path: str) -> 'PatientSearchIndex':
+        """Standalone index database holding its own id/name table, for callers without one."""
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS patient_names ("
+                     "doc INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, name TEXT NOT NULL DEFAULT '')")
+        index = cls(conn, table='patient_names', key='doc', ref='id')
+        index.install()
+        return index
+
+    def install(self) -> None:
+        """Create the FTS table and sync triggers if missing; a new index is filled from the table once."""
+        table, column, key, fts = self.table, self.column, self.key, self.fts
+        with self.lock, self.conn:
+            exists = self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (fts,)).fetchone()
+            self.conn.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                f"{column}, content='{table}', content_rowid='{key}', tokenize='trigram')")
+            self.conn.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN "
+                f"INSERT INTO {fts} (rowid, {column}) VALUES (new.{key}, new.{column}); END")
+            self.conn.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN "
+                f"INSERT INTO {fts} ({fts}, rowid, {column}) VALUES ('delete', old.{key}, old.{column}); END")
+            self.conn.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE ON {table} BEGIN "
+                f"INSERT INTO {fts} ({fts}, rowid, {column}) VALUES ('delete', old.{key}, old.{column}); "
+                f"INSERT INTO {fts} (rowid, {column}) VALUES (new.{key}, new.{column}); END")
+            if not exists:
+                self.conn.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+
+    def upsert(self, patient_id: Union[int, str], name: str) -> None:
+        """Add or rename a patient; the update trigger re-indexes an existing row."""
+        with self.lock, self.conn:
+            self.conn.execute(
+                f"INSERT INTO {self.table} ({self.ref}, {self.column}) VALUES (?, ?) "
+                f"ON CONFLICT ({self.ref}) DO UPDATE SET {self.column} = excluded.{self.column}",
+                (patient_id, name or ''))
+
+    def delete(self, patient_id: Union[int, str]) -> None:
+        with self.lock, self.conn:
+            self.conn.execute(f"DELETE FROM {self.table} WHERE {self.ref} = ?", (patient_id,))
+
+    def sync(self, patients: Iterable[Tuple[Union[int, str], str]]) -> None:
+        """Make the index hold exactly these (patient id, name) pairs, in one transaction.
+
+        Unchanged rows are left alone, so they keep their rowid (and any
+        after= a client holds) and are not re-indexed.
+        """
+        table, ref, column = self.table, self.ref, self.column
+        seen = set()
+        with self.lock, self.conn:
+            for patient_id, name in patients:
+                seen.add(str(patient_id))
+                self.conn.execute(
+                    f"INSERT INTO {table} ({ref}, {column}) VALUES (?, ?) "
+                    f"ON CONFLICT ({ref}) DO UPDATE SET {column} = excluded.{column} "
+                    f"WHERE {column} IS NOT excluded.{column}",
+                    (patient_id, name or ''))
+            stale = [(row[0],) for row in self.conn.execute(f"SELECT {ref} FROM {table}")
+                     if str(row[0]) not in seen]
+            self.conn.executemany(f"DELETE FROM {table} WHERE {ref} = ?", stale)
+
+    def search(self, term: str, limit: int = DEFAULT_PAGE_SIZE, after: Optional[int] = None) -> SearchPage:
+        """Patients whose name contains term (case-insensitive), in rowid order, after the given rowid.
+
+        Raises ValueError for terms shorter than MIN_TERM_LENGTH.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        after_clause = f" AND {self.fts}.rowid > ?" if after is not None else ''
+        params: List[Any] = [_match_expression(term)]
+        if after is not None:
+            params.append(int(after))
+        params.append(limit + 1)  # One extra row tells whether there is a next page
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT {self.fts}.rowid, {self.table}.{self.ref}, {self.table}.{self.column} FROM {self.fts} "
+                f"JOIN {self.table} ON {self.table}.{self.key} = {self.fts}.rowid "
+                f"WHERE {self.fts} MATCH ?{after_clause} ORDER BY {self.fts}.rowid LIMIT ?",
+                params).fetchall()
+        page = SearchPage(results=[{'id': _patient_id(row[1]), self.column: row[2]} for row in rows[:limit]])
+        if len(rows) > limit:
+            page.next_after = rows[limit - 1][0]
+        return page
@@ -0,0 +1,148 @@
+"""
+Durable patient record store behind the patient cache.
+
+Records live in one SQLite table keyed by patient id and stay there until
+deleted; patient_cache only holds copies, so an entry it evicts or expires
+is read back from here on the next miss. Lists and exports walk this table
+in key order rather than the cache, so they always see every patient.
+
+Values go through the same RecordCodec as the cache: compact JSON bytes,
+Fernet-encrypted when PATIENT_STORE_KEY is set.
+
+Every put() and successful delete() bumps one store-wide generation, and a
+written row keeps the generation of its last write as its version. The
+generation restarts with a new store file, so instance (random, fixed when
+the file is created) tells two files apart. Cache
+entries carry that version, so read_through() can tell a copy another
+worker has since overwritten or deleted from a current one.
+"""
+
+import os
+import sqlite3
+import threading
+import uuid
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from patient_cache import Key, PatientCache, RecordCodec
+
+ITEMS_BATCH = 500
+
+Versioned = Tuple[int, Any]
+
+
+class PatientStore:
+    """Patient records in an SQLite file; one connection per thread, safe to share between processes."""
+
+    def __init__(self, path: str, codec: Optional[RecordCodec] = None):
+        self.path = path
+        self.codec = codec or RecordCodec()
+        self._local = threading.local()
+        conn = self._conn()
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS patients "
+                         "(key TEXT PRIMARY KEY, value BLOB NOT NULL, version INTEGER NOT NULL DEFAULT 0)")
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(patients)")}
+            if 'version' not in columns:  # Store files written before rows were versioned
+                conn.execute("ALTER TABLE patients ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            conn.execute("CREATE TABLE IF NOT EXISTS store_version "
+                         "(id INTEGER PRIMARY KEY CHECK (id = 0), instance TEXT NOT NULL, generation INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO store_version VALUES (0, ?, 0)", (uuid.uuid4().hex[:12],))
+        self.instance = conn.execute("SELECT instance FROM store_version WHERE id = 0").fetchone()[0]
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM patients").fetchone()[0]
+
+    def get(self, key: Key) -> Optional[Any]:
+        row = self._conn().execute("SELECT value FROM patients WHERE key = ?", (str(key),)).fetchone()
+        return self.codec.decode(row[0]) if row is not None else None
+
+    def get_versioned(self, key: Key) -> Optional[Versioned]:
+        """(row version, record), or None if there is no such record."""
+        row = self._conn().execute("SELECT version, value FROM patients WHERE key = ?", (str(key),)).fetchone()
+        return (row[0], self.codec.decode(row[1])) if row is not None else None
+
+    def row_version(self, key: Key) -> Optional[int]:
+        """Version of the record's last write, or None if there is no such record."""
+        row = self._conn().execute("SELECT version FROM patients WHERE key = ?", (str(key),)).fetchone()
+        return row[0] if row is not None else None
+
+    def version(self) -> int:
+        """Store-wide generation; changes whenever any record is written or deleted."""
+        return self._conn().execute("SELECT generation FROM store_version WHERE id = 0").fetchone()[0]
+
+    def put(self, key: Key, value: Any) -> int:
+        """Write a record; returns its new row version."""
+        data = self.codec.encode(value)
+        conn = self._conn()
+        with conn:
+            version = self._bump(conn)
+            conn.execute("INSERT INTO patients (key, value, version) VALUES (?, ?, ?) "
+                         "ON CONFLICT (key) DO UPDATE SET value = excluded.value, version = excluded.version",
+                         (str(key), data, version))
+        return version
+
+    def delete(self, key: Key) -> bool:
+        conn = self._conn()
+        with conn:
+            deleted = conn.execute("DELETE FROM patients WHERE key = ?", (str(key),)).rowcount > 0
+            if deleted:
+                self._bump(conn)
+        return deleted
+
+    @staticmethod
+    def _bump(conn: sqlite3.Connection) -> int:
+        """Advance the store generation inside the caller's transaction and return it."""
+        conn.execute("UPDATE store_version SET generation = generation + 1 WHERE id = 0")
+        return conn.execute("SELECT generation FROM store_version WHERE id = 0").fetchone()[0]
+
+    def items(self, after: Optional[str] = None) -> Iterator[Tuple[str, Any]]:
+        """Every record in key order, starting after the given key."""
+        conn = self._conn()
+        while True:
+            rows = conn.execute("SELECT key, value FROM patients WHERE key > ? ORDER BY key LIMIT ?",
+                                (after if after is not None else '', ITEMS_BATCH)).fetchall()
+            for key, data in rows:
+                yield key, self.codec.decode(data)
+            if len(rows) < ITEMS_BATCH:
+                return
+            after = rows[-1][0]
+
+
+def read_through(store: PatientStore, cache: PatientCache, key: Key,
+                 load: Optional[Callable[[Key], Optional[Versioned]]] = None) -> Optional[Any]:
+    """Record for key, served from the cache only while its copy has the store's current row version.
+
+    Cache entries are [version, record] pairs. Checking the version on every
+    hit costs one indexed lookup but means a worker never serves a record
+    that another worker has since updated or deleted.
+    """
+    version = store.row_version(key)
+    if version is None:
+        cache.delete(key)
+        return None
+    cached = cache.get(key)
+    if isinstance(cached, list) and len(cached) == 2 and cached[0] == version:
+        return cached[1]
+    found = (load or store.get_versioned)(key)
+    if found is None:
+        cache.delete(key)
+        return None
+    version, record = found
+    cache.set(key, [version, record])
+    return record
+
+
+def create_store(environ: Optional[Dict[str, str]] = None) -> PatientStore:
+    """Store configured by PATIENT_STORE_PATH and PATIENT_STORE_KEY (a Fernet key, optional)."""
+    environ = os.environ if environ is None else environ
+    return PatientStore(environ.get('PATIENT_STORE_PATH', 'patient_store.db'),
+                        codec=RecordCodec(environ.get('PATIENT_STORE_KEY')))
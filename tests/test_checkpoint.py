@@ -0,0 +1,23 @@
+from checkpoint import Checkpoint
+
+
+def test_uploads_before_the_first_save_survive_a_crash(tmp_path):
+    path = tmp_path / 'things.checkpoint.json'
+    checkpoint = Checkpoint(path, 'things.json', run_id=3, interval=3600)
+    checkpoint.begin_entity('a', ['things/a.txt'], [])
+    checkpoint.mark_uploaded('things/a.txt')
+    # Crash: no save() after the upload, no complete()
+    checkpoint._uploaded_log.flush()
+    checkpoint.close()
+
+    state = Checkpoint.load(path)
+    assert state is not None
+    assert state.source_path == 'things.json'
+    assert state.run_id == 3
+    assert state.last_entity_key is None
+    assert state.uploaded == {'things/a.txt'}
+
+    resumed = Checkpoint(path, 'things.json', run_id=state.run_id, resume=state)
+    assert resumed.is_uploaded('things/a.txt')
+    resumed.complete()
+    assert Checkpoint.load(path) is None
@@ -0,0 +1,32 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from chunk_dedup import ChunkDeduplicator
+
+ROOT = Path(__file__).resolve().parent.parent
+TEXT = "The museum reopens on Saturday with a new wing devoted to regional textile history and local crafts."
+
+SIGNATURE_SCRIPT = f"""
+import json
+from chunk_dedup import ChunkDeduplicator
+with ChunkDeduplicator(mode='near') as dedup:
+    print(json.dumps(dedup.signature({TEXT!r})))
+"""
+
+
+def signature_with_hash_seed(seed: str):
+    env = dict(os.environ, PYTHONHASHSEED=seed)
+    output = subprocess.run([sys.executable, '-c', SIGNATURE_SCRIPT], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output)
+
+
+def test_signature_does_not_depend_on_hash_seed():
+    with ChunkDeduplicator(mode='near') as dedup:
+        expected = dedup.signature(TEXT)
+    assert expected is not None
+    assert signature_with_hash_seed('1') == expected
+    assert signature_with_hash_seed('2') == expected
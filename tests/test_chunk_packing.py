@@ -0,0 +1,51 @@
+import re
+
+import pytest
+
+from chunk_dedup import ChunkDeduplicator
+from chunk_packing import ChunkPacker
+from parallel_build import DocumentRecord
+
+PARAGRAPH = ' '.join(f"Sentence {i} talks about alpha beta gamma delta, item {i}." for i in range(60))
+
+
+def pack(body, **options):
+    packer = ChunkPacker(target=200, separator='\n\n', **options)
+    return [record.body for record in packer.pack([DocumentRecord('things/a.txt', body, {'metadataAttributes': {}},
+                                                                   'a')])]
+
+
+def assert_round_trips(text, pieces):
+    """Every piece is a slice of the text, in order, and only whitespace was dropped between them."""
+    position = 0
+    for piece in pieces:
+        start = text.index(piece, position)
+        assert re.fullmatch(r'\s*', text[position:start])
+        position = start + len(piece)
+    assert re.fullmatch(r'\s*', text[position:])
+
+
+@pytest.mark.parametrize('body', [
+    PARAGRAPH,
+    PARAGRAPH.replace('. ', '.\n'),
+    'word ' * 300,
+    'x' * 1000,
+    f"{PARAGRAPH}\n\nshort paragraph\n\n{PARAGRAPH}",
+])
+def test_split_keeps_the_original_text(body):
+    pieces = pack(body)
+    assert len(pieces) > 1
+    assert_round_trips(body, pieces)
+    assert all(len(piece.encode('utf-8')) <= 200 for piece in pieces)
+    # A paragraph is never turned into one sentence or word per paragraph
+    assert not any('\n\n' in piece for piece in pack(PARAGRAPH))
+
+
+def test_split_pieces_survive_dedup():
+    # Words repeat across the text, pieces do not
+    body = ' '.join(f"alpha beta gamma {i}" for i in range(100))
+    pieces = pack(body)
+    deduplicator = ChunkDeduplicator('exact')
+    kept = [deduplicator.filter_record(DocumentRecord(f"k{i}", piece, {}, f"d{i}"), '\n\n')
+            for i, piece in enumerate(pieces)]
+    assert all(record is not None and record.body == piece for record, piece in zip(kept, pieces))
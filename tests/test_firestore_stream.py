@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+import firestore_stream
+from firestore_stream import WRAPPER_LOOKAHEAD, iter_firestore_entities, iter_firestore_spans, read_entity
+
+
+def entities(count):
+    return {f"key{i:03d}": {'name': f"entité {i}", 'values': list(range(i % 5))} for i in range(count)}
+
+
+@pytest.mark.parametrize('count', [0, 1, WRAPPER_LOOKAHEAD - 1, WRAPPER_LOOKAHEAD, 3 * WRAPPER_LOOKAHEAD])
+@pytest.mark.parametrize('wrapped', [False, True])
+def test_both_forms_in_one_read(tmp_path, monkeypatch, count, wrapped):
+    expected = entities(count)
+    document = {'meta': {'synthetic': True}, 'data': expected, 'tail': [1, 2]} if wrapped else expected
+    path = tmp_path / 'export.json'
+    path.write_text(json.dumps(document, ensure_ascii=False), encoding='utf-8')
+
+    reads = []
+
+    def counting_open(*args, **kwargs):
+        reads.append(args[0])
+        return open(*args, **kwargs)
+
+    monkeypatch.setattr(firestore_stream, 'open', counting_open, raising=False)
+    assert dict(iter_firestore_entities(str(path), chunk_size=7)) == expected
+    assert len(reads) == 1
+    monkeypatch.undo()
+
+    with open(path, 'rb') as f:
+        spans = {key: read_entity(f, offset, length)
+                 for key, offset, length in iter_firestore_spans(str(path), chunk_size=7)}
+    assert spans == expected
+
+
+def test_resume_skips_up_to_the_key(tmp_path):
+    path = tmp_path / 'export.json'
+    path.write_text(json.dumps(entities(40)), encoding='utf-8')
+    keys = [key for key, _ in iter_firestore_entities(str(path), chunk_size=16, start_after='key020')]
+    assert keys == [f"key{i:03d}" for i in range(21, 40)]
@@ -0,0 +1,110 @@
+from typing import Any, Dict, List
+
+import pytest
+
+from checkpoint import Checkpoint
+from ingest_manifest import IngestManifest
+from ingestion_pipeline import BuildStage, LocalSink, Pipeline, S3Sink, StageStats, Transform, parse_args
+from local_s3 import LocalS3Client
+from parallel_build import DocumentRecord
+from s3_uploader import S3Uploader
+
+BUCKET = 'test-bucket'
+FAILING = set()
+FAILING_WRITES = set()
+
+
+def build_entity(entity_key: str, entity: Dict[str, Any]) -> List[DocumentRecord]:
+    if entity_key in FAILING:
+        raise RuntimeError("transient transform error")
+    return [DocumentRecord(f"things/{entity_key}.txt", entity['text'], {'metadataAttributes': {}}, entity_key)]
+
+
+class ListSource:
+    partial = False
+
+    def __init__(self, entities):
+        self.entities = entities
+        self.stats = StageStats('source')
+
+    def __iter__(self):
+        return iter(self.entities)
+
+
+class FailingLocalSink(LocalSink):
+    def _write_files(self, path, body, metadata):
+        if path.name.split('.')[0] in FAILING_WRITES:
+            raise OSError("disk full")
+        super()._write_files(path, body, metadata)
+
+
+def run(tmp_path, s3_client, entities, checkpoint=False):
+    transform = Transform('things', 'Thing', 'things.json', build_entity)
+    with IngestManifest(tmp_path / 'manifest.sqlite') as manifest:
+        tracker = Checkpoint(tmp_path / 'things.checkpoint.json', 'things.json', manifest.run_id) if checkpoint else None
+        uploader = S3Uploader(s3_client, BUCKET, concurrency=2, on_uploaded=tracker.mark_uploaded if tracker else None)
+        pipeline = Pipeline(
+            transform,
+            source=ListSource(entities),
+            build=BuildStage(transform),
+            local_sink=FailingLocalSink(tmp_path / 'out'),
+            s3_sink=S3Sink(uploader, s3_client),
+            manifest=manifest,
+            checkpoint=tracker,
+        )
+        return pipeline.run()
+
+
+def test_failing_entity_keeps_its_published_documents(tmp_path):
+    s3_client = LocalS3Client(tmp_path / 's3')
+    entities = [('a', {'text': 'first thing'}), ('b', {'text': 'second thing'})]
+    run(tmp_path, s3_client, entities)
+    objects = tmp_path / 's3' / BUCKET / 'things'
+    assert (objects / 'b.txt').exists()
+
+    FAILING.add('b')
+    try:
+        result = run(tmp_path, s3_client, entities)
+    finally:
+        FAILING.clear()
+    assert result.skipped == 1
+    assert result.deleted == 0
+    assert (objects / 'b.txt').read_text() == 'second thing'
+    assert (objects / 'b.txt.metadata.json').exists()
+
+    # Once the entity is really gone from the export, its documents are removed
+    result = run(tmp_path, s3_client, entities[:1])
+    assert result.deleted == 1
+    assert not (objects / 'b.txt').exists()
+
+
+@pytest.mark.parametrize('checkpoint', [False, True])
+def test_failing_write_keeps_published_documents(tmp_path, checkpoint):
+    s3_client = LocalS3Client(tmp_path / 's3')
+    run(tmp_path, s3_client, [('a', {'text': 'first thing'}), ('b', {'text': 'second thing'})], checkpoint)
+    objects = tmp_path / 's3' / BUCKET / 'things'
+
+    # b changed, but cannot be written this run
+    entities = [('a', {'text': 'first thing'}), ('b', {'text': 'second thing, revised'})]
+    FAILING_WRITES.add('b')
+    try:
+        result = run(tmp_path, s3_client, entities, checkpoint)
+    finally:
+        FAILING_WRITES.clear()
+    assert result.skipped == 1
+    assert result.deleted == 0
+    assert (objects / 'b.txt').read_text() == 'second thing'
+
+    # The failed write is not mistaken for an upload: the next run writes it
+    result = run(tmp_path, s3_client, entities, checkpoint)
+    assert result.deleted == 0
+    assert (objects / 'b.txt').read_text() == 'second thing, revised'
+
+
+def test_async_io_rejects_multipart_options(capsys):
+    transform = Transform('things', 'Thing', 'things.json', build_entity)
+    assert parse_args(transform, ['--async-io']).async_io
+    assert parse_args(transform, ['--multipart-threshold-mb', '64']).multipart_threshold_mb == 64
+    with pytest.raises(SystemExit):
+        parse_args(transform, ['--async-io', '--multipart-threshold-mb', '64', '--part-concurrency', '2'])
+    assert "cannot be combined with --multipart-threshold-mb, --part-concurrency" in capsys.readouterr().err
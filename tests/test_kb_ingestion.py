@@ -0,0 +1,116 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from kb_ingestion import IngestionTrigger
+
+
+class ClientError(Exception):
+    """Just enough of botocore's ClientError for error_code()."""
+
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {'Error': {'Code': code}}
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class StubBedrockAgent:
+    """bedrock-agent stub: start_ingestion_job fails with start_errors first, then the job
+    reports the given statuses on successive get_ingestion_job calls (the last one repeats)."""
+
+    def __init__(self, clock, statuses, start_errors=(), latest=None):
+        self.clock = clock
+        self.statuses = list(statuses)
+        self.start_errors = list(start_errors)
+        self.latest = latest
+        self.started = 0
+
+    def _job(self, status):
+        started = datetime.fromtimestamp(self.clock(), tz=timezone.utc)
+        return {'ingestionJobId': 'job-1', 'status': status, 'startedAt': started, 'updatedAt': started,
+                'statistics': {'numberOfDocumentsScanned': 10, 'numberOfNewDocumentsIndexed': 8,
+                               'numberOfDocumentsFailed': 2 if status == 'FAILED' else 0},
+                'failureReasons': ['Document too large'] if status == 'FAILED' else []}
+
+    def list_ingestion_jobs(self, **kwargs):
+        return {'ingestionJobSummaries': [self.latest] if self.latest else []}
+
+    def start_ingestion_job(self, **kwargs):
+        if self.start_errors:
+            raise ClientError(self.start_errors.pop(0))
+        self.started += 1
+        return {'ingestionJob': self._job('STARTING')}
+
+    def get_ingestion_job(self, **kwargs):
+        status = self.statuses.pop(0) if len(self.statuses) > 1 else self.statuses[0]
+        return {'ingestionJob': self._job(status)}
+
+
+def make_trigger(client, clock, timeout=3600.0):
+    return IngestionTrigger(client, settle=0, poll_interval=5, max_poll_interval=20, timeout=timeout,
+                            sleep=clock.sleep, clock=clock)
+
+
+def test_job_reaching_complete():
+    clock = FakeClock()
+    client = StubBedrockAgent(clock, ['IN_PROGRESS', 'IN_PROGRESS', 'IN_PROGRESS', 'COMPLETE'])
+
+    stats = make_trigger(client, clock).sync()
+
+    assert client.started == 1
+    assert (stats.job_id, stats.status, stats.joined) == ('job-1', 'COMPLETE', False)
+    assert (stats.scanned, stats.indexed, stats.failed) == (10, 8, 0)
+    assert clock.sleeps == [5, 10, 20]
+    assert stats.waited == 35
+
+
+def test_job_reaching_failed():
+    clock = FakeClock()
+    client = StubBedrockAgent(clock, ['IN_PROGRESS', 'FAILED'])
+
+    stats = make_trigger(client, clock).sync()
+
+    assert stats.status == 'FAILED'
+    assert stats.failed == 2
+    assert stats.failure_reasons == ['Document too large']
+
+
+def test_job_that_never_finishes_times_out():
+    clock = FakeClock()
+    client = StubBedrockAgent(clock, ['IN_PROGRESS'])
+
+    with pytest.raises(TimeoutError, match='job-1 still IN_PROGRESS'):
+        make_trigger(client, clock, timeout=60).sync()
+    assert sum(clock.sleeps) <= 60
+
+
+def test_conflict_on_start_is_retried():
+    clock = FakeClock()
+    client = StubBedrockAgent(clock, ['COMPLETE'], start_errors=['ConflictException', 'ConflictException'])
+
+    stats = make_trigger(client, clock).sync()
+
+    assert client.started == 1
+    assert stats.status == 'COMPLETE'
+    assert clock.sleeps == [5, 10]
+
+
+def test_other_start_errors_are_raised():
+    clock = FakeClock()
+    client = StubBedrockAgent(clock, ['COMPLETE'], start_errors=['AccessDeniedException'])
+
+    with pytest.raises(ClientError):
+        make_trigger(client, clock).sync()
+    assert client.started == 0
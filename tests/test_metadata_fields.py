@@ -0,0 +1,58 @@
+import pytest
+
+from metadata_fields import Field, compile_metadata
+
+
+def test_rules_and_keyword_arguments():
+    extract = compile_metadata([
+        Field('id', param='item_id', coerce=str),
+        Field('city', 'address.city', default='unknown'),
+        Field('name', ('title', 'name'), default='missing', empty='blank'),
+        Field('tags', 'tags', default=['general'], as_list=True, limit=2),
+        Field('lat', 'coordinates.latitude', default=0.0, coerce=float),
+    ], params=('item_id',), name='extract_item', entity='item')
+
+    item = {'address': 'not a dict', 'name': '', 'tags': ['a', 'b', 'c'], 'coordinates': {'latitude': 'x'}}
+    expected = {'metadataAttributes': {'id': '7', 'city': 'unknown', 'name': 'blank', 'tags': ['a', 'b'],
+                                       'lat': 0.0}}
+    assert extract(item, 7) == expected
+    assert extract(item_id=7, item=item) == expected
+    assert extract({}, 7)['metadataAttributes']['name'] == 'missing'
+    # Mutable defaults are never shared between outputs
+    first = extract({}, 1)['metadataAttributes']['tags']
+    first.append('changed')
+    assert extract({}, 1)['metadataAttributes']['tags'] == ['general']
+    with pytest.raises(TypeError):
+        extract({}, 1, unknown=2)
+
+
+@pytest.mark.parametrize('name', ['bad name', 'import os; x', 'class', ''])
+def test_invalid_names_are_rejected(name):
+    with pytest.raises(ValueError):
+        compile_metadata([Field('a', 'a')], name=name)
+    with pytest.raises(ValueError):
+        compile_metadata([Field('a', 'a')], params=(name,))
+
+
+@pytest.mark.parametrize('name', ['w', 'v0', 'p12', '_private', 'None'])
+def test_names_of_generated_locals_are_rejected(name):
+    with pytest.raises(ValueError):
+        compile_metadata([Field('a', 'a')], params=(name,))
+
+
+def test_spec_values_never_become_code():
+    hostile = "x'}; import os; os._exit(1) #"
+    extract = compile_metadata([
+        Field(hostile, hostile.replace('.', ''), default=hostile),
+        Field('opened', 'opened', default=open),
+    ])
+    assert extract({}) == {'metadataAttributes': {hostile: hostile, 'opened': open}}
+
+    class Sneaky(str):
+        def __repr__(self):
+            return "__import__('os')"
+
+    with pytest.raises(ValueError):
+        Field(Sneaky('a'), 'a')
+    with pytest.raises(ValueError):
+        Field('a', Sneaky('a'))
@@ -0,0 +1,51 @@
+import gzip
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'test-files' / 'hipaa-violations'))
+
+from patient_cache import MemoryCache  # noqa: E402
+from patient_export import ExportJobs, iter_export  # noqa: E402
+from patient_store import PatientStore  # noqa: E402
+
+
+def make_store_and_cache(tmp_path, clock):
+    store = PatientStore(str(tmp_path / 'patients.db'))
+    cache = MemoryCache(ttl=60, max_entries=2, clock=clock)
+    for patient_id in range(1, 6):
+        record = {'id': patient_id, 'name': f"Patient {patient_id}"}
+        store.put(patient_id, record)
+        cache.set(patient_id, record)
+    return store, cache
+
+
+def exported_ids(data: bytes):
+    return sorted(json.loads(line)['id'] for line in gzip.decompress(data).splitlines())
+
+
+def test_export_includes_records_older_than_ttl(tmp_path):
+    now = [0.0]
+    store, cache = make_store_and_cache(tmp_path, lambda: now[0])
+    now[0] = 3600.0
+    assert len(cache) == 0
+
+    assert exported_ids(b''.join(iter_export(store, compress=True))) == [1, 2, 3, 4, 5]
+
+
+def test_export_job_includes_records_older_than_ttl(tmp_path):
+    now = [0.0]
+    store, cache = make_store_and_cache(tmp_path, lambda: now[0])
+    now[0] = 3600.0
+
+    jobs = ExportJobs(store, str(tmp_path / 'exports'), checkpoint_every=2)
+    state = jobs.start()
+    deadline = time.monotonic() + 10
+    while jobs.get(state.job_id).status == 'running' and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    state = jobs.get(state.job_id)
+    assert state.status == 'completed'
+    assert state.exported == 5
+    assert exported_ids(jobs.data_path(state.job_id).read_bytes()) == [1, 2, 3, 4, 5]
@@ -0,0 +1,48 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'test-files' / 'hipaa-violations'))
+
+from patient_search import PatientSearchIndex  # noqa: E402
+from patient_store import PatientStore  # noqa: E402
+
+
+def test_results_return_integer_ids_as_ints():
+    index = PatientSearchIndex.open(':memory:')
+    index.upsert(1, 'John Doe')
+    index.upsert('p-7', 'Johnny Walker')
+    index.upsert('007', 'Jo Johnson')
+
+    results = index.search('john').results
+    assert [result['id'] for result in results] == [1, 'p-7', '007']
+
+
+@pytest.mark.parametrize('term', ['', 'jo', '  jo  '])
+def test_short_terms_are_rejected(term):
+    index = PatientSearchIndex.open(':memory:')
+    index.upsert(1, 'John Doe')
+    with pytest.raises(ValueError):
+        index.search(term)
+
+
+def test_sync_backfills_from_the_store(tmp_path):
+    store = PatientStore(str(tmp_path / 'patients.db'))
+    store.put(1, {'id': 1, 'name': 'John Doe'})
+    store.put(2, {'id': 2, 'name': 'Jane Smith'})
+    index = PatientSearchIndex.open(str(tmp_path / 'search.db'))
+    index.upsert(3, 'John Gone')  # Deleted from the store while the index was not looking
+    index.upsert(1, 'Johnny Renamed')
+
+    def sync():
+        index.sync((key, record['name']) for key, record in store.items())
+
+    sync()
+    assert index.search('john').results == [{'id': 1, 'name': 'John Doe'}]
+    assert index.search('smith').results == [{'id': 2, 'name': 'Jane Smith'}]
+
+    doc = index.conn.execute("SELECT doc FROM patient_names WHERE id = '1'").fetchone()
+    sync()
+    assert index.conn.execute("SELECT doc FROM patient_names WHERE id = '1'").fetchone() == doc
+    assert index.search('john').results == [{'id': 1, 'name': 'John Doe'}]
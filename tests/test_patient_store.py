@@ -0,0 +1,80 @@
+import sqlite3
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'test-files' / 'hipaa-violations'))
+
+from patient_cache import MemoryCache  # noqa: E402
+from patient_query import page_records, version_etag  # noqa: E402
+from patient_store import PatientStore, read_through  # noqa: E402
+
+
+def test_worker_caches_never_serve_stale_or_deleted_records(tmp_path):
+    path = str(tmp_path / 'patients.db')
+    # Two workers: each has its own connection and its own in-memory cache
+    first_store, second_store = PatientStore(path), PatientStore(path)
+    first_cache, second_cache = MemoryCache(ttl=60), MemoryCache(ttl=60)
+
+    first_store.put(1, {'id': 1, 'name': 'Old Name'})
+    assert read_through(first_store, first_cache, 1) == {'id': 1, 'name': 'Old Name'}
+    assert read_through(first_store, first_cache, 1) == {'id': 1, 'name': 'Old Name'}
+    assert first_cache.stats.hits == 1
+
+    version = second_store.put(1, {'id': 1, 'name': 'New Name'})
+    second_cache.set(1, [version, {'id': 1, 'name': 'New Name'}])
+    assert read_through(first_store, first_cache, 1) == {'id': 1, 'name': 'New Name'}
+
+    assert second_store.delete(1)
+    second_cache.delete(1)
+    assert read_through(first_store, first_cache, 1) is None
+    assert len(first_cache) == 0
+
+
+def test_versions_advance_on_every_write(tmp_path):
+    store = PatientStore(str(tmp_path / 'patients.db'))
+    start = store.version()
+    first = store.put(1, {'id': 1})
+    second = store.put(2, {'id': 2})
+    assert start < first < second == store.version()
+    assert store.row_version(1) == first
+    assert store.get_versioned(2) == (second, {'id': 2})
+
+    assert not store.delete(3)
+    assert store.version() == second
+    assert store.delete(1)
+    assert store.version() > second
+    assert store.row_version(1) is None
+
+
+def test_unversioned_store_files_are_migrated(tmp_path):
+    path = str(tmp_path / 'patients.db')
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("CREATE TABLE patients (key TEXT PRIMARY KEY, value BLOB NOT NULL)")
+        conn.execute("INSERT INTO patients VALUES ('1', ?)", (b'{"id":1}',))
+    conn.close()
+
+    store = PatientStore(path)
+    assert store.get_versioned(1) == (0, {'id': 1})
+    assert store.put(1, {'id': 1, 'name': 'Name'}) > 0
+
+
+def test_list_etag_follows_store_version(tmp_path):
+    store = PatientStore(str(tmp_path / 'patients.db'))
+    store.put(1, {'id': 1, 'name': 'Name'})
+
+    def tag(*params):
+        return version_etag(store.instance, store.version(), *params)
+
+    first = tag('patients', None, 50, None)
+    assert tag('patients', None, 50, None) == first
+    assert tag('patients', None, 50, ['id']) != first
+    store.put(2, {'id': 2})
+    assert tag('patients', None, 50, None) != first
+    patients, next_cursor = page_records(store, None, 1, ['id'])
+    assert patients == [{'id': 1}] and next_cursor is not None
+
+    # A new store file starts its generation over but not its instance
+    other = PatientStore(str(tmp_path / 'other.db'))
+    other.put(1, {'id': 1, 'name': 'Name'})
+    assert version_etag(other.instance, other.version(), 'patients', None, 50, None) != first
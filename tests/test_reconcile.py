@@ -0,0 +1,25 @@
+from local_s3 import LocalS3Client
+from reconcile import list_prefix, partition_bounds
+
+BUCKET = 'test-bucket'
+
+
+def test_list_prefix_finds_keys_of_any_shape(tmp_path):
+    s3_client = LocalS3Client(tmp_path / 's3')
+    names = ['Zurich.txt', 'event-0001.txt', 'event-0002.txt', 'x/nested.txt', '_first.txt', 'ümlaut.txt']
+    keys = {f"events/{name}" for name in names}
+    for key in keys:
+        s3_client.put_object(Bucket=BUCKET, Key=key, Body='body')
+    s3_client.put_object(Bucket=BUCKET, Key='locations/other.txt', Body='body')
+
+    # Bounds from the expected keys, including one the bucket does not have
+    bounds = partition_bounds(sorted(keys)[1:] + ['events/gone.txt'], 4)
+    assert bounds
+    assert list_prefix(s3_client, BUCKET, 'events/', workers=4, bounds=bounds) == keys
+    assert list_prefix(s3_client, BUCKET, 'events/', workers=4) == keys
+
+
+def test_partition_bounds_falls_back_to_one_range():
+    assert partition_bounds([], 16) == []
+    assert partition_bounds(['events/a', 'events/b'], 16) == []
+    assert partition_bounds(['events/a', 'events/b', 'events/c', 'events/d'], 2) == ['events/c']
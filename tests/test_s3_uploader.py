@@ -0,0 +1,25 @@
+from local_s3 import LocalS3Client
+from s3_uploader import S3Uploader
+
+BUCKET = 'test-bucket'
+
+
+def test_worker_survives_missing_files_and_failing_callbacks(tmp_path):
+    def on_uploaded(key):
+        if key == 'bad-callback':
+            raise RuntimeError("manifest unavailable")
+
+    present = tmp_path / 'present.txt'
+    present.write_text('body')
+    uploader = S3Uploader(LocalS3Client(tmp_path / 's3'), BUCKET, concurrency=1, max_pending=1,
+                          on_uploaded=on_uploaded)
+    with uploader:
+        uploader.submit_file('missing', tmp_path / 'missing.txt')
+        uploader.submit('bad-callback', 'body')
+        for i in range(5):
+            uploader.submit_file(f'ok-{i}', present)
+    summary = uploader.summary
+
+    assert summary.succeeded == 5
+    assert summary.failed == 2
+    assert sorted(key for key, _ in summary.failures) == ['bad-callback', 'missing']
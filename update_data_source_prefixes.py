@@ -1,49 +1,62 @@
 #!/usr/bin/env python3
-"""Update data source to include both documents/ and locations/ prefixes."""
+"""Update the knowledge-base data source to include every prefix the prepare scripts write to."""
 
-import boto3
 import logging
-from src.config import load_config
+from typing import Any, List, Sequence
+
+from aws_clients import get_bedrock_agent_client, get_config
+from kb_ingestion import DATA_SOURCE_ID, KNOWLEDGE_BASE_ID
+from prepare_events_with_metadata import EVENTS
+from prepare_locations_with_metadata import LOCATIONS
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# One prefix per prepare script; events are written to events/, not documents/
+INCLUSION_PREFIXES = [EVENTS.prefix, LOCATIONS.prefix]
 
-def main():
-    """Update the data source configuration."""
-    
-    config = load_config()
-    
-    kb_id = 'RNV8IF58LD'
-    data_source_id = 'ZTFJOUHWFY'
-    
-    bedrock_agent = boto3.client(
-        'bedrock-agent',
-        region_name=config.aws.region,
-        aws_access_key_id=config.aws.access_key_id,
-        aws_secret_access_key=config.aws.secret_access_key
-    )
-    
-    logger.info("Updating data source to include both prefixes...")
-    logger.info(f"KB ID: {kb_id}")
-    logger.info(f"Data Source ID: {data_source_id}")
-    
-    # Update data source with both prefixes
+# Fields of a data source that update_data_source() would otherwise reset
+_PRESERVED_FIELDS = ('description', 'dataDeletionPolicy', 'serverSideEncryptionConfiguration',
+                     'vectorIngestionConfiguration')
+
+
+def sync_inclusion_prefixes(bedrock_agent: Any, bucket: str, prefixes: Sequence[str],
+                            kb_id: str = KNOWLEDGE_BASE_ID, data_source_id: str = DATA_SOURCE_ID) -> bool:
+    """Point the data source at exactly these prefixes; returns False if it already was."""
+    data_source = bedrock_agent.get_data_source(knowledgeBaseId=kb_id, dataSourceId=data_source_id)['dataSource']
+    configuration = data_source['dataSourceConfiguration']
+    s3_configuration = dict(configuration.get('s3Configuration', {}))
+    current: List[str] = s3_configuration.get('inclusionPrefixes', [])
+    if sorted(current) == sorted(prefixes):
+        logger.info(f"Inclusion prefixes already up to date: {current}")
+        return False
+
+    s3_configuration['bucketArn'] = f"arn:aws:s3:::{bucket}"
+    s3_configuration['inclusionPrefixes'] = list(prefixes)
+    kwargs = {field: data_source[field] for field in _PRESERVED_FIELDS if field in data_source}
     response = bedrock_agent.update_data_source(
         knowledgeBaseId=kb_id,
         dataSourceId=data_source_id,
-        name='hospitality-venues-s3-source',
-        dataSourceConfiguration={
-            's3Configuration': {
-                'bucketArn': f"arn:aws:s3:::{config.s3.data_bucket_name}",
-                'inclusionPrefixes': ['documents/', 'locations/']
-            }
-        }
+        name=data_source['name'],
+        dataSourceConfiguration={**configuration, 's3Configuration': s3_configuration},
+        **kwargs
     )
-    
-    logger.info("✓ Data source updated successfully!")
-    logger.info(f"Inclusion prefixes: {response['dataSource']['dataSourceConfiguration']['s3Configuration']['inclusionPrefixes']}")
-    logger.info("\nYou can now run the ingestion pipeline to index location documents.")
+    updated = response['dataSource']['dataSourceConfiguration']['s3Configuration']['inclusionPrefixes']
+    logger.info(f"Inclusion prefixes: {current} -> {updated}")
+    return True
+
+
+def main():
+    """Update the data source configuration."""
+
+    logger.info("Updating data source inclusion prefixes...")
+    logger.info(f"KB ID: {KNOWLEDGE_BASE_ID}")
+    logger.info(f"Data Source ID: {DATA_SOURCE_ID}")
+
+    sync_inclusion_prefixes(get_bedrock_agent_client(), get_config().s3.data_bucket_name, INCLUSION_PREFIXES)
+
+    logger.info("✓ Data source is up to date!")
+    logger.info("\nYou can now run the ingestion pipeline to index event and location documents.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""Stream documents out of JSONL/tar shards written by --local-format and upload them to S3."""
+
+import argparse
+import logging
+from typing import List, Optional
+
+from aws_clients import get_config, get_s3_client
+from batch_writer import iter_shard_records
+from metadata_json import dumps
+from s3_uploader import DEFAULT_CONCURRENCY, S3Uploader
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command-line options."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('paths', nargs='+',
+                        help="Shard files or directories containing .jsonl / .tar shards")
+    parser.add_argument('--upload-concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help="Number of concurrent S3 uploads")
+    parser.add_argument('--bucket', help="Target bucket (defaults to the configured data bucket)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    """Upload every document in the given shards."""
+
+    args = parse_args(argv)
+    bucket = args.bucket or get_config().s3.data_bucket_name
+
+    documents = 0
+    with S3Uploader(get_s3_client(), bucket, concurrency=args.upload_concurrency) as uploader:
+        for record in iter_shard_records(args.paths):
+            uploader.submit(record.key, record.body)
+            uploader.submit(f"{record.key}.metadata.json", dumps(record.metadata))
+            documents += 1
+
+            if documents % 1000 == 0:
+                logger.info(f"Queued {documents} documents...")
+
+    logger.info(f"\n{'='*60}")
+    logger.info(f"Shard upload complete!")
+    logger.info(f"{'='*60}")
+    logger.info(f"Documents: {documents}")
+    uploader.summary.log()
+    logger.info(f"{'='*60}")
+
+    return documents
+
+
+if __name__ == "__main__":
+    main()